@@ -0,0 +1,310 @@
+"""
+Підписка на події DVR через ISAPI alertStream замість частого опитування.
+
+Кожен DVR тримає одне довготривале з'єднання GET /ISAPI/Event/notification/alertStream,
+у якому реєстратор надсилає multipart/mixed потік EventNotificationAlert.
+Події videoloss та IPC disconnect одразу стають переходами стану камер
+(monitor_cameras.process_alerts), а періодичне опитування DVR з активним потоком
+сповільнюється до звірки раз на RECONCILE_INTERVAL секунд.
+
+Налаштування (.env):
+    ALERT_STREAM                 - 1 вмикає режим подій (див. monitor_cameras)
+    RECONCILE_INTERVAL           - інтервал звірного опитування DVR з активним потоком (1800 с)
+    ALERT_STREAM_IDLE_TIMEOUT    - перепідключення, якщо потік мовчить довше (60 с; DVR шле heartbeat)
+    ALERT_STREAM_MAX_RECONNECT   - верхня межа затримки перепідключення (300 с)
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import httpx
+
+import metrics
+from state_store import channel_key, ANALOG, DIGITAL
+
+ALERT_STREAM_PATH = "/ISAPI/Event/notification/alertStream"
+
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "1800"))
+IDLE_TIMEOUT = float(os.getenv("ALERT_STREAM_IDLE_TIMEOUT", "60"))
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = float(os.getenv("ALERT_STREAM_MAX_RECONNECT", "300"))
+# Тіло частини без Content-Length шукається до наступного роздільника; більші частини
+# (з Content-Length чи без) відкидаються, не накопичуючись у буфері
+MAX_PART_SIZE = 4 * 1024 * 1024
+
+# Типи подій (у нижньому регістрі), що означають втрату відео камери
+VIDEO_LOSS = 'videoloss'
+IPC_DISCONNECT = 'ipcdisconnect'
+
+HEADERS_END = re.compile(rb'\r?\n\r?\n')
+BOUNDARY = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+
+Part = namedtuple('Part', 'headers body')
+# event_type у нижньому регістрі; channel - номер каналу або None (heartbeat)
+Alert = namedtuple('Alert', 'event_type active channel')
+
+alerts_received = metrics.counter('alert_stream_alerts_total', "Alerts received from ISAPI alertStream", ('event_type',))
+connected_dvrs = set()
+metrics.gauge('alert_stream_connected', "DVRs with a connected alertStream",
+              collect=lambda: {(): len(connected_dvrs)})
+
+
+def multipart_boundary(content_type):
+    """:return: Роздільник з заголовка Content-Type (за замовчуванням 'boundary', як у Hikvision)."""
+    match = BOUNDARY.search(content_type or '')
+    return match.group(1) if match else 'boundary'
+
+
+def _parse_headers(block):
+    headers = {}
+    for line in bytes(block).decode('latin-1').splitlines():
+        name, separator, value = line.partition(':')
+        if separator:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+class MultipartParser:
+    """
+    Інкрементний розбір потоку multipart/mixed.
+
+    feed() приймає шматки байтів довільного розміру (межі частин можуть
+    проходити будь-де) і повертає частини, що вже надійшли повністю. Тіло
+    читається за Content-Length, а без нього - до наступного роздільника.
+    Частини, більші за max_part_size, пропускаються.
+
+    :param boundary: Роздільник частин (без початкових '--').
+    """
+
+    def __init__(self, boundary, max_part_size=MAX_PART_SIZE):
+        self.delimiter = b'--' + boundary.encode('latin-1')
+        self.max_part_size = max_part_size
+        self.buffer = bytearray()
+        # Заголовки частини, тіло якої ще не надійшло повністю
+        self.headers = None
+        # Скільки байтів завеликої частини ще треба пропустити
+        self.skip = 0
+
+    def feed(self, data):
+        """:return: Список Part, що завершились у цьому шматку."""
+        self.buffer += data
+        parts = []
+        while True:
+            if self.skip:
+                skipped = min(self.skip, len(self.buffer))
+                del self.buffer[:skipped]
+                self.skip -= skipped
+                if self.skip:
+                    break
+            if self.headers is None and not self._read_headers():
+                break
+            body = self._read_body()
+            if body is None:
+                if self.skip:
+                    continue
+                break
+            parts.append(Part(self.headers, body))
+            self.headers = None
+        return parts
+
+    def _read_headers(self):
+        buffer = self.buffer
+        start = buffer.find(self.delimiter)
+        if start < 0:
+            # Преамбула або залишок попередньої частини: лишаємо тільки можливий початок роздільника
+            del buffer[:max(0, len(buffer) - len(self.delimiter) + 1)]
+            return False
+        match = HEADERS_END.search(buffer, start + len(self.delimiter))
+        if match is None:
+            del buffer[:start]
+            if len(buffer) > self.max_part_size:
+                del buffer[:len(self.delimiter)]
+            return False
+        self.headers = _parse_headers(buffer[start + len(self.delimiter):match.start()])
+        del buffer[:match.end()]
+        return True
+
+    def _read_body(self):
+        buffer = self.buffer
+        length = self.headers.get('content-length', '')
+        if length.isdigit():
+            length = int(length)
+            if length > self.max_part_size:
+                # Завелика частина (напр. зображення події): байти тіла відкидаються в міру надходження
+                self.skip = length
+                self.headers = None
+                return None
+            if len(buffer) < length:
+                return None
+        else:
+            length = buffer.find(self.delimiter)
+            if length < 0:
+                if len(buffer) > self.max_part_size:
+                    # Роздільника так і немає - відкидаємо частину
+                    del buffer[:]
+                    self.headers = None
+                return None
+        body = bytes(buffer[:length])
+        del buffer[:length]
+        if 'content-length' not in self.headers:
+            # CRLF перед роздільником належить йому, а не тілу
+            body = body[:-2] if body.endswith(b'\r\n') else body.rstrip(b'\n')
+        return body
+
+
+def _channel_no(value):
+    try:
+        return int(value) or None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_alert(part):
+    """
+    Розбирає частину потоку: EventNotificationAlert у XML (простір імен ver10 або ver20)
+    або JSON (новіші прошивки).
+
+    :return: Alert або None, якщо частина не є подією (напр. зображення).
+    """
+    content_type = part.headers.get('content-type', '')
+    body = part.body.lstrip()
+    if 'json' in content_type or body.startswith(b'{'):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        data = data.get('EventNotificationAlert', data) if isinstance(data, dict) else None
+        if not data or 'eventType' not in data:
+            return None
+        return Alert(str(data['eventType']).lower(), str(data.get('eventState', '')).lower() == 'active',
+                     _channel_no(data.get('channelID', data.get('dynChannelID'))))
+    if not body.startswith(b'<'):
+        return None
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return None
+    event_type = root.findtext('{*}eventType')
+    if event_type is None:
+        return None
+    channel = root.findtext('{*}channelID') or root.findtext('{*}dynChannelID')
+    return Alert(event_type.lower(), root.findtext('{*}eventState', '').lower() == 'active', _channel_no(channel))
+
+
+def alert_channel_key(alert, dvr_data):
+    """
+    Ключ каналу (state_store.channel_key), якого стосується подія, або None.
+
+    IPC disconnect - завжди цифровий канал; videoloss - аналоговий канал
+    аналогового/гібридного DVR або цифровий канал NVR. Аналогові канали поза
+    valid_camera_ids та heartbeat (подія без каналу) ігноруються.
+    """
+    if alert.channel is None:
+        return None
+    dvr_type = dvr_data.get('type')
+    if alert.event_type == IPC_DISCONNECT or (alert.event_type == VIDEO_LOSS and dvr_type == 'ip'):
+        return channel_key(DIGITAL, alert.channel)
+    if alert.event_type == VIDEO_LOSS and dvr_type in ('analog', 'mixed'):
+        if alert.channel not in dvr_data.get('valid_camera_ids', ()):
+            return None
+        return channel_key(ANALOG, alert.channel)
+    return None
+
+
+class AlertStreamListener:
+    """
+    Потоки alertStream усіх DVR в одному asyncio-циклі поруч з AsyncPoller.
+
+    З'єднання використовують httpx-клієнти AsyncPoller (той самий keep-alive пул
+    і стан digest-автентифікації), але не займають семафори опитування.
+    Поки потік DVR підключений, планувальник опитує DVR раз на RECONCILE_INTERVAL;
+    після обриву та повторного підключення DVR опитується одразу, щоб не пропустити
+    зміни, що сталися без з'єднання.
+
+    :param poller: AsyncPoller.
+    :param scheduler: DvrScheduler, що використовує poller.
+    """
+
+    def __init__(self, poller, scheduler, reconcile_interval=RECONCILE_INTERVAL, idle_timeout=IDLE_TIMEOUT):
+        self.poller = poller
+        self.monitor = poller.monitor
+        self.scheduler = scheduler
+        self.reconcile_interval = reconcile_interval
+        self.idle_timeout = idle_timeout
+        self.tasks = {}
+
+    def start(self):
+        for dvr_name, dvr_data in self.monitor.dvrs.items():
+            self.tasks[dvr_name] = asyncio.create_task(self.listen(dvr_name, dvr_data))
+
+    def update(self, added, removed, changed):
+        """Перепідключає потоки змінених DVR, закриває потоки видалених і відкриває нові."""
+        for dvr_name in removed + changed:
+            task = self.tasks.pop(dvr_name, None)
+            if task is not None:
+                task.cancel()
+        for dvr_name in added + changed:
+            self.tasks[dvr_name] = asyncio.create_task(self.listen(dvr_name, self.monitor.dvrs[dvr_name]))
+
+    async def stop(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+
+    def set_connected(self, dvr_name, dvr_data, connected, first):
+        if connected:
+            connected_dvrs.add(dvr_name)
+            self.scheduler.set_interval(dvr_name, max(self.reconcile_interval, dvr_data.get('interval') or 0))
+        else:
+            connected_dvrs.discard(dvr_name)
+            self.scheduler.set_interval(dvr_name, dvr_data.get('interval'))
+        if not first:
+            self.scheduler.poll_now(dvr_name)
+
+    async def listen(self, dvr_name, dvr_data):
+        """Тримає потік DVR, перепідключаючись з експоненційною затримкою."""
+        delay = RECONNECT_MIN
+        first = True
+        timeout = httpx.Timeout(self.monitor.REQUEST_TIMEOUT, read=self.idle_timeout)
+        while True:
+            connected = False
+            try:
+                client = self.poller.get_client(dvr_name, dvr_data)
+                async with client.stream('GET', ALERT_STREAM_PATH, timeout=timeout) as response:
+                    if response.status_code in (404, 501):
+                        logging.warning("DVR: %s does not support alertStream (status %s), polling it instead",
+                                        dvr_name, response.status_code, extra={'dvr': dvr_name})
+                        return
+                    if response.status_code != 200:
+                        raise httpx.HTTPStatusError(f"alertStream status {response.status_code}",
+                                                    request=response.request, response=response)
+                    parser = MultipartParser(multipart_boundary(response.headers.get('content-type')))
+                    connected = True
+                    self.set_connected(dvr_name, dvr_data, True, first)
+                    first = False
+                    delay = RECONNECT_MIN
+                    logging.info("alertStream connected: %s", dvr_name, extra={'dvr': dvr_name})
+                    async for chunk in response.aiter_raw():
+                        alerts = []
+                        for part in parser.feed(chunk):
+                            alert = parse_alert(part)
+                            if alert is not None:
+                                alerts_received.inc(alert.event_type)
+                                alerts.append(alert)
+                        if alerts:
+                            self.monitor.process_alerts(dvr_name, dvr_data, alerts)
+            except httpx.HTTPError as e:
+                logging.info("alertStream %s interrupted: %s", dvr_name, e.__class__.__name__, extra={'dvr': dvr_name})
+            except Exception:
+                logging.exception("alertStream %s failed", dvr_name, extra={'dvr': dvr_name})
+            finally:
+                if connected:
+                    self.set_connected(dvr_name, dvr_data, False, False)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, RECONNECT_MAX)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+
+import httpx
+
+# Загальна кількість одночасних запитів та ліміт на один майданчик (IP-адресу)
+MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "200"))
+PER_SITE_CONCURRENCY = int(os.getenv("ASYNC_PER_SITE_CONCURRENCY", "4"))
+
+
+class AsyncPoller:
+    """
+    Асинхронний рушій опитування DVR.
+
+    Для кожного DVR тримається один httpx.AsyncClient з keep-alive пулом з'єднань
+    та власним httpx.DigestAuth. DigestAuth запам'ятовує останній challenge, тому
+    наступні запити йдуть одразу з заголовком Authorization (без зайвого 401).
+
+    :param monitor: Модуль monitor_cameras (з обробниками відповідей та станом).
+    :param max_concurrency: Загальний ліміт одночасних запитів.
+    :param per_site_concurrency: Ліміт одночасних запитів на один майданчик.
+    """
+
+    def __init__(self, monitor, max_concurrency=MAX_CONCURRENCY, per_site_concurrency=PER_SITE_CONCURRENCY):
+        self.monitor = monitor
+        self.per_site_concurrency = per_site_concurrency
+        self.clients = {}
+        # Фонові задачі (закриття клієнтів DVR, прибраних з конфігурації)
+        self.background = set()
+        # Один SSL-контекст на всі клієнти: створення контексту (читання сертифікатів CA)
+        # для кожного DVR окремо займало десятки мілісекунд на клієнт
+        self.ssl_context = httpx.create_ssl_context()
+        self.global_limit = asyncio.Semaphore(max_concurrency)
+        self.site_limits = defaultdict(lambda: asyncio.Semaphore(self.per_site_concurrency))
+
+    def get_client(self, dvr_name, dvr_data):
+        client = self.clients.get(dvr_name)
+        if client is None:
+            # Потік alertStream постійно займає одне з'єднання пулу
+            connections = self.per_site_concurrency + (1 if self.monitor.ALERT_STREAM else 0)
+            client = httpx.AsyncClient(
+                base_url=self.monitor.dvr_base_url(dvr_data),
+                auth=httpx.DigestAuth(dvr_data['username'], dvr_data['password']),
+                timeout=self.monitor.REQUEST_TIMEOUT,
+                verify=self.ssl_context,
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            )
+            self.clients[dvr_name] = client
+        return client
+
+    async def get(self, dvr_name, dvr_data, path):
+        # Майданчик - кілька DVR за однією адресою (різні порти)
+        site = dvr_data.get('site', dvr_data['ip'])
+        # Спершу ліміт майданчика, потім загальний: глобальні дозволи займають лише запити,
+        # що справді можуть виконуватись, а не черга одного завантаженого майданчика
+        async with self.site_limits[site], self.global_limit:
+            return await self.get_client(dvr_name, dvr_data).get(
+                path, headers=self.monitor.payload_cache.conditional_headers(dvr_name, path))
+
+    async def fetch_dvr(self, dvr_name, dvr_data):
+        """
+        Паралельно виконує всі запити ISAPI для DVR через його пул з'єднань.
+
+        :return: Словник {шлях: відповідь або виняток}.
+        """
+        paths = self.monitor.dvr_request_paths(dvr_data)
+        results = await asyncio.gather(*(self.get(dvr_name, dvr_data, path) for path in paths),
+                                       return_exceptions=True)
+        return dict(zip(paths, results))
+
+    async def check_dvr(self, dvr_name, dvr_data):
+        started = time.perf_counter()
+        responses = await self.fetch_dvr(dvr_name, dvr_data)
+        fetched = time.perf_counter()
+        if not self.monitor.is_current(dvr_name, dvr_data):
+            return
+        self.monitor.evaluate_dvr(dvr_name, dvr_data, responses)
+        self.monitor.record_check(dvr_name, responses, fetched - started, time.perf_counter() - fetched)
+
+    async def aclose(self):
+        await asyncio.gather(*(client.aclose() for client in self.clients.values()))
+        self.clients.clear()
+
+    def update_dvrs(self, scheduler, listener, added, removed, changed):
+        """Зміни конфігурації (у циклі asyncio): розклад, клієнти та потоки alertStream змінених DVR."""
+        self.monitor.update_scheduler(scheduler, added, removed, changed)
+        for dvr_name in removed + changed:
+            client = self.clients.pop(dvr_name, None)
+            if client is not None:
+                task = asyncio.create_task(client.aclose())
+                self.background.add(task)
+                task.add_done_callback(self.background.discard)
+        if listener is not None:
+            listener.update(added, removed, changed)
+
+    async def poll_and_reschedule(self, scheduler, dvr_name):
+        dvr_data = self.monitor.dvrs.get(dvr_name)
+        if dvr_data is None:
+            return
+        try:
+            await self.check_dvr(dvr_name, dvr_data)
+        finally:
+            self.monitor.reschedule_dvr(scheduler, dvr_name)
+
+    async def run(self):
+        scheduler = self.monitor.create_scheduler()
+        tasks = set()
+        listener = None
+        if self.monitor.ALERT_STREAM:
+            from alert_stream import AlertStreamListener
+            listener = AlertStreamListener(self, scheduler)
+            listener.start()
+        # Зміни конфігурації надходять з потоку ConfigWatcher - застосовуємо їх у циклі asyncio
+        loop = asyncio.get_running_loop()
+        hook = lambda added, removed, changed: loop.call_soon_threadsafe(
+            self.update_dvrs, scheduler, listener, added, removed, changed)
+        self.monitor.reload_hooks.append(hook)
+        self.monitor.clear_console()
+        print('---------------------------------------------')
+        print("Press Ctrl+C to exit the program.")
+        logging.info("-" * 24 + 'Start checking' + "-" * 24)
+        try:
+            while True:
+                for dvr_name in scheduler.pop_due():
+                    task = asyncio.create_task(self.poll_and_reschedule(scheduler, dvr_name))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                wait = scheduler.time_until_next()
+                await asyncio.sleep(min(wait, 1.0) if wait is not None else 1.0)
+        finally:
+            self.monitor.reload_hooks.remove(hook)
+            for task in tasks:
+                task.cancel()
+            if listener is not None:
+                await listener.stop()
+            await self.aclose()
+
+def run_async(monitor):
+    """Запускає асинхронний цикл моніторингу (блокує до Ctrl+C)."""
+    async def _run():
+        await AsyncPoller(monitor).run()
+
+    asyncio.run(_run())
@@ -0,0 +1,851 @@
+"""
+Бенчмарки гарячих ділянок моніторингу на синтетичних даних.
+
+Запуск: python benchmark.py <назва>  (список: python benchmark.py --help)
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import contextlib
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import random
+import subprocess
+import tempfile
+import time
+import timeit
+import threading
+import tracemalloc
+import sys
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from isapi_parser import parse_video_inputs, parse_input_proxy_channels, parse_working_status
+from state_store import CameraStateStore, channel_key, ANALOG, DIGITAL, NEW_OFFLINE, OFFLINE, ONLINE
+import outage_store
+from sharded_monitor import assign_shards
+from isapi_simulator import (make_video_inputs_xml, make_input_proxy_xml, make_working_status_json, fleet_config,
+                             write_fleet_config, build_fleet, SnapshotFrames)
+from scheduler import DvrScheduler
+from config_watcher import read_config, diff_config, validate_config, load_config
+
+CHANNEL_COUNTS = (64, 128, 256)
+
+
+# Попередній шлях розбору (ET.fromstring + find з повним простором імен), для порівняння
+def legacy_video_inputs(content, valid_camera_ids):
+    ns = '{http://www.hikvision.com/ver20/XMLSchema}'
+    root = ET.fromstring(content.decode())
+    channels = []
+    for channel in root.findall(f'.//{ns}VideoInputChannel'):
+        id_elem = channel.find(f'{ns}id')
+        camera_id = id_elem.text if id_elem is not None else 'N/A'
+        if int(camera_id) in valid_camera_ids:
+            name_elem = channel.find(f'{ns}name')
+            enabled_elem = channel.find(f'{ns}videoInputEnabled')
+            resolution_elem = channel.find(f'{ns}resDesc')
+            channels.append((camera_id,
+                             name_elem.text if name_elem is not None else 'N/A',
+                             enabled_elem.text if enabled_elem is not None else 'N/A',
+                             resolution_elem.text if resolution_elem is not None else 'N/A'))
+    return channels
+
+
+def legacy_ip_channels(channels_content, status_content):
+    namespace = {'ns': 'http://www.hikvision.com/ver20/XMLSchema'}
+    root = ET.fromstring(channels_content.decode())
+    if 'WorkingStatus' in json.loads(status_content.decode()):
+        chan_status = json.loads(status_content.decode())['WorkingStatus']['ChanStatus']
+    else:
+        chan_status = json.loads(status_content.decode())['ChanStatus']
+    result = []
+    for channel, chan in zip(root.findall('ns:InputProxyChannel', namespace), chan_status):
+        camera_info = {
+            'id': channel.find('ns:id', namespace).text,
+            'name': channel.find('ns:name', namespace).text,
+            'ipAddress': channel.find('ns:sourceInputPortDescriptor/ns:ipAddress', namespace).text,
+            'port': channel.find('ns:sourceInputPortDescriptor/ns:managePortNo', namespace).text,
+            'user': channel.find('ns:sourceInputPortDescriptor/ns:userName', namespace).text,
+        }
+        result.append((camera_info, chan['chanNo'], chan['online']))
+    return result
+
+
+def current_ip_channels(channels_content, status_content):
+    return list(zip(parse_input_proxy_channels(channels_content), parse_working_status(status_content)))
+
+
+def best_of(func, repeat=5, number=50):
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def report(label, legacy, current):
+    print(f"{label:<28} legacy {legacy * 1e6:9.1f} us   current {current * 1e6:9.1f} us   "
+          f"speedup x{legacy / current:.2f}")
+
+
+def bench_parser(args):
+    for channels in CHANNEL_COUNTS:
+        valid_camera_ids = list(range(1, channels + 1, 2))
+        video_inputs = make_video_inputs_xml(channels)
+        assert len(legacy_video_inputs(video_inputs, valid_camera_ids)) == \
+            len(parse_video_inputs(video_inputs, valid_camera_ids))
+        report(f"analog, {channels} channels",
+               best_of(lambda: legacy_video_inputs(video_inputs, valid_camera_ids)),
+               best_of(lambda: parse_video_inputs(video_inputs, valid_camera_ids)))
+
+        proxy_channels = make_input_proxy_xml(channels)
+        working_status = make_working_status_json(channels)
+        report(f"ip, {channels} channels",
+               best_of(lambda: legacy_ip_channels(proxy_channels, working_status)),
+               best_of(lambda: current_ip_channels(proxy_channels, working_status)))
+
+
+# Попередня структура стану: camera_status[dvr_name][chanNo] = {'issue': bool, 'start_time': datetime}
+def legacy_transition(camera_status, dvr_name, chan_no, offline, current_time):
+    prev_status = camera_status[dvr_name].get(chan_no)
+    if prev_status is None:
+        camera_status[dvr_name][chan_no] = {'issue': offline, 'start_time': current_time if offline else None}
+    elif offline and not prev_status['issue']:
+        prev_status['issue'] = True
+        prev_status['start_time'] = current_time
+    elif not offline and prev_status['issue']:
+        prev_status['issue'] = False
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def bench_state(args):
+    dvr_count, channel_count = args.dvrs, args.channels
+    total = dvr_count * channel_count
+    names = [f"DVR {i}" for i in range(dvr_count)]
+    # Кожна 20-та камера offline, частина з них змінює стан між проходами
+    sweeps = [[(name, chan_no, (chan_no + sweep) % 20 == 0) for name in names for chan_no in range(1, channel_count + 1)]
+              for sweep in range(2)]
+
+    def build_legacy():
+        camera_status = {name: {} for name in names}
+        current_time = datetime.now()
+        for name, chan_no, offline in sweeps[0]:
+            legacy_transition(camera_status, name, chan_no, offline, current_time)
+        return camera_status
+
+    def build_store():
+        store = CameraStateStore()
+        now = time.time()
+        for name, chan_no, offline in sweeps[0]:
+            store.transition(name, channel_key(DIGITAL, chan_no), offline, now)
+        return store
+
+    camera_status, legacy_memory = measure_memory(build_legacy)
+    store, store_memory = measure_memory(build_store)
+    print(f"{dvr_count} DVRs x {channel_count} channels = {total} channels")
+    print(f"memory                       legacy {legacy_memory / 1024:9.0f} KiB  current {store_memory / 1024:9.0f} KiB")
+
+    def sweep_legacy():
+        current_time = datetime.now()
+        for name, chan_no, offline in sweeps[1]:
+            legacy_transition(camera_status, name, chan_no, offline, current_time)
+
+    updates = {}
+    for name, chan_no, offline in sweeps[1]:
+        updates.setdefault(name, []).append((channel_key(DIGITAL, chan_no), offline))
+
+    def sweep_store():
+        now = time.time()
+        for name, dvr_updates in updates.items():
+            store.transition_many(name, dvr_updates, now)
+
+    legacy = best_of(sweep_legacy, repeat=3, number=3)
+    current = best_of(sweep_store, repeat=3, number=3)
+    print(f"transitions/s                legacy {total / legacy:9.0f}      current {total / current:9.0f}")
+    report("snapshot", best_of(lambda: copy.deepcopy(camera_status), repeat=3, number=1),
+           best_of(store.snapshot, repeat=3, number=1))
+
+
+def bench_outages(args):
+    rows, dvr_count, channel_count = args.rows, args.dvrs, args.channels
+    end = time.time()
+    begin = end - 365 * 24 * 3600
+    with tempfile.TemporaryDirectory() as directory:
+        conn = outage_store.connect(os.path.join(directory, 'outages.db'))
+        random.seed(1)
+
+        def generate():
+            for _ in range(rows):
+                start_ts = random.uniform(begin, end)
+                chan_no = random.randint(1, channel_count)
+                yield (f"DVR {random.randrange(dvr_count)}", DIGITAL, f"IPCamera {chan_no:03d}",
+                       start_ts, start_ts + random.expovariate(1 / 600))
+
+        started = time.perf_counter()
+        with conn:
+            conn.executemany(outage_store.INSERT, generate())
+        conn.execute("ANALYZE")
+        print(f"inserted {rows} outages in {time.perf_counter() - started:.1f} s "
+              f"({dvr_count} DVRs x {channel_count} channels, one year)")
+
+        month = end - 30 * 24 * 3600
+        queries = {
+            "downtime, one DVR, month": lambda: outage_store.downtime_by_camera(conn, "DVR 7", month, end),
+            "downtime, all DVRs, month": lambda: outage_store.downtime_by_camera(conn, None, month, end),
+            "top 10 flappers, month": lambda: outage_store.top_flappers(conn, 10, None, month, end),
+            "scan, one hour": lambda: outage_store.outages_between(conn, end - 7200, end - 3600),
+        }
+        for label, query in queries.items():
+            result = query()
+            print(f"{label:<28} {best_of(query, repeat=3, number=1) * 1000:9.1f} ms   {len(result)} rows")
+        conn.close()
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {}
+        self.elapsed = timedelta(milliseconds=20)
+
+
+def import_monitor():
+    """
+    monitor_cameras з dvr_config.json поточного каталогу і журналюванням у його
+    camera_log.txt, як під час моніторингу (модуль сам їх не завантажує і не налаштовує).
+    """
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import monitor_cameras as monitor
+    monitor.setup_logging()
+    monitor.load_dvrs()
+    return monitor
+
+
+def shard_worker(dvr_names, channel_count, sweeps, result_queue):
+    sys.stdout = open(os.devnull, 'w')
+    monitor = import_monitor()
+    events = []
+    monitor.event_sink = events.extend
+    responses = {monitor.IP_CHANNELS_PATH: FakeResponse(make_input_proxy_xml(channel_count)),
+                 monitor.WORKING_STATUS_PATH: FakeResponse(make_working_status_json(channel_count))}
+    started = time.perf_counter()
+    for _ in range(sweeps):
+        for dvr_name in dvr_names:
+            monitor.evaluate_dvr(dvr_name, monitor.dvrs[dvr_name], responses)
+    result_queue.put((time.perf_counter() - started, len(events)))
+
+
+def bench_shards(args):
+    context = multiprocessing.get_context('spawn')
+    cwd = os.getcwd()
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        write_fleet_config(directory, args.dvrs, args.channels)
+        os.chdir(directory)
+        sys.path.insert(0, package_dir)
+        try:
+            print(f"{args.dvrs} DVRs x {args.channels} channels, {args.sweeps} sweeps, {os.cpu_count()} CPUs "
+                  f"(parse + evaluate, no network)")
+            baseline = None
+            workers = 1
+            while workers <= max(2, os.cpu_count()):
+                result_queue = context.Queue()
+                processes = [context.Process(target=shard_worker, args=(dvr_names, args.channels, args.sweeps, result_queue))
+                             for dvr_names in assign_shards([f"DVR {i}" for i in range(args.dvrs)], workers).values()]
+                started = time.perf_counter()
+                for process in processes:
+                    process.start()
+                results = [result_queue.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                # Час запуску процесів не враховується: лише найдовший прохід обробника
+                elapsed = max(elapsed for elapsed, _ in results)
+                throughput = args.dvrs * args.sweeps / elapsed
+                baseline = baseline or throughput
+                print(f"{workers:>3} workers   {throughput:10.0f} DVR checks/s   x{throughput / baseline:.2f}   "
+                      f"wall {time.perf_counter() - started:.1f} s")
+                workers *= 2
+        finally:
+            os.chdir(cwd)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def simulator_stats(dvr_data):
+    with urllib.request.urlopen(f"http://{dvr_data['ip']}:{dvr_data['port']}/simulator/stats", timeout=10) as response:
+        return json.load(response)
+
+
+def load_worker(mode, directory, sweeps, result_queue):
+    """
+    Процес бенчмарку навантаження: справжній шлях опитування monitor_cameras
+    (потоки або asyncio) проти симулятора, події переходів лише підраховуються.
+    """
+    os.chdir(directory)
+    monitor = import_monitor()
+    events = Counter()
+    monitor.event_sink = lambda batch: events.update(event.event for event in batch)
+    first_dvr = next(iter(monitor.dvrs.values()))
+    results = []
+
+    def run_sweep(sweep):
+        latencies = []
+        before = simulator_stats(first_dvr)
+        events.clear()
+        started, cpu_started = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            sweep(latencies)
+        elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+        after = simulator_stats(first_dvr)
+        results.append({'wall': elapsed, 'cpu': cpu, 'latencies': (percentile(latencies, 0.5), percentile(latencies, 0.99)),
+                        'stats': {key: after[key] - before[key] for key in after}, 'events': dict(events)})
+
+    if mode == 'async':
+        from async_monitor import AsyncPoller
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        poller = AsyncPoller(monitor)
+
+        async def timed_check(dvr_name, dvr_data, latencies):
+            started = time.perf_counter()
+            await poller.check_dvr(dvr_name, dvr_data)
+            latencies.append(time.perf_counter() - started)
+
+        async def sweep(latencies):
+            await asyncio.gather(*(timed_check(dvr_name, dvr_data, latencies)
+                                   for dvr_name, dvr_data in monitor.dvrs.items()))
+
+        for _ in range(sweeps):
+            run_sweep(lambda latencies: loop.run_until_complete(sweep(latencies)))
+        loop.run_until_complete(poller.aclose())
+        loop.close()
+    else:
+        # Як у run_polling: один потік на DVR, перший запит DVR у ньому, решта паралельно в request_executor
+        with ThreadPoolExecutor(max_workers=len(monitor.dvrs)) as executor:
+            def timed_check(item, latencies):
+                started = time.perf_counter()
+                monitor.check_dvr(*item)
+                latencies.append(time.perf_counter() - started)
+
+            for _ in range(sweeps):
+                run_sweep(lambda latencies: list(executor.map(lambda item: timed_check(item, latencies),
+                                                              monitor.dvrs.items())))
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    result_queue.put((results, peak_rss))
+
+
+def bench_load(args):
+    """
+    Наскрізний бенчмарк: isapi_simulator.py в окремому процесі та справжній шлях опитування.
+
+    Невідомі аргументи передаються симулятору, напр.:
+    python benchmark.py load --dvrs 1000 --mode async -- --latency 0.05 --timeout-rate 0.001
+    """
+    context = multiprocessing.get_context('spawn')
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        command = [sys.executable, os.path.join(package_dir, 'isapi_simulator.py'), '--dvrs', str(args.dvrs),
+                   '--channels', str(args.channels), '--config', os.path.join(directory, 'dvr_config.json')]
+        simulator = subprocess.Popen(command + args.simulator_args, stdout=subprocess.PIPE, text=True)
+        sys.path.insert(0, package_dir)
+        try:
+            ready = simulator.stdout.readline()
+            if not ready:
+                raise SystemExit("ISAPI simulator failed to start")
+            print(ready.strip())
+            for mode in (('threads', 'async') if args.mode == 'both' else (args.mode,)):
+                result_queue = context.Queue()
+                process = context.Process(target=load_worker, args=(mode, directory, args.sweeps, result_queue))
+                process.start()
+                results, peak_rss = result_queue.get()
+                process.join()
+                print(f"[{mode}]" + (f" peak RSS {peak_rss / 1024:.0f} MiB" if peak_rss else ""))
+                for sweep, result in enumerate(results, 1):
+                    stats = result['stats']
+                    alerts = sum(count for event, count in result['events'].items() if not event.startswith(('still', 'dvr_still')))
+                    print(f"  sweep {sweep}: wall {result['wall']:6.2f} s   cpu {result['cpu']:6.2f} s   "
+                          f"{stats['requests'] / result['wall']:8.0f} req/s   "
+                          f"p50 {result['latencies'][0] * 1000:7.1f} ms   p99 {result['latencies'][1] * 1000:7.1f} ms   "
+                          f"304 {stats['not_modified']:5d}   401 {stats['unauthorized']:5d}   hung {stats['hung']:4d}   alerts {alerts:5d}   "
+                          f"events {dict(sorted(result['events'].items()))}")
+        finally:
+            simulator.terminate()
+            simulator.wait()
+
+
+def events_worker(mode, directory, interval, duration, result_queue):
+    """
+    Процес бенчмарку подій: AsyncPoller.run() з розкладом (і потоками alertStream
+    у режимі 'events') протягом duration секунд; повертає час кожного переходу.
+    """
+    os.chdir(directory)
+    monitor = import_monitor()
+    from async_monitor import AsyncPoller
+    monitor.ALERT_STREAM = mode == 'events'
+    monitor.timer = interval
+    monitor.clear_console = lambda: None
+    detected = []
+    monitor.event_sink = lambda batch: detected.extend((time.time(), event.event, event.dvr_name, event.key)
+                                                      for event in batch)
+
+    async def run():
+        task = asyncio.create_task(AsyncPoller(monitor).run())
+        result_queue.put('started')
+        await asyncio.sleep(duration)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        asyncio.run(run())
+    result_queue.put(detected)
+
+
+def post_simulator_event(dvr_data, event):
+    request = urllib.request.Request(f"http://{dvr_data['ip']}:{dvr_data['port']}/simulator/event",
+                                     data=json.dumps(event).encode(), method='POST')
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+def bench_events(args):
+    """
+    Час виявлення зміни стану камери та кількість запитів ISAPI: опитування кожні
+    --interval секунд проти режиму подій alertStream (опитування лише для звірки).
+
+    Симулятор запускається з усіма камерами online; під час роботи кожного режиму
+    --changes разів перемикається стан випадкової камери через /simulator/event.
+    """
+    context = multiprocessing.get_context('spawn')
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    rng = random.Random(1)
+    warmup = 0.1 * args.interval + 2
+    spacing = 1.0
+    duration = warmup + args.changes * spacing + args.interval + 2
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, 'dvr_config.json')
+        command = [sys.executable, os.path.join(package_dir, 'isapi_simulator.py'), '--dvrs', str(args.dvrs),
+                   '--channels', str(args.channels), '--offline-rate', '0', '--config', config_path]
+        simulator = subprocess.Popen(command + args.simulator_args, stdout=subprocess.PIPE, text=True)
+        sys.path.insert(0, package_dir)
+        try:
+            ready = simulator.stdout.readline()
+            if not ready:
+                raise SystemExit("ISAPI simulator failed to start")
+            print(ready.strip())
+            with open(config_path, 'r') as file:
+                fleet = json.load(file)
+            offline = set()
+            for mode, label in (('polling', f"polling every {args.interval:g} s"),
+                                ('events', "alertStream + reconciliation polling")):
+                # Окремий каталог: стан і журнал одного режиму не впливають на інший
+                mode_dir = os.path.join(directory, mode)
+                os.mkdir(mode_dir)
+                with open(os.path.join(mode_dir, 'dvr_config.json'), 'w') as file:
+                    json.dump(fleet, file)
+                result_queue = context.Queue()
+                process = context.Process(target=events_worker,
+                                          args=(mode, mode_dir, args.interval, duration, result_queue))
+                process.start()
+                result_queue.get()
+                # Запити рахуються після першого опитування та підключення потоків
+                time.sleep(warmup)
+                before = simulator_stats(next(iter(fleet.values())))
+                started = time.time()
+                changes = []
+                for _ in range(args.changes):
+                    dvr_name = rng.choice(list(fleet))
+                    channel = rng.randint(1, args.channels)
+                    online = (dvr_name, channel) in offline
+                    offline.symmetric_difference_update({(dvr_name, channel)})
+                    changes.append((time.time(), dvr_name, channel, online))
+                    post_simulator_event(fleet[dvr_name], {'dvr': dvr_name, 'channel': channel, 'online': online})
+                    time.sleep(spacing)
+                detected = result_queue.get()
+                elapsed = time.time() - started
+                process.join()
+                after = simulator_stats(next(iter(fleet.values())))
+
+                latencies = []
+                for changed_at, dvr_name, channel, online in changes:
+                    keys = {channel_key(ANALOG, channel), channel_key(DIGITAL, channel)}
+                    wanted = (ONLINE,) if online else (NEW_OFFLINE, OFFLINE)
+                    times = [at for at, event, name, key in detected
+                             if at >= changed_at and name == dvr_name and key in keys and event in wanted]
+                    if times:
+                        latencies.append(min(times) - changed_at)
+                requests_made = after['requests'] - before['requests']
+                print(f"[{label}] detected {len(latencies)}/{len(changes)}   "
+                      f"p50 {percentile(latencies, 0.5):7.3f} s   p99 {percentile(latencies, 0.99):7.3f} s   "
+                      f"ISAPI requests after warm-up {requests_made} ({requests_made / elapsed:.1f}/s)")
+        finally:
+            simulator.terminate()
+            simulator.wait()
+
+
+# Відбиток знімка без зменшення під час декодування: повний RGB-кадр і відтінки сірого в numpy, для порівняння
+def legacy_image_fingerprint(content):
+    import numpy as np
+    from PIL import Image
+    image = Image.open(io.BytesIO(content)).convert('RGB')
+    gray = np.asarray(image, dtype=np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    small = np.asarray(Image.fromarray(gray.astype(np.uint8)).resize((9, 8), Image.BOX), dtype=np.int16)
+    return float(gray.mean()), float(gray.std()), np.packbits(small[:, 1:] > small[:, :-1]).tobytes()
+
+
+def snapshots_worker(directory, rounds, result_queue):
+    """
+    Процес бенчмарку знімків: одне опитування всіх DVR (стан камер), потім rounds
+    проходів SnapshotProbe.probe_dvr по всіх DVR через пул SNAPSHOT_WORKERS.
+    """
+    os.chdir(directory)
+    monitor = import_monitor()
+    import snapshot_probe
+    monitor.event_sink = lambda batch: None
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        with ThreadPoolExecutor(max_workers=len(monitor.dvrs)) as executor:
+            list(executor.map(lambda item: monitor.check_dvr(*item), monitor.dvrs.items()))
+    probe = snapshot_probe.SnapshotProbe(monitor)
+    first_dvr = next(iter(monitor.dvrs.values()))
+    results = []
+    faults = {}
+    for _ in range(rounds):
+        counts = dict(snapshot_probe.probes_total.values)
+        before = simulator_stats(first_dvr)
+        started, cpu_started = time.perf_counter(), time.process_time()
+        for events in probe.executor.map(probe.probe_dvr, list(monitor.dvrs)):
+            for event in events:
+                faults[(event.dvr_name, event.key)] = event.detail if event.event == 'image_fault' else None
+        elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+        after = simulator_stats(first_dvr)
+        results.append({'wall': elapsed, 'cpu': cpu, 'snapshots': after['snapshots'] - before['snapshots'],
+                        'probes': {labels[0]: value - counts.get(labels, 0)
+                                   for labels, value in snapshot_probe.probes_total.values.items()}})
+    result_queue.put((results, {key: problem for key, problem in faults.items() if problem is not None}))
+
+
+def bench_snapshots(args):
+    """
+    Перевірка знімків камер (snapshot_probe.py, потрібні numpy та Pillow).
+
+    Спершу - вартість відбитка одного JPEG: повне декодування проти зменшення під час
+    декодування. Далі - справжній SnapshotProbe проти isapi_simulator.py з 5% камер із
+    застиглим, 5% з чорним зображенням і 5% камер, що знімають нерухому сцену (не мають
+    вважатися застиглими): SNAPSHOT_FROZEN_PROBES + 1 проходів, швидкість і точність
+    виявлення. Невідомі аргументи передаються симулятору (напр. --snapshot-size 1920x1080).
+    """
+    import snapshot_probe
+    if not snapshot_probe.available():
+        raise SystemExit("numpy and Pillow are required: pip install numpy pillow")
+    for size in ((640, 360), (1920, 1080)):
+        frame = SnapshotFrames(size, count=1).live[0]
+        legacy = best_of(lambda: legacy_image_fingerprint(frame), repeat=3, number=20)
+        current = best_of(lambda: snapshot_probe.image_fingerprint(frame), repeat=3, number=20)
+        report(f"fingerprint {size[0]}x{size[1]} ({len(frame) // 1024} KiB)", legacy, current)
+
+    context = multiprocessing.get_context('spawn')
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    rounds = snapshot_probe.FROZEN_PROBES + 1
+    simulator_args = ['--offline-rate', '0', '--frozen-rate', '0.05', '--black-rate', '0.05', '--static-rate', '0.05']
+    with tempfile.TemporaryDirectory() as directory:
+        command = [sys.executable, os.path.join(package_dir, 'isapi_simulator.py'), '--dvrs', str(args.dvrs),
+                   '--channels', str(args.channels), '--config', os.path.join(directory, 'dvr_config.json')]
+        simulator = subprocess.Popen(command + simulator_args + args.simulator_args, stdout=subprocess.PIPE, text=True)
+        sys.path.insert(0, package_dir)
+        try:
+            ready = simulator.stdout.readline()
+            if not ready:
+                raise SystemExit("ISAPI simulator failed to start")
+            print(ready.strip())
+            result_queue = context.Queue()
+            process = context.Process(target=snapshots_worker, args=(directory, rounds, result_queue))
+            process.start()
+            results, faults = result_queue.get()
+            process.join()
+        finally:
+            simulator.terminate()
+            simulator.wait()
+
+    print(f"[probe] {snapshot_probe.SNAPSHOT_WORKERS} DVRs at a time, one snapshot per DVR at a time")
+    for number, result in enumerate(results, 1):
+        probes = result['probes']
+        print(f"  round {number}: wall {result['wall']:6.2f} s   cpu {result['cpu']:6.2f} s   "
+              f"{result['snapshots'] / result['wall']:7.0f} snapshots/s   "
+              f"cpu/snapshot {result['cpu'] / max(1, result['snapshots']) * 1000:6.2f} ms   "
+              f"decoded {probes.get('decoded', 0):5d}   unchanged {probes.get('unchanged', 0):5d}   "
+              f"errors {probes.get('error', 0):3d}")
+    # Ті самі DVR, що й у симуляторі (рішення детерміновані для --seed)
+    fleet = build_fleet(argparse.Namespace(dvrs=args.dvrs, channels=args.channels, type='ip', base_port=20000,
+                                           seed=1, unauthorized=0.0, unwrapped=0.5, offline_rate=0.0,
+                                           frozen_rate=0.05, black_rate=0.05, static_rate=0.05))
+    expected = {}
+    static = set()
+    for dvr in fleet:
+        static.update((dvr.name, channel_key(DIGITAL, channel)) for channel in dvr.static)
+        expected.update(((dvr.name, channel_key(DIGITAL, channel)), 'black') for channel in dvr.black)
+        expected.update(((dvr.name, channel_key(DIGITAL, channel)), 'frozen') for channel in dvr.frozen)
+    found = sum(faults.get(key) == problem for key, problem in expected.items())
+    false = sum(key not in expected for key in faults)
+    print(f"  detected {found}/{len(expected)} faulty cameras "
+          f"({sum(problem == 'black' for problem in expected.values())} black, "
+          f"{sum(problem == 'frozen' for problem in expected.values())} frozen), false positives {false}, "
+          f"static scenes reported {sum(key in static for key in faults)}/{len(static)}")
+
+
+def bench_fastpath(args):
+    """
+    Обробка відповідей з незміненим станом каналів: повний розбір (кеш відбитків скинуто)
+    проти швидкого шляху. Як і на реальних DVR, кожне опитування отримує нове тіло
+    workingstatus (інші bitRate, CPU, пам'ять, вільне місце на диску).
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        write_fleet_config(directory, args.dvrs, args.channels, dvr_type='mixed')
+        os.chdir(directory)
+        try:
+            monitor = import_monitor()
+            monitor.event_sink = lambda events: None
+            rng = random.Random(0)
+            responses = {monitor.ANALOG_CHANNELS_PATH: FakeResponse(make_video_inputs_xml(args.channels)),
+                         monitor.IP_CHANNELS_PATH: FakeResponse(make_input_proxy_xml(args.channels))}
+            status_responses = [FakeResponse(make_working_status_json(args.channels, rng=rng)) for _ in range(16)]
+            polls = itertools.count()
+
+            def sweep(clear_cache):
+                with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                    for dvr_name, dvr_data in monitor.dvrs.items():
+                        if clear_cache:
+                            monitor.payload_cache.forget(dvr_name)
+                        responses[monitor.WORKING_STATUS_PATH] = status_responses[next(polls) % len(status_responses)]
+                        monitor.evaluate_dvr(dvr_name, dvr_data, responses)
+
+            sweep(False)
+            print(f"{args.dvrs} mixed DVRs x {args.channels} analog + {args.channels} IP channels, "
+                  f"unchanged channel state, live workingstatus counters")
+            full = best_of(lambda: sweep(True), repeat=3, number=1)
+            fast = best_of(lambda: sweep(False), repeat=3, number=1)
+            report("sweep", full, fast)
+            report("per DVR", full / args.dvrs, fast / args.dvrs)
+        finally:
+            os.chdir(cwd)
+
+
+def bench_reload(args):
+    """
+    Перезавантаження dvr_config.json з трьома зміненими DVR (один доданий, один змінений,
+    один видалений) для різних розмірів парку: читання і порівняння файлу, застосування
+    змін (apply_config + розклад) та повна перебудова (перевірка всього файлу і новий розклад).
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        write_fleet_config(directory, 1, args.channels)
+        os.chdir(directory)
+        try:
+            monitor = import_monitor()
+            logging.disable(logging.INFO)
+            path = os.path.join(directory, 'reload.json')
+            print(f"{'DVRs':>7} {'read + diff':>12} {'apply':>10} {'full rebuild':>13}")
+            for size in (args.dvrs, args.dvrs * 10, args.dvrs * 100):
+                fleet = fleet_config(size, args.channels, base_port=1000)
+                changed = copy.deepcopy(fleet)
+                del changed['DVR 0']
+                changed['DVR 1']['password'] = 'changed'
+                changed['DVR new'] = dict(fleet['DVR 2'], port=1)
+                monitor.dvrs.clear()
+                monitor.dvrs.update(copy.deepcopy(fleet))
+                # Працюючий моніторинг: пул запитів уже створено першим опитуванням
+                monitor.request_workers = None
+                monitor.grow_request_executor()
+                scheduler = DvrScheduler(180)
+                for dvr_name in fleet:
+                    scheduler.add(dvr_name)
+                hook = lambda added, removed, changed: monitor.update_scheduler(scheduler, added, removed, changed)
+                monitor.reload_hooks.append(hook)
+                read_times, apply_times = [], []
+                for target in (changed, fleet) * 3:
+                    with open(path, 'w') as file:
+                        json.dump(target, file)
+                    started = time.perf_counter()
+                    config = read_config(path)
+                    updates = diff_config(monitor.dvrs, config)
+                    validate_config(config, [dvr_name for dvr_name, dvr_data in updates.items() if dvr_data is not None])
+                    read_at = time.perf_counter()
+                    monitor.apply_config(updates)
+                    read_times.append(read_at - started)
+                    apply_times.append(time.perf_counter() - read_at)
+                monitor.reload_hooks.remove(hook)
+
+                started = time.perf_counter()
+                config = load_config(path)
+                rebuilt = DvrScheduler(180)
+                for dvr_name, dvr_data in config.items():
+                    rebuilt.add(dvr_name, dvr_data.get('interval'))
+                rebuild = time.perf_counter() - started
+                print(f"{size:7d} {min(read_times) * 1000:9.2f} ms {min(apply_times) * 1000:7.3f} ms {rebuild * 1000:10.2f} ms")
+        finally:
+            logging.disable(logging.NOTSET)
+            os.chdir(cwd)
+
+
+def bench_metrics(args):
+    """Накладні витрати метрик на одну перевірку DVR проти найдешевшої перевірки (незмінені відповіді)."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        write_fleet_config(directory, args.dvrs, args.channels)
+        os.chdir(directory)
+        try:
+            monitor = import_monitor()
+            monitor.event_sink = lambda events: None
+            responses = {monitor.IP_CHANNELS_PATH: FakeResponse(make_input_proxy_xml(args.channels)),
+                         monitor.WORKING_STATUS_PATH: FakeResponse(make_working_status_json(args.channels))}
+            items = list(monitor.dvrs.items())
+
+            def evaluate():
+                with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                    for dvr_name, dvr_data in items:
+                        monitor.evaluate_dvr(dvr_name, dvr_data, responses)
+
+            def record():
+                for dvr_name, _ in items:
+                    monitor.record_check(dvr_name, responses, 0.05, 0.0001)
+
+            evaluate()
+            record()
+            evaluate_time = best_of(evaluate, repeat=3, number=3) / len(items)
+            record_time = best_of(record, repeat=3, number=3) / len(items)
+            print(f"{len(items)} IP DVRs x {args.channels} channels")
+            print(f"fast-path evaluation per DVR {evaluate_time * 1e6:9.1f} us")
+            print(f"metrics per DVR check        {record_time * 1e6:9.1f} us   "
+                  f"({record_time / evaluate_time * 100:.1f}% of evaluation)")
+            render = best_of(monitor.metrics.registry.render, repeat=3, number=1)
+            print(f"/metrics render              {render * 1000:9.1f} ms")
+        finally:
+            os.chdir(cwd)
+
+
+def bench_logging(args):
+    """
+    Пропускна здатність потоків опитування при великому обсязі журналу:
+    без журналу, синхронний FileHandler (як basicConfig раніше) та черга logging_setup.
+    """
+    import logging_setup
+    cwd = os.getcwd()
+    records_per_check = 20
+    threads = 8
+    with tempfile.TemporaryDirectory() as directory:
+        write_fleet_config(directory, args.dvrs, args.channels)
+        os.chdir(directory)
+        try:
+            monitor = import_monitor()
+            monitor.event_sink = lambda events: None
+            responses = {monitor.IP_CHANNELS_PATH: FakeResponse(make_input_proxy_xml(args.channels)),
+                         monitor.WORKING_STATUS_PATH: FakeResponse(make_working_status_json(args.channels))}
+            root = logging.getLogger()
+            names = list(monitor.dvrs)
+            shards = [names[i::threads] for i in range(threads)]
+
+            def poller(dvr_names):
+                for dvr_name in dvr_names:
+                    monitor.payload_cache.forget(dvr_name)
+                    monitor.evaluate_dvr(dvr_name, monitor.dvrs[dvr_name], responses)
+                    for chan_no in range(records_per_check):
+                        logging.warning("DVR: %s, Digital IPCamera %03d - STILL OFFLINE (Duration: %s from %s)",
+                                        dvr_name, chan_no, "1:02:03", "2026-10-01 12:00",
+                                        extra={'dvr': dvr_name, 'camera': chan_no, 'event': 'still_offline'})
+
+            def slow_disk(handler, delay):
+                # Імітація повільного диска: кожен запис у файл чекає delay секунд (як під час зависання I/O)
+                if delay:
+                    flush = handler.flush
+                    handler.flush = lambda: (flush(), time.sleep(delay))
+
+            def run(label, handler, listener=None):
+                for old in list(root.handlers):
+                    root.removeHandler(old)
+                root.addHandler(handler)
+                root.setLevel(logging.INFO)
+                workers = [threading.Thread(target=poller, args=(shard,)) for shard in shards]
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                    for worker in workers:
+                        worker.start()
+                    for worker in workers:
+                        worker.join()
+                elapsed = time.perf_counter() - started
+                if listener is not None:
+                    logging_setup.stop_listener(listener)
+                drained = time.perf_counter() - started
+                handler.close()
+                print(f"{label:<36} {len(names) / elapsed:8.0f} checks/s   until written {drained:6.2f} s")
+
+            print(f"{len(names)} DVR checks (full parse, {args.channels} channels) on {threads} threads, "
+                  f"{records_per_check} log records per check")
+            run("no logging", logging.NullHandler())
+            for delay in (0, 0.0002):
+                disk = "slow disk" if delay else "fast disk"
+                legacy = logging.FileHandler(os.path.join(directory, 'legacy.txt'))
+                legacy.setFormatter(logging.Formatter(logging_setup.TEXT_FORMAT))
+                slow_disk(legacy, delay)
+                run(f"synchronous FileHandler, {disk}", legacy)
+                for log_format in ('text', 'json'):
+                    for old in list(root.handlers):
+                        root.removeHandler(old)
+                    listener = logging_setup.setup_logging(os.path.join(directory, f'queue_{log_format}.txt'),
+                                                           log_format=log_format, max_bytes=20 * 1024 * 1024)
+                    slow_disk(listener.handlers[0], delay)
+                    run(f"queue ({log_format}), {disk}", root.handlers[0], listener)
+        finally:
+            os.chdir(cwd)
+
+
+BENCHMARKS = {
+    'parser': bench_parser,
+    'state': bench_state,
+    'outages': bench_outages,
+    'shards': bench_shards,
+    'load': bench_load,
+    'events': bench_events,
+    'snapshots': bench_snapshots,
+    'fastpath': bench_fastpath,
+    'reload': bench_reload,
+    'metrics': bench_metrics,
+    'logging': bench_logging,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DVR monitoring benchmarks")
+    parser.add_argument('name', choices=sorted(BENCHMARKS))
+    parser.add_argument('--dvrs', type=int, default=500, help="number of simulated DVRs")
+    parser.add_argument('--channels', type=int, default=64, help="channels per DVR")
+    parser.add_argument('--sweeps', type=int, default=5, help="sweeps per run")
+    parser.add_argument('--rows', type=int, default=1000000, help="outage rows for the outages benchmark")
+    parser.add_argument('--mode', choices=('threads', 'async', 'both'), default='both',
+                        help="polling mode for the load benchmark")
+    parser.add_argument('--interval', type=float, default=10, help="polling interval for the events benchmark, s")
+    parser.add_argument('--changes', type=int, default=20, help="camera state changes in the events benchmark")
+    args, args.simulator_args = parser.parse_known_args()
+    if args.simulator_args and args.name not in ('load', 'events', 'snapshots'):
+        parser.error(f"unrecognized arguments: {' '.join(args.simulator_args)}")
+    if args.simulator_args[:1] == ['--']:
+        args.simulator_args = args.simulator_args[1:]
+    BENCHMARKS[args.name](args)
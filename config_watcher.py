@@ -0,0 +1,180 @@
+"""
+Перевірка dvr_config.json і його перезавантаження без перезапуску моніторингу.
+
+ConfigWatcher раз на CONFIG_RELOAD_INTERVAL секунд перевіряє час зміни та розмір
+файлу; після зміни файл читається, порівнюється з робочою конфігурацією, і далі
+передаються лише додані, змінені та видалені DVR. Якщо нова конфігурація
+некоректна, робоча лишається без змін.
+
+Налаштування (.env):
+    DVR_CONFIG              - файл конфігурації (dvr_config.json)
+    CONFIG_RELOAD_INTERVAL  - період перевірки файлу, с (5; 0 - без перезавантаження)
+"""
+import json
+import logging
+import numbers
+import os
+import threading
+import time
+
+CONFIG_FILE = os.getenv("DVR_CONFIG", "dvr_config.json")
+CONFIG_RELOAD_INTERVAL = float(os.getenv("CONFIG_RELOAD_INTERVAL", "5"))
+
+DVR_TYPES = ('analog', 'ip', 'mixed')
+# Скільки помилок показувати в повідомленні ConfigError (усі - в ConfigError.problems)
+MAX_REPORTED_PROBLEMS = 10
+
+
+class ConfigError(ValueError):
+    """Некоректний dvr_config.json; problems - список знайдених помилок."""
+
+    def __init__(self, problems):
+        shown = problems[:MAX_REPORTED_PROBLEMS]
+        if len(problems) > len(shown):
+            shown = shown + [f"... and {len(problems) - len(shown)} more"]
+        super().__init__("; ".join(shown))
+        self.problems = problems
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_dvr(dvr_name, dvr_data):
+    """:return: Список помилок запису DVR (порожній, якщо запис коректний)."""
+    if not isinstance(dvr_data, dict):
+        return [f"{dvr_name}: entry must be an object"]
+    problems = []
+    if dvr_data.get('type') not in DVR_TYPES:
+        problems.append(f"{dvr_name}: 'type' must be one of {', '.join(DVR_TYPES)}")
+    if not isinstance(dvr_data.get('ip'), str) or not dvr_data.get('ip'):
+        problems.append(f"{dvr_name}: 'ip' must be a non-empty string")
+    port = dvr_data.get('port')
+    if isinstance(port, str) and port.isdigit():
+        port = int(port)
+    if not _is_int(port) or not 0 < port < 65536:
+        problems.append(f"{dvr_name}: 'port' must be a number 1-65535")
+    for key in ('username', 'password'):
+        if not isinstance(dvr_data.get(key), str):
+            problems.append(f"{dvr_name}: '{key}' must be a string")
+    camera_ids = dvr_data.get('valid_camera_ids')
+    if dvr_data.get('type') in ('analog', 'mixed') or camera_ids is not None:
+        if not isinstance(camera_ids, list) or not all(_is_int(camera_id) and camera_id > 0 for camera_id in camera_ids):
+            problems.append(f"{dvr_name}: 'valid_camera_ids' must be a list of channel numbers")
+    interval = dvr_data.get('interval')
+    if interval is not None and (not isinstance(interval, numbers.Real) or isinstance(interval, bool) or interval <= 0):
+        problems.append(f"{dvr_name}: 'interval' must be a positive number of seconds")
+    if 'site' in dvr_data and not isinstance(dvr_data['site'], str):
+        problems.append(f"{dvr_name}: 'site' must be a string")
+    offset = dvr_data.get('ip_channel_offset')
+    if offset is not None and (not _is_int(offset) or offset < 0):
+        problems.append(f"{dvr_name}: 'ip_channel_offset' must be a non-negative channel number")
+    return problems
+
+
+def validate_config(config, dvr_names=None):
+    """
+    Перевіряє конфігурацію; ConfigError містить усі знайдені помилки.
+
+    :param dvr_names: Перевіряти лише ці DVR (None - всі).
+    """
+    if not isinstance(config, dict):
+        raise ConfigError(["configuration must be an object {DVR name: settings}"])
+    problems = []
+    for dvr_name in config if dvr_names is None else dvr_names:
+        problems += validate_dvr(dvr_name, config[dvr_name])
+    if problems:
+        raise ConfigError(problems)
+
+
+def read_config(path):
+    """:return: Вміст файлу конфігурації (без перевірки записів DVR)."""
+    with open(path, 'r', encoding='utf-8') as file:
+        try:
+            return json.load(file)
+        except ValueError as e:
+            raise ConfigError([f"{path}: invalid JSON: {e}"])
+
+
+def load_config(path=CONFIG_FILE):
+    """Читає та перевіряє конфігурацію (ConfigError, якщо вона некоректна)."""
+    config = read_config(path)
+    validate_config(config)
+    return config
+
+
+def diff_config(running, config):
+    """
+    Зміни між робочою та новою конфігурацією.
+
+    :return: {dvr_name: нові дані DVR або None, якщо DVR видалено} - лише додані, змінені та видалені DVR.
+    """
+    updates = {dvr_name: dvr_data for dvr_name, dvr_data in config.items() if running.get(dvr_name) != dvr_data}
+    for dvr_name in running.keys() - config.keys():
+        updates[dvr_name] = None
+    return updates
+
+
+class ConfigWatcher:
+    """
+    Фоновий потік, що стежить за файлом конфігурації.
+
+    Зміна визначається за часом зміни та розміром файлу (без залежностей на
+    кшталт inotify). Перевіряються лише додані та змінені записи - решта вже
+    працює; on_change отримує результат diff_config().
+
+    :param current: Функція, що повертає робочу конфігурацію {dvr_name: дані DVR}.
+    :param on_change: Функція(updates), що застосовує зміни.
+    """
+
+    def __init__(self, path, current, on_change, interval=CONFIG_RELOAD_INTERVAL):
+        self.path = path
+        self.current = current
+        self.on_change = on_change
+        self.interval = interval
+        self.signature = self._signature()
+        self.thread = None
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self):
+        """
+        Перевіряє файл і застосовує зміни.
+
+        :return: Застосовані зміни (словник diff_config) або None.
+        """
+        signature = self._signature()
+        if signature is None or signature == self.signature:
+            return None
+        self.signature = signature
+        try:
+            config = read_config(self.path)
+            if not isinstance(config, dict):
+                validate_config(config)
+            updates = diff_config(self.current(), config)
+            validate_config(config, [dvr_name for dvr_name, dvr_data in updates.items() if dvr_data is not None])
+        except (OSError, ConfigError) as e:
+            logging.error("Configuration %s not reloaded, keeping the running one: %s", self.path, e)
+            return None
+        if updates:
+            self.on_change(updates)
+        return updates
+
+    def start(self):
+        if self.interval <= 0 or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                logging.exception("Configuration reload failed")
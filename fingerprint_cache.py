@@ -0,0 +1,80 @@
+import hashlib
+import threading
+
+
+def fingerprint(content):
+    """Короткий хеш тіла відповіді."""
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+class FingerprintCache:
+    """
+    Відбитки останніх оброблених відповідей ISAPI кожного DVR.
+
+    Якщо всі відповіді перевірки збігаються з попередніми (той самий хеш тіла
+    або 304 Not Modified на умовний запит), стан каналів не міг змінитися,
+    тож розбір і переходи стану можна пропустити. ETag/Last-Modified
+    запам'ятовуються, якщо прошивка DVR їх надсилає.
+    """
+
+    def __init__(self):
+        # {dvr_name: {шлях: (хеш тіла, ETag, Last-Modified)}}
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def conditional_headers(self, dvr_name, path):
+        """:return: Заголовки умовного запиту (If-None-Match/If-Modified-Since) або None."""
+        entry = self.entries.get(dvr_name, {}).get(path)
+        if entry is None or (entry[1] is None and entry[2] is None):
+            return None
+        headers = {}
+        if entry[1] is not None:
+            headers['If-None-Match'] = entry[1]
+        if entry[2] is not None:
+            headers['If-Modified-Since'] = entry[2]
+        return headers
+
+    def compare(self, dvr_name, responses, contents=None):
+        """
+        Порівнює відповіді з відбитками попередньої обробки.
+
+        :param responses: {шлях: відповідь} однієї перевірки (статус 200 або 304).
+        :param contents: {шлях: байти} - порівнювати замість тіла відповіді лише дані, які
+            використовує обробка (тіло workingstatus містить і значення, що змінюються з кожним опитуванням).
+        :return: Нові відбитки для store() або None, якщо жодна відповідь не змінилась.
+        """
+        changed = not_modified = False
+        entries = {}
+        known = self.entries.get(dvr_name, {})
+        for path, response in responses.items():
+            previous = known.get(path)
+            if response.status_code == 304:
+                # Відбиток скинуто між запитом і відповіддю - повний запит буде наступного разу
+                if previous is None:
+                    return None
+                entries[path] = previous
+                not_modified = True
+                continue
+            digest = fingerprint(contents[path] if contents and path in contents else response.content)
+            headers = response.headers
+            entries[path] = (digest, headers.get('ETag'), headers.get('Last-Modified'))
+            changed = changed or previous is None or previous[0] != digest
+        if changed and not_modified:
+            # Тіла відповіді 304 немає, а розбирати треба всі відповіді разом:
+            # наступного разу запитуємо без умовних заголовків
+            self.forget(dvr_name)
+            return None
+        return entries if changed else None
+
+    def store(self, dvr_name, entries):
+        """Запам'ятовує відбитки після успішної обробки відповідей."""
+        with self.lock:
+            self.entries.setdefault(dvr_name, {}).update(entries)
+
+    def forget(self, dvr_name):
+        with self.lock:
+            self.entries.pop(dvr_name, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
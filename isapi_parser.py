@@ -0,0 +1,65 @@
+import json
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+# Повні імена тегів обчислюються один раз (простір імен Hikvision ISAPI)
+NAMESPACE = '{http://www.hikvision.com/ver20/XMLSchema}'
+VIDEO_INPUT_CHANNEL_TAG = NAMESPACE + 'VideoInputChannel'
+INPUT_PROXY_CHANNEL_TAG = NAMESPACE + 'InputProxyChannel'
+ID_TAG = NAMESPACE + 'id'
+NAME_TAG = NAMESPACE + 'name'
+ENABLED_TAG = NAMESPACE + 'videoInputEnabled'
+RES_DESC_TAG = NAMESPACE + 'resDesc'
+
+# Компактні записи каналів: лише поля, які потрібні для перевірки стану
+AnalogChannel = namedtuple('AnalogChannel', 'id name enabled res_desc')
+ProxyChannel = namedtuple('ProxyChannel', 'id name')
+
+
+def parse_video_inputs(content, valid_camera_ids=None):
+    """
+    Розбирає /ISAPI/System/Video/inputs/channels.
+
+    Байти розбираються одним викликом C-парсера без декодування в str; далі
+    обходяться лише елементи VideoInputChannel, канали поза valid_camera_ids
+    відкидаються одразу після читання id.
+
+    :param content: Тіло відповіді (bytes).
+    :param valid_camera_ids: Номери каналів, які треба перевіряти (None - всі).
+    :return: Список AnalogChannel; відсутні поля мають значення 'N/A'.
+    """
+    valid_ids = None if valid_camera_ids is None else set(valid_camera_ids)
+    channels = []
+    for elem in ET.fromstring(content).iter(VIDEO_INPUT_CHANNEL_TAG):
+        camera_id = elem.findtext(ID_TAG)
+        try:
+            channel_no = int(camera_id)
+        except (TypeError, ValueError):
+            continue
+        if valid_ids is not None and channel_no not in valid_ids:
+            continue
+        channels.append(AnalogChannel(camera_id, elem.findtext(NAME_TAG, 'N/A'),
+                                      elem.findtext(ENABLED_TAG, 'N/A'), elem.findtext(RES_DESC_TAG, 'N/A')))
+    return channels
+
+
+def parse_input_proxy_channels(content):
+    """
+    Розбирає /ISAPI/ContentMgmt/InputProxy/channels (лише id та name каналу).
+
+    :param content: Тіло відповіді (bytes).
+    :return: Список ProxyChannel у порядку відповіді.
+    """
+    return [ProxyChannel(elem.findtext(ID_TAG), elem.findtext(NAME_TAG))
+            for elem in ET.fromstring(content).iter(INPUT_PROXY_CHANNEL_TAG)]
+
+
+def parse_working_status(content):
+    """
+    Розбирає /ISAPI/System/workingstatus?format=json (обидва формати відповіді:
+    з обгорткою 'WorkingStatus' і без неї).
+
+    :return: Список ChanStatus.
+    """
+    data = json.loads(content)
+    return data.get('WorkingStatus', data)['ChanStatus']
@@ -0,0 +1,604 @@
+"""
+Локальний симулятор Hikvision ISAPI для навантажувального тестування без реального обладнання.
+
+Тисячі віртуальних DVR працюють в одному asyncio-циклі; кожен слухає власний порт
+(base_port + номер DVR) і віддає /ISAPI/System/Video/inputs/channels,
+/ISAPI/ContentMgmt/InputProxy/channels та /ISAPI/System/workingstatus?format=json
+з digest-автентифікацією. Налаштовуються кількість каналів, затримка, частка
+запитів, що зависають (таймаут клієнта), DVR з неправильним паролем (401),
+формат WorkingStatus (з обгорткою і без), ETag/304 (--etag) та зміна стану камер
+(періодична або за сценарієм).
+
+/ISAPI/Event/notification/alertStream - потік multipart/mixed з подіями videoloss
+(аналогові канали) та ipcDisconnect (IP-канали) при кожній зміні стану камери
+і heartbeat кожні HEARTBEAT_INTERVAL секунд (--no-alert-stream - відповідь 404).
+
+/ISAPI/Streaming/channels/<канал>01/picture - синтетичний JPEG (потрібен Pillow):
+кожен запит до робочої камери дає новий кадр, камери з --frozen-rate повертають
+той самий кадр, з --black-rate - чорний, з --static-rate - нерухому сцену, кожен знімок
+якої закодовано заново з іншим шумом матриці (інші байти, майже та сама картинка).
+
+Приклади:
+    python isapi_simulator.py --dvrs 1000 --channels 64 --config dvr_config.json
+    python isapi_simulator.py --dvrs 200 --latency 0.05 --jitter 0.1 --timeout-rate 0.01 --unauthorized 0.02
+    python isapi_simulator.py --dvrs 50 --flap-channels 2 --flap-period 30 --script flapping.json
+
+Сценарій (--script) - JSON-список подій із часом від запуску в секундах:
+    [{"at": 30, "dvr": "DVR 1", "channel": 5, "online": false},
+     {"at": 60, "dvr": "DVR 1", "channel": 7, "image": "frozen"},
+     {"at": 90, "dvr": "DVR 2", "reachable": false},
+     {"at": 120, "online": true}]
+"image" - зображення каналу: "live", "frozen", "static" або "black".
+Без "dvr" подія стосується всіх DVR, без "channel" - всіх каналів.
+
+Лічильники запитів доступні без автентифікації: GET /simulator/stats на будь-якому порту.
+Подію сценарію можна застосувати одразу: POST /simulator/event з JSON-подією в тілі (без "at").
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import secrets
+import signal
+import time
+from functools import partial
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+ANALOG_CHANNELS_PATH = "/ISAPI/System/Video/inputs/channels"
+IP_CHANNELS_PATH = "/ISAPI/ContentMgmt/InputProxy/channels"
+WORKING_STATUS_PATH = "/ISAPI/System/workingstatus?format=json"
+ALERT_STREAM_PATH = "/ISAPI/Event/notification/alertStream"
+SNAPSHOT_PATH = re.compile(r'/ISAPI/Streaming/channels/(\d+)/picture')
+STATS_PATH = "/simulator/stats"
+EVENT_PATH = "/simulator/event"
+
+REALM = "DS-7616NI"
+# Скільки тримати з'єднання без відповіді, імітуючи DVR, що не відповідає
+HANG_TIME = 60
+# Період heartbeat у потоці alertStream (videoloss inactive без каналу), с
+HEARTBEAT_INTERVAL = 10
+ALERT_BOUNDARY = "boundary"
+
+AUTH_PARAM = re.compile(r'(\w+)=(?:"([^"]*)"|([^\s,]*))')
+REASONS = {200: 'OK', 304: 'Not Modified', 401: 'Unauthorized', 404: 'Not Found'}
+
+
+def make_video_inputs_xml(channels, offline=None, disabled=None):
+    """
+    Відповідь /ISAPI/System/Video/inputs/channels.
+
+    :param offline: Номери каналів з resDesc 'NO VIDEO' (None - кожен 13-й).
+    :param disabled: Номери каналів з videoInputEnabled=false (None - кожен 17-й).
+    """
+    if offline is None:
+        offline = range(13, channels + 1, 13)
+    if disabled is None:
+        disabled = range(17, channels + 1, 17)
+    offline, disabled = set(offline), set(disabled)
+    items = ''.join(
+        f'<VideoInputChannel version="2.0"><id>{i}</id><inputPort>{i}</inputPort>'
+        f'<videoInputEnabled>{"false" if i in disabled else "true"}</videoInputEnabled>'
+        f'<name>Camera {i:03d}</name><videoFormat>PAL</videoFormat><portType>HD-TVI</portType>'
+        f'<resDesc>{"NO VIDEO" if i in offline else "1920*1080P25"}</resDesc></VideoInputChannel>'
+        for i in range(1, channels + 1))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><VideoInputChannelList version="2.0" '
+            f'xmlns="http://www.hikvision.com/ver20/XMLSchema">{items}</VideoInputChannelList>').encode()
+
+
+def make_input_proxy_xml(channels):
+    """Відповідь /ISAPI/ContentMgmt/InputProxy/channels."""
+    items = ''.join(
+        f'<InputProxyChannel version="2.0"><id>{i}</id><name>IPCamera {i:03d}</name>'
+        f'<sourceInputPortDescriptor><proxyProtocol>HIKVISION</proxyProtocol>'
+        f'<addressingFormatType>ipaddress</addressingFormatType><ipAddress>192.168.{i // 250}.{i % 250 + 1}</ipAddress>'
+        f'<managePortNo>8000</managePortNo><srcInputPort>1</srcInputPort><userName>admin</userName>'
+        f'<streamType>auto</streamType><deviceID></deviceID></sourceInputPortDescriptor>'
+        f'<enableAnonymous>false</enableAnonymous></InputProxyChannel>'
+        for i in range(1, channels + 1))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><InputProxyChannelList version="2.0" '
+            f'xmlns="http://www.hikvision.com/ver20/XMLSchema">{items}</InputProxyChannelList>').encode()
+
+
+def make_working_status_json(channels, wrapped=True, offline=None, rng=random):
+    """
+    Відповідь /ISAPI/System/workingstatus?format=json.
+
+    Як у реальних прошивок, потік каналу (bitRate, linkNum), завантаження CPU, пам'ять
+    і вільне місце на диску змінюються з кожним запитом; стан каналів (online) - ні.
+
+    :param wrapped: Формат з обгорткою {"WorkingStatus": {...}} (інакше - без неї).
+    :param offline: Номери каналів з online=0 (None - кожен 11-й).
+    :param rng: Генератор випадкових чисел для змінних значень.
+    """
+    offline = set(range(11, channels + 1, 11) if offline is None else offline)
+    chan_status = [{"chanNo": i, "online": 0 if i in offline else 1, "record": 1, "signal": 0,
+                    "linkNum": 0 if i in offline else rng.randint(1, 3),
+                    "bitRate": 0 if i in offline else rng.randint(3500, 4600)} for i in range(1, channels + 1)]
+    body = {"ChanStatus": chan_status, "deviceStatus": 0, "CPU": [{"cpuUtilization": rng.randint(5, 40)}],
+            "Memory": [{"memoryUsage": rng.randint(380, 420), "memoryAvailable": 512}],
+            "HD": [{"hdNo": 1, "hdStatus": 0, "volume": 3815447, "freeSpace": rng.randint(0, 1024) * 256}]}
+    return json.dumps({"WorkingStatus": body} if wrapped else body).encode()
+
+
+def body_etag(content):
+    return f'"{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+
+
+def make_alert_xml(event_type, channel=None, active=True, port=80):
+    """Частина потоку alertStream: EventNotificationAlert (channel=None - heartbeat)."""
+    channel_id = f'<channelID>{channel}</channelID>' if channel is not None else ''
+    return (f'<?xml version="1.0" encoding="UTF-8"?><EventNotificationAlert version="2.0" '
+            f'xmlns="http://www.hikvision.com/ver20/XMLSchema"><ipAddress>127.0.0.1</ipAddress>'
+            f'<portNo>{port}</portNo><protocol>HTTP</protocol><macAddress>00:00:00:00:00:00</macAddress>'
+            f'{channel_id}<dateTime>{time.strftime("%Y-%m-%dT%H:%M:%S")}</dateTime><activePostCount>1</activePostCount>'
+            f'<eventType>{event_type}</eventType><eventState>{"active" if active else "inactive"}</eventState>'
+            f'<eventDescription>{event_type} alarm</eventDescription></EventNotificationAlert>').encode()
+
+
+def alert_part(body):
+    """Обгортка частини multipart/mixed (як у Hikvision: з Content-Length)."""
+    return (f'--{ALERT_BOUNDARY}\r\nContent-Type: application/xml; charset="UTF-8"\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n').encode() + body + b'\r\n'
+
+
+class SnapshotFrames:
+    """
+    Набір синтетичних JPEG-кадрів, спільний для всіх камер (кодується один раз на старті).
+
+    Живі кадри - градієнт із шумом і рядком "OSD" з номером кадру, тож сусідні кадри
+    відрізняються, як у живої камери. Кадри статичної сцени - та сама сцена з
+    іншим шумом матриці (без OSD): байти JPEG різні, мініатюри майже однакові.
+
+    :param size: Розмір кадру (ширина, висота).
+    :param count: Кількість різних живих кадрів.
+    """
+
+    def __init__(self, size=(640, 360), count=8, quality=80):
+        base = Image.linear_gradient('L').resize(size).convert('RGB')
+        self.live = []
+        for i in range(count):
+            noise = Image.effect_noise(size, 16).convert('RGB')
+            frame = Image.blend(base, noise, 0.25)
+            ImageDraw.Draw(frame).text((10, 10), f"2024-01-01 00:00:{i:02d}  frame {i}", fill=(255, 255, 255))
+            self.live.append(self._encode(frame, quality))
+        width, height = size
+        scene = Image.linear_gradient('L').rotate(90).resize(size).convert('RGB')
+        draw = ImageDraw.Draw(scene)
+        for i in range(6):
+            left = width * i // 6
+            draw.rectangle((left + width // 24, height // 3, left + width // 8, height * 5 // 6), fill=(40 * i,) * 3)
+        self.static = [self._encode(Image.blend(scene, Image.effect_noise(size, 64).convert('RGB'), 0.05), quality)
+                       for _ in range(count)]
+        self.black = self._encode(Image.new('RGB', size), quality)
+
+    @staticmethod
+    def _encode(image, quality):
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality)
+        return buffer.getvalue()
+
+
+def fleet_config(dvr_count, channel_count, base_port=20000, dvr_type='ip', host='127.0.0.1'):
+    """Записи dvr_config.json для парку віртуальних DVR (порти base_port, base_port + 1, ...)."""
+    return {f"DVR {i}": {"type": dvr_type, "ip": host, "port": base_port + i, "username": "admin",
+                         "password": "admin", "valid_camera_ids": list(range(1, channel_count + 1))}
+            for i in range(dvr_count)}
+
+
+def write_fleet_config(directory, dvr_count, channel_count, base_port=20000, dvr_type='ip'):
+    """Записує dvr_config.json для парку віртуальних DVR у каталог directory."""
+    fleet = fleet_config(dvr_count, channel_count, base_port, dvr_type)
+    with open(os.path.join(directory, 'dvr_config.json'), 'w') as file:
+        json.dump(fleet, file)
+    return fleet
+
+
+def _md5(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+class VirtualDvr:
+    """
+    Один віртуальний DVR: стан каналів і кеш тіл відповідей.
+
+    Тіла відповідей генеруються лише після зміни стану каналів.
+
+    :param dvr_type: 'analog', 'ip' або 'mixed'.
+    :param password: Пароль, який очікує DVR (інший, ніж у конфігурації, - завжди 401).
+    :param wrapped: Формат WorkingStatus з обгорткою.
+    :param offline: Номери каналів, що не працюють на старті.
+    :param frozen: Номери каналів із застиглим зображенням.
+    :param black: Номери каналів із чорним зображенням.
+    :param static: Номери каналів, що знімають нерухому сцену.
+    """
+
+    def __init__(self, name, port, dvr_type, channels, username='admin', password='admin', wrapped=True, offline=(),
+                 frozen=(), black=(), static=()):
+        self.name = name
+        self.port = port
+        self.dvr_type = dvr_type
+        self.channels = channels
+        self.ha1 = _md5(f"{username}:{REALM}:{password}")
+        self.wrapped = wrapped
+        self.offline = set(offline)
+        self.frozen = set(frozen)
+        self.black = set(black)
+        self.static = set(static)
+        # Лічильники знімків каналів: кожен знімок робочої камери - наступний кадр
+        self.shots = {}
+        self.reachable = True
+        self.bodies = {}
+        # Черги відкритих потоків alertStream (None у черзі закриває потік)
+        self.streams = set()
+
+    def set_online(self, channel, online):
+        if online == (channel not in self.offline):
+            return
+        if online:
+            self.offline.discard(channel)
+        else:
+            self.offline.add(channel)
+        self.bodies.clear()
+        if self.streams:
+            event_types = {'analog': ('videoloss',), 'ip': ('ipcDisconnect',)}.get(self.dvr_type,
+                                                                                 ('videoloss', 'ipcDisconnect'))
+            for event_type in event_types:
+                part = alert_part(make_alert_xml(event_type, channel, not online, self.port))
+                for stream in self.streams:
+                    stream.put_nowait(part)
+
+    def set_reachable(self, reachable):
+        self.reachable = reachable
+        if not reachable:
+            for stream in self.streams:
+                stream.put_nowait(None)
+
+    def toggle(self, channel):
+        self.set_online(channel, channel in self.offline)
+
+    def set_image(self, channel, image):
+        """:param image: 'live', 'frozen', 'static' або 'black'."""
+        self.frozen.discard(channel)
+        self.black.discard(channel)
+        self.static.discard(channel)
+        if image == 'frozen':
+            self.frozen.add(channel)
+        elif image == 'black':
+            self.black.add(channel)
+        elif image == 'static':
+            self.static.add(channel)
+
+    def picture(self, stream_id, frames):
+        """:return: JPEG знімка потоку stream_id (101, 102, 201...) або None (немає каналу або камера offline)."""
+        channel, stream = divmod(stream_id, 100)
+        if frames is None or not 1 <= channel <= self.channels or stream not in (1, 2) or channel in self.offline:
+            return None
+        if channel in self.black:
+            return frames.black
+        if channel in self.frozen:
+            return frames.live[channel % len(frames.live)]
+        shot = self.shots[channel] = self.shots.get(channel, channel) + 1
+        if channel in self.static:
+            return frames.static[shot % len(frames.static)]
+        return frames.live[shot % len(frames.live)]
+
+    def body(self, path):
+        """:return: (тип вмісту, тіло, ETag) або None, якщо DVR не має такого ресурсу."""
+        body = self.bodies.get(path)
+        if body is None:
+            if path == ANALOG_CHANNELS_PATH and self.dvr_type in ('analog', 'mixed'):
+                body = 'application/xml', make_video_inputs_xml(self.channels, self.offline, ())
+            elif path == IP_CHANNELS_PATH and self.dvr_type in ('ip', 'mixed'):
+                body = 'application/xml', make_input_proxy_xml(self.channels)
+            elif path == WORKING_STATUS_PATH and self.dvr_type in ('ip', 'mixed'):
+                # Лічильники (bitRate, CPU...) змінюються з кожним запитом - тіло не кешується
+                body = 'application/json', make_working_status_json(self.channels, self.wrapped, self.offline)
+                return body + (body_etag(body[1]),)
+            else:
+                return None
+            body = self.bodies[path] = body + (body_etag(body[1]),)
+        return body
+
+    def authorized(self, method, authorization, nonce):
+        if not authorization or not authorization.startswith('Digest '):
+            return False
+        params = {key: quoted if quoted else plain for key, quoted, plain in AUTH_PARAM.findall(authorization)}
+        if params.get('nonce') != nonce:
+            return False
+        ha2 = _md5(f"{method}:{params.get('uri', '')}")
+        if params.get('qop'):
+            expected = _md5(f"{self.ha1}:{nonce}:{params.get('nc')}:{params.get('cnonce')}:{params['qop']}:{ha2}")
+        else:
+            expected = _md5(f"{self.ha1}:{nonce}:{ha2}")
+        return params.get('response') == expected
+
+
+class IsapiSimulator:
+    """
+    HTTP/1.1 сервер (keep-alive) для набору віртуальних DVR.
+
+    :param dvrs: Список VirtualDvr.
+    :param latency: Затримка відповіді, с.
+    :param jitter: Додаткова випадкова затримка 0..jitter, с.
+    :param timeout_rate: Частка запитів, на які DVR не відповідає.
+    :param etag: Надсилати ETag і відповідати 304 на If-None-Match (не всі прошивки це вміють).
+    :param alert_stream: Чи DVR підтримують /ISAPI/Event/notification/alertStream (інакше - 404).
+    :param seed: Зерно генератора випадкових чисел.
+    :param snapshot_size: Розмір JPEG-знімків (ширина, висота); без Pillow знімки не віддаються (404).
+    """
+
+    def __init__(self, dvrs, host='127.0.0.1', latency=0.0, jitter=0.0, timeout_rate=0.0, etag=False,
+                 alert_stream=True, seed=None, snapshot_size=(640, 360)):
+        self.dvrs = dvrs
+        self.by_name = {dvr.name: dvr for dvr in dvrs}
+        self.host = host
+        self.latency = latency
+        self.jitter = jitter
+        self.timeout_rate = timeout_rate
+        self.etag = etag
+        self.alert_stream = alert_stream
+        self.rng = random.Random(seed)
+        self.frames = SnapshotFrames(snapshot_size) if Image is not None else None
+        self.nonce = secrets.token_hex(16)
+        self.servers = []
+        self.tasks = []
+        self.started = time.monotonic()
+        self.stats = {'requests': 0, 'ok': 0, 'not_modified': 0, 'unauthorized': 0, 'not_found': 0, 'hung': 0,
+                      'connections': 0, 'streams': 0, 'alerts': 0, 'snapshots': 0}
+
+    async def start(self):
+        for dvr in self.dvrs:
+            self.servers.append(await asyncio.start_server(partial(self.handle, dvr), self.host, dvr.port,
+                                                           reuse_address=True, backlog=64))
+        self.started = time.monotonic()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        for server in self.servers:
+            server.close()
+        await asyncio.gather(*(server.wait_closed() for server in self.servers), return_exceptions=True)
+        self.servers = []
+
+    def start_flapping(self, channels, period):
+        """Кожні period секунд перемикає стан channels випадкових каналів кожного DVR."""
+        self.tasks.append(asyncio.ensure_future(self._flap(channels, period)))
+
+    def start_script(self, events):
+        """Запускає сценарій подій (див. опис модуля)."""
+        self.tasks.append(asyncio.ensure_future(self._script(sorted(events, key=lambda event: event['at']))))
+
+    async def _flap(self, channels, period):
+        flapping = {dvr.name: self.rng.sample(range(1, dvr.channels + 1), min(channels, dvr.channels))
+                    for dvr in self.dvrs}
+        while True:
+            await asyncio.sleep(period)
+            for dvr in self.dvrs:
+                for channel in flapping[dvr.name]:
+                    dvr.toggle(channel)
+
+    async def _script(self, events):
+        for event in events:
+            await asyncio.sleep(max(0.0, self.started + event['at'] - time.monotonic()))
+            self.apply_event(event)
+
+    def apply_event(self, event):
+        targets = [self.by_name[event['dvr']]] if 'dvr' in event else self.dvrs
+        for dvr in targets:
+            if 'reachable' in event:
+                dvr.set_reachable(event['reachable'])
+            if 'online' in event:
+                channels = [event['channel']] if 'channel' in event else range(1, dvr.channels + 1)
+                for channel in channels:
+                    dvr.set_online(channel, event['online'])
+            if 'image' in event:
+                channels = [event['channel']] if 'channel' in event else range(1, dvr.channels + 1)
+                for channel in channels:
+                    dvr.set_image(channel, event['image'])
+
+    async def handle(self, dvr, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                body = await reader.readexactly(length) if length else b''
+                method, target = request_line.decode('latin-1').split()[:2]
+
+                if target == STATS_PATH:
+                    self.respond(writer, 200, 'application/json', json.dumps(self.stats).encode())
+                    await writer.drain()
+                    continue
+                if target == EVENT_PATH and method == 'POST':
+                    self.apply_event(json.loads(body))
+                    self.respond(writer, 200, 'application/json', b'{}')
+                    await writer.drain()
+                    continue
+
+                self.stats['requests'] += 1
+                if not dvr.reachable or (self.timeout_rate and self.rng.random() < self.timeout_rate):
+                    self.stats['hung'] += 1
+                    await asyncio.sleep(HANG_TIME)
+                    break
+                delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+                if delay:
+                    await asyncio.sleep(delay)
+
+                if not dvr.authorized(method, headers.get('authorization'), self.nonce):
+                    self.stats['unauthorized'] += 1
+                    challenge = f'Digest qop="auth", realm="{REALM}", nonce="{self.nonce}", stale="FALSE"'
+                    self.respond(writer, 401, 'text/html', b'<html><body>401 Unauthorized</body></html>',
+                                 {'WWW-Authenticate': challenge})
+                elif target == ALERT_STREAM_PATH and self.alert_stream:
+                    await self.stream_alerts(dvr, writer)
+                    break
+                elif SNAPSHOT_PATH.match(target):
+                    picture = dvr.picture(int(SNAPSHOT_PATH.match(target).group(1)), self.frames)
+                    if picture is None:
+                        self.stats['not_found'] += 1
+                        self.respond(writer, 404, 'text/html', b'<html><body>404 Not Found</body></html>')
+                    else:
+                        self.stats['snapshots'] += 1
+                        self.respond(writer, 200, 'image/jpeg', picture)
+                else:
+                    content = dvr.body(target)
+                    if content is None:
+                        self.stats['not_found'] += 1
+                        self.respond(writer, 404, 'text/html', b'<html><body>404 Not Found</body></html>')
+                    elif self.etag and headers.get('if-none-match') == content[2]:
+                        self.stats['not_modified'] += 1
+                        self.respond(writer, 304, content[0], b'', {'ETag': content[2]})
+                    else:
+                        self.stats['ok'] += 1
+                        self.respond(writer, 200, content[0], content[1], {'ETag': content[2]} if self.etag else None)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass  # зупинка симулятора під час очікування
+        finally:
+            writer.close()
+
+    async def stream_alerts(self, dvr, writer):
+        """Потік alertStream до закриття з'єднання (або поки DVR не стане недоступним)."""
+        self.stats['streams'] += 1
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: multipart/mixed; boundary={ALERT_BOUNDARY}\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1'))
+        parts = asyncio.Queue()
+        dvr.streams.add(parts)
+        try:
+            while True:
+                try:
+                    part = await asyncio.wait_for(parts.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    part = alert_part(make_alert_xml('videoloss', None, False, dvr.port))
+                else:
+                    if part is None:
+                        break
+                    self.stats['alerts'] += 1
+                writer.write(part)
+                await writer.drain()
+        finally:
+            dvr.streams.discard(parts)
+
+    @staticmethod
+    def respond(writer, status, content_type, body, extra_headers=None):
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n")
+        for name, value in (extra_headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        writer.write(head.encode('latin-1') + b"\r\n" + body)
+
+
+def build_fleet(args):
+    """Віртуальні DVR за параметрами командного рядка (рішення детерміновані для --seed)."""
+    rng = random.Random(args.seed)
+    dvrs = []
+    for i in range(args.dvrs):
+        dvrs.append(VirtualDvr(
+            f"DVR {i}", args.base_port + i, args.type, args.channels,
+            password='wrong' if rng.random() < args.unauthorized else 'admin',
+            wrapped=rng.random() >= args.unwrapped,
+            offline=[channel for channel in range(1, args.channels + 1) if rng.random() < args.offline_rate]))
+    # Окремий генератор для зображень: розподіл offline-каналів для --seed не змінюється
+    image_rng = random.Random(f"{args.seed}-image")
+    for dvr in dvrs:
+        for channel in range(1, args.channels + 1):
+            draw = image_rng.random()
+            if draw < args.black_rate:
+                dvr.black.add(channel)
+            elif draw < args.black_rate + args.frozen_rate:
+                dvr.frozen.add(channel)
+            elif draw < args.black_rate + args.frozen_rate + args.static_rate:
+                dvr.static.add(channel)
+    return dvrs
+
+
+async def serve(args):
+    simulator = IsapiSimulator(build_fleet(args), args.host, args.latency, args.jitter, args.timeout_rate,
+                               args.etag, not args.no_alert_stream, args.seed, args.snapshot_size)
+    await simulator.start()
+    if args.flap_channels and args.flap_period:
+        simulator.start_flapping(args.flap_channels, args.flap_period)
+    if args.script:
+        with open(args.script, 'r') as file:
+            simulator.start_script(json.load(file))
+    if args.config:
+        with open(args.config, 'w') as file:
+            json.dump(fleet_config(args.dvrs, args.channels, args.base_port, args.type, args.host), file, indent=4)
+    # Перший рядок виводу - ознака готовності (його чекає benchmark.py load)
+    print(f"ISAPI simulator: {args.dvrs} {args.type} DVRs x {args.channels} channels on "
+          f"{args.host}:{args.base_port}-{args.base_port + args.dvrs - 1}", flush=True)
+    if simulator.frames is None:
+        print("Pillow is not installed: snapshot requests are answered with 404", flush=True)
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, AttributeError):
+        pass  # Windows
+    try:
+        await stop.wait()
+    finally:
+        await simulator.stop()
+        print(f"Simulator stats: {simulator.stats}", flush=True)
+
+
+def _size(value):
+    width, _, height = value.lower().partition('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hikvision ISAPI simulator")
+    parser.add_argument('--dvrs', type=int, default=100, help="number of virtual DVRs")
+    parser.add_argument('--channels', type=int, default=64, help="channels per DVR")
+    parser.add_argument('--type', choices=('analog', 'ip', 'mixed'), default='ip')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=20000, help="port of the first DVR")
+    parser.add_argument('--latency', type=float, default=0.0, help="response delay, s")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random delay 0..jitter, s")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="fraction of requests left unanswered")
+    parser.add_argument('--unauthorized', type=float, default=0.0, help="fraction of DVRs rejecting the password")
+    parser.add_argument('--unwrapped', type=float, default=0.5,
+                        help="fraction of DVRs returning WorkingStatus without the wrapper object")
+    parser.add_argument('--offline-rate', type=float, default=0.05, help="fraction of channels offline at start")
+    parser.add_argument('--flap-channels', type=int, default=0, help="channels per DVR toggled every flap period")
+    parser.add_argument('--flap-period', type=float, default=0.0, help="flap period, s")
+    parser.add_argument('--script', help="JSON file with scripted events")
+    parser.add_argument('--etag', action='store_true', help="send ETag and answer If-None-Match with 304")
+    parser.add_argument('--no-alert-stream', action='store_true', help="answer alertStream requests with 404")
+    parser.add_argument('--frozen-rate', type=float, default=0.0, help="fraction of channels with a frozen image")
+    parser.add_argument('--black-rate', type=float, default=0.0, help="fraction of channels with a black image")
+    parser.add_argument('--static-rate', type=float, default=0.0,
+                        help="fraction of channels filming a static scene (new encode per snapshot)")
+    parser.add_argument('--snapshot-size', type=_size, default=(640, 360), help="snapshot JPEG size, WxH")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--config', help="write dvr_config.json for the simulated fleet to this path")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
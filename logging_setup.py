@@ -0,0 +1,209 @@
+"""
+Журналювання через чергу: потоки опитування лише ставлять записи в чергу,
+а запис у файл, ротацію та стиснення виконує окремий потік QueueListener.
+
+Налаштування (.env):
+    LOG_FILE          - файл журналу (camera_log.txt)
+    LOG_LEVEL         - рівень (INFO)
+    LOG_FORMAT        - text або json (JSON-рядки з полями dvr/camera/event)
+    LOG_MAX_BYTES     - ротація за розміром (10 МБ; 0 - без ротації за розміром)
+    LOG_ROTATE_WHEN   - ротація за часом замість розміру: midnight, H, D, W0... (порожньо - за розміром)
+    LOG_BACKUP_COUNT  - кількість архівних файлів (10)
+    LOG_COMPRESS      - стискати архівні файли gzip (1)
+    LOG_QUEUE_SIZE    - розмір черги; при переповненні записи відкидаються, а не блокують опитування
+"""
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from datetime import datetime
+
+import metrics
+
+LOG_FILE = os.getenv("LOG_FILE", "camera_log.txt")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "10"))
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "1") not in ("0", "false", "no")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "100000"))
+# Скільки записів потік запису обробляє між скиданнями буфера файлу
+WRITE_BATCH = 1000
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Поля extra, які переносяться в JSON-записи
+STRUCTURED_FIELDS = ('dvr', 'camera', 'event')
+# Бібліотеки, що журналюють кожен HTTP-запит на рівні INFO (httpx - "HTTP Request: GET ..."):
+# для них лише попередження та помилки
+QUIET_LOGGERS = ('httpx', 'httpcore')
+
+dropped_records = metrics.counter('log_records_dropped_total', "Log records dropped because the log queue was full")
+
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-об'єкт на рядок: час, рівень, повідомлення та поля dvr/camera/event, якщо вони передані в extra."""
+
+    def format(self, record):
+        entry = {'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                 'level': record.levelname, 'message': record.getMessage()}
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler для черги в межах процесу (queue.SimpleQueue).
+
+    Стандартний prepare() форматує повідомлення в потоці, що журналює;
+    тут запис передається як є, і форматування (%-аргументи) виконує потік запису.
+    Якщо в черзі вже max_size записів, запис відкидається (лічильник log_records_dropped_total).
+    """
+
+    def __init__(self, log_queue, max_size=LOG_QUEUE_SIZE):
+        super().__init__(log_queue)
+        self.max_size = max_size
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            dropped_records.inc()
+            return
+        self.queue.put_nowait(record)
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """QueueListener, що забирає з черги пачки записів і скидає буфери обробників раз на пачку."""
+
+    def _monitor(self):
+        log_queue = self.queue
+        while True:
+            batch = [log_queue.get()]
+            try:
+                while len(batch) < WRITE_BATCH:
+                    batch.append(log_queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                    break
+                self.handle(record)
+            for handler in self.handlers:
+                handler.flush_buffer()
+            if stop:
+                break
+
+
+class BufferedWriteMixin:
+    """
+    Обробник файлу без flush() після кожного рядка (StreamHandler.emit викликає flush
+    на кожен запис); буфер скидає BatchQueueListener через flush_buffer().
+    """
+
+    def flush(self):
+        pass
+
+    def flush_buffer(self):
+        with self.lock:
+            if self.stream is not None:
+                self.stream.flush()
+
+
+class TimedRotatingLogHandler(BufferedWriteMixin, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+
+class SizeRotatingLogHandler(BufferedWriteMixin, logging.handlers.RotatingFileHandler):
+    """
+    Ротація за розміром, що форматує запис один раз і сама рахує розмір файлу
+    (RotatingFileHandler.shouldRollover форматує кожен запис ще раз і робить seek).
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.size = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            length = len(msg.encode('utf-8'))
+            if self.maxBytes > 0 and self.size and self.size + length > self.maxBytes:
+                self.doRollover()
+                self.size = 0
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg)
+            self.size += length
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+def _gzip_namer(name):
+    return name + '.gz'
+
+
+def _gzip_rotator(source, destination):
+    with open(source, 'rb') as src, gzip.open(destination, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def file_handler(filename=LOG_FILE, max_bytes=LOG_MAX_BYTES, rotate_when=LOG_ROTATE_WHEN,
+                 backup_count=LOG_BACKUP_COUNT, compress=LOG_COMPRESS):
+    """Файловий обробник з ротацією за розміром або часом і (за потреби) стисненням архівів."""
+    if rotate_when:
+        handler = TimedRotatingLogHandler(filename, when=rotate_when, backupCount=backup_count, encoding='utf-8')
+    else:
+        handler = SizeRotatingLogHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    if compress:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def stop_listener(listener):
+    """Дописує записи, що лишились у черзі, і зупиняє потік запису (повторний виклик нічого не робить)."""
+    if listener._thread is not None:
+        listener.stop()
+
+
+def setup_logging(filename=LOG_FILE, level=LOG_LEVEL, log_format=LOG_FORMAT, queue_size=LOG_QUEUE_SIZE, **rotation):
+    """
+    Налаштовує кореневий логер: LazyQueueHandler -> черга -> BatchQueueListener -> файл.
+
+    Як і logging.basicConfig, не змінює обробники, якщо в кореневого логера вже є
+    обробники (напр. у процесі-обробнику шардованого режиму); рівень QUIET_LOGGERS
+    встановлюється в будь-якому разі.
+
+    :param rotation: Параметри file_handler (max_bytes, rotate_when, backup_count, compress).
+    :return: Запущений QueueListener або None.
+    """
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    handler = file_handler(filename, **rotation)
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.SimpleQueue()
+    listener = BatchQueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    root.addHandler(LazyQueueHandler(log_queue, queue_size))
+    root.setLevel(level)
+    return listener
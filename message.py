@@ -1,19 +1,169 @@
 import requests, os
+import queue
+import threading
+import time
+import atexit
 from dotenv import load_dotenv
 
+import metrics
+
 # Завантаження змінних із .env файлу
 load_dotenv()
 
 # Отримання значень змінних
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Адреса Bot API (можна вказати локальну заглушку telegram_stub.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Вікно об'єднання подій одного DVR в одне повідомлення (секунди)
+COALESCE_WINDOW = float(os.getenv("TELEGRAM_COALESCE_WINDOW", "5"))
+# Мінімальний проміжок між повідомленнями в один чат (обмеження Telegram - ~1 повідомлення/с)
+MIN_SEND_INTERVAL = float(os.getenv("TELEGRAM_MIN_SEND_INTERVAL", "1"))
+MAX_RETRIES = 5
+REQUEST_TIMEOUT = 10
+# Максимальна довжина тексту повідомлення в Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+send_latency = metrics.histogram('telegram_send_seconds', "Telegram sendMessage request latency")
+deliveries = metrics.counter('telegram_deliveries_total',
+                             "Telegram send attempts by result (sent, rate_limited, error, failed)", ('result',))
+
+
+class TelegramNotifier:
+    """
+    Черга вихідних повідомлень у Telegram з фоновим потоком доставки.
+
+    Повідомлення з однаковим ключем (назвою DVR), що надійшли протягом
+    coalesce_window секунд, об'єднуються в одне. Між відправками в чат
+    витримується min_send_interval; на відповідь 429 потік чекає retry_after,
+    на мережеві помилки та 5xx - повторює спробу з експоненційною затримкою.
+    Метод send() ніколи не блокує виклику.
+
+    :param token: Токен бота.
+    :param chat_id: Ідентифікатор чату.
+    :param api_url: Базова адреса Bot API.
+    """
+
+    def __init__(self, token, chat_id, api_url=TELEGRAM_API_URL,
+                 coalesce_window=COALESCE_WINDOW, min_send_interval=MIN_SEND_INTERVAL):
+        self.url = f"{api_url}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.coalesce_window = coalesce_window
+        self.min_send_interval = min_send_interval
+        self.queue = queue.Queue()
+        self.session = requests.Session()
+        self.next_send_time = 0.0
+        self.sent_count = 0
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='telegram-notifier', daemon=True)
+                self.thread.start()
+
+    def send(self, message, key=None):
+        """Ставить повідомлення в чергу на відправку."""
+        self.start()
+        self.queue.put((key, message))
+
+    def flush(self, timeout=None):
+        """Негайно відправляє все, що накопичилось, і чекає завершення відправки."""
+        if self.thread is None:
+            return True
+        done = threading.Event()
+        self.queue.put((None, done))
+        return done.wait(timeout)
+
+    def _run(self):
+        # key -> (час першого повідомлення, [тексти])
+        pending = {}
+        while True:
+            timeout = None
+            if pending:
+                oldest = min(first for first, _ in pending.values())
+                timeout = max(0.0, oldest + self.coalesce_window - time.monotonic())
+            try:
+                key, message = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                key, message = None, None
+
+            if isinstance(message, threading.Event):
+                for batch_key in list(pending):
+                    self._deliver_batch(pending.pop(batch_key)[1])
+                message.set()
+                continue
+            if message is not None:
+                pending.setdefault(key, (time.monotonic(), []))[1].append(message)
+
+            now = time.monotonic()
+            for batch_key in [k for k, (first, _) in pending.items() if now - first >= self.coalesce_window]:
+                self._deliver_batch(pending.pop(batch_key)[1])
+
+    def _deliver_batch(self, messages):
+        text = ''
+        for message in messages:
+            if text and len(text) + len(message) + 1 > MAX_MESSAGE_LENGTH:
+                self._deliver(text)
+                text = ''
+            text = f"{text}\n{message}" if text else message[:MAX_MESSAGE_LENGTH]
+        if text:
+            self._deliver(text)
+
+    def _deliver(self, text):
+        payload = {"chat_id": self.chat_id, "text": text}
+        backoff = 1.0
+        for _ in range(MAX_RETRIES):
+            wait = self.next_send_time - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                deliveries.inc('error')
+                print(f"Помилка надсилання в Telegram: {e}")
+            else:
+                send_latency.observe(time.perf_counter() - started)
+                self.next_send_time = time.monotonic() + self.min_send_interval
+                if response.status_code == 200:
+                    self.sent_count += 1
+                    deliveries.inc('sent')
+                    print(f"Надсилання в Telegram: {text}")
+                    return True
+                if response.status_code == 429:
+                    try:
+                        retry_after = response.json()['parameters']['retry_after']
+                    except (ValueError, KeyError, TypeError):
+                        retry_after = backoff
+                    self.next_send_time = time.monotonic() + retry_after
+                    deliveries.inc('rate_limited')
+                    continue
+                deliveries.inc('error')
+                if response.status_code < 500:
+                    print(f"Помилка надсилання в Telegram: {response.status_code} {response.text}")
+                    return False
+                print(f"Помилка надсилання в Telegram: {response.status_code}")
+            time.sleep(backoff)
+            backoff *= 2
+        deliveries.inc('failed')
+        print(f"Повідомлення не надіслано після {MAX_RETRIES} спроб: {text}")
+        return False
+
+
+notifier = TelegramNotifier(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID)
+atexit.register(notifier.flush, REQUEST_TIMEOUT)
+metrics.gauge('telegram_queue_depth', "Messages waiting in the Telegram queue",
+              collect=lambda: {(): notifier.queue.qsize()})
+
+
+def send_to_telegram(message, key=None):
+    """
+    Ставить повідомлення в чергу на відправку в Telegram (не блокує).
 
-def send_to_telegram(message):
-    """Проста функція для надсилання повідомлення в Telegram."""
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
-    try:
-        requests.post(url, json=payload)
-        print(f"Надсилання в Telegram: {message}")
-    except requests.RequestException as e:
-        print(f"Помилка надсилання в Telegram: {e}")
+    :param message: Текст повідомлення.
+    :param key: Ключ об'єднання (назва DVR) - події одного DVR надсилаються одним повідомленням.
+    """
+    notifier.send(message, key)
@@ -0,0 +1,295 @@
+"""
+Легкі метрики у текстовому форматі Prometheus та вбудований семплюючий профайлер.
+
+Метрики віддає HTTP-сервер у фоновому потоці (METRICS_PORT, 0 - вимкнено):
+    GET /metrics                  - усі метрики
+    GET /profile?seconds=10       - профіль за seconds секунд (folded stacks для flamegraph)
+    GET /profile/start, /profile/stop - ручне ввімкнення/вимкнення профайлера
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Період вибірки профайлера, с
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """
+    Базовий клас метрики з мітками.
+
+    Значення зберігаються в словнику {кортеж значень міток: значення}; оновлення
+    виконуються під блокуванням, тож їх можна викликати з будь-якого потоку.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def samples(self):
+        """:return: Список (суфікс назви, значення міток, додаткова мітка, значення)."""
+        with self.lock:
+            return [('', labels, '', value) for labels, value in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, labels, extra)} {value!r}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Поточне значення. Якщо задано collect, значення обчислюються під час
+    запиту /metrics (функція повертає {кортеж значень міток: значення}),
+    тож у гарячому шляху нічого не оновлюється.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, label_names=(), collect=None):
+        super().__init__(name, help_text, label_names)
+        self.collect = collect
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def samples(self):
+        if self.collect is None:
+            return super().samples()
+        return [('', labels, '', value) for labels, value in self.collect().items()]
+
+
+class Summary(Metric):
+    """Сума і кількість спостережень (без квантилів) - дешево навіть для тисяч DVR."""
+    kind = 'summary'
+
+    def observe(self, value, *labels):
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                self.values[labels] = [value, 1]
+            else:
+                state[0] += value
+                state[1] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, tuple(state)) for labels, state in self.values.items()]
+        samples = []
+        for labels, (total, count) in items:
+            samples.append(('_sum', labels, '', total))
+            samples.append(('_count', labels, '', count))
+        return samples
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                # [лічильники по кошиках (+Inf останній), сума]
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        samples = []
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', labels, 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"', cumulative))
+            samples.append(('_sum', labels, '', total))
+            samples.append(('_count', labels, '', cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+registry = Registry()
+
+
+def counter(name, help_text, label_names=()):
+    return registry.register(Counter(name, help_text, label_names))
+
+
+def gauge(name, help_text, label_names=(), collect=None):
+    return registry.register(Gauge(name, help_text, label_names, collect))
+
+
+def summary(name, help_text, label_names=()):
+    return registry.register(Summary(name, help_text, label_names))
+
+
+def histogram(name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(name, help_text, label_names, buckets))
+
+
+class SamplingProfiler:
+    """
+    Семплюючий профайлер: фоновий потік кожні interval секунд знімає стеки всіх
+    потоків (sys._current_frames) і рахує однакові стеки. Поки профайлер
+    вимкнений, накладних витрат немає.
+
+    Результат - folded stacks ("потік;файл:функція;... кількість"), формат flamegraph.pl/speedscope.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return False
+            self.stacks = StackCounter()
+            self.samples = 0
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        """:return: Зібрані стеки у форматі folded stacks."""
+        with self.lock:
+            if self.thread is None:
+                return ''
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(frames))] += 1
+            self.samples += 1
+
+
+profiler = SamplingProfiler()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/metrics':
+            self.reply(200, registry.render(), 'text/plain; version=0.0.4')
+        elif url.path == '/profile':
+            try:
+                seconds = float(query.get('seconds', ['10'])[0])
+            except ValueError:
+                seconds = -1.0
+            if not 0 <= seconds < float('inf'):
+                self.reply(400, "seconds must be a non-negative number\n")
+                return
+            if not profiler.start():
+                self.reply(409, "profiler is already running\n")
+                return
+            try:
+                time.sleep(seconds)
+            finally:
+                # Профайлер зупиняється, навіть якщо клієнт відключився раніше
+                report = profiler.stop()
+            self.reply(200, report)
+        elif url.path == '/profile/start':
+            self.reply(200, "profiler started\n" if profiler.start() else "profiler is already running\n")
+        elif url.path == '/profile/stop':
+            self.reply(200, profiler.stop())
+        else:
+            self.reply(404, "not found\n")
+
+    def reply(self, status, text, content_type='text/plain'):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Запускає HTTP-сервер метрик у фоновому потоці.
+
+    :return: Сервер або None, якщо port == 0.
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
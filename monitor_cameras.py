@@ -1,302 +1,579 @@
 import requests
 import threading
 import logging
-import json, time, os
-import xml.etree.ElementTree as ET
+import time, os, sys
 from concurrent.futures import ThreadPoolExecutor
 from requests.auth import HTTPDigestAuth
-from datetime import datetime, timedelta
+from datetime import datetime
 from message import send_to_telegram
-
-# Налаштування журналювання
-logging.basicConfig(filename='camera_log.txt', level=logging.INFO,
-                     format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Словник для кількох DVR
-with open('dvr_config.json', 'r') as file:
-    dvrs = json.load(file)
-
-# Структура для зберігання стану камер
-camera_status = {dvr_name: {} for dvr_name in dvrs.keys()}
-connection_lost_time = {dvr_name: None for dvr_name in dvrs.keys()}
-dvr_status = {dvr_name: {} for dvr_name in dvrs.keys()}
-dvr_connection_lost_time = {dvr_name: None for dvr_name in dvrs.keys()}
+from scheduler import DvrScheduler
+from state_store import (CameraStateStore, StateJournal, Transition, channel_key, split_channel_key, ANALOG, DIGITAL,
+                         NEW_OFFLINE, OFFLINE, STILL_OFFLINE, ONLINE, DVR_LOST, DVR_STILL_LOST, DVR_RESTORED,
+                         IMAGE_FAULT, IMAGE_OK)
+from outage_store import OutageWriter, OUTAGE_DB
+from isapi_parser import parse_video_inputs, parse_input_proxy_channels, parse_working_status
+from fingerprint_cache import FingerprintCache
+from alert_stream import alert_channel_key
+from config_watcher import ConfigWatcher, load_config, CONFIG_FILE
+import snapshot_probe
+import metrics
+from logging_setup import setup_logging
+
+# Словник для кількох DVR: заповнює load_dvrs() у точці входу; процес-обробник шардованого
+# режиму отримує свою частину від координатора, а не з файлу
+dvrs = {}
+
+# Сховище стану камер і DVR та його журнал на диску (стан переживає перезапуск)
+state_store = CameraStateStore()
+state_journal = StateJournal(state_store, os.getenv("STATE_DIR", "."))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "5"))
+
+def camera_counts():
+    """Кількість камер за DVR, типом і станом (обчислюється під час запиту /metrics)."""
+    counts = {}
+    for dvr_name, (_, channels) in state_store.snapshot().items():
+        for key, since in channels.items():
+            labels = (dvr_name, split_channel_key(key)[0], 'online' if since is None else 'offline')
+            counts[labels] = counts.get(labels, 0) + 1
+    return counts
+
+def unreachable_dvrs():
+    return {(dvr_name,): int(lost_since is not None) for dvr_name, (lost_since, _) in state_store.snapshot().items()}
+
+# Метрики (metrics.py): тривалість перевірок, запити ISAPI по DVR, стан камер
+check_duration = metrics.histogram('camera_monitor_check_duration_seconds',
+                                   "DVR check duration by phase: fetch (HTTP), evaluate (parsing and state), total",
+                                   ('phase',))
+request_latency = metrics.summary('camera_monitor_dvr_request_seconds', "ISAPI request latency per DVR", ('dvr',))
+request_errors = metrics.counter('camera_monitor_dvr_request_errors_total',
+                                 "Failed ISAPI requests per DVR (timeout, connection, auth, status)", ('dvr', 'kind'))
+metrics.gauge('camera_monitor_cameras', "Cameras by DVR, type and state", ('dvr', 'type', 'state'), collect=camera_counts)
+metrics.gauge('camera_monitor_dvr_unreachable', "1 if the DVR is unreachable", ('dvr',), collect=unreachable_dvrs)
+
+# Відбитки останніх відповідей ISAPI: незмінені відповіді не розбираються повторно
+payload_cache = FingerprintCache()
+
+# Зведення камер, що досі offline, раз на OFFLINE_SUMMARY_INTERVAL секунд (замість рядка на кожну камеру щоразу)
+OFFLINE_SUMMARY_INTERVAL = float(os.getenv("OFFLINE_SUMMARY_INTERVAL", "900"))
+summary_thread = None
+# HTTP-сервер метрик (metrics.start_server), запускається один раз
+metrics_server = None
+# Назви каналів з останнього розбору відповідей: {dvr_name: {ключ каналу: назва}} (для подій alertStream)
+channel_names = {}
+
+# Історія відключень камер (SQLite), запис у фоновому потоці
+outage_writer = OutageWriter(OUTAGE_DB)
+
+# Обробник подій переходів: None - обробляти в цьому процесі (report_events),
+# інакше функція, що пересилає події координатору (шардований режим)
+event_sink = None
 
 timer = None
 
+# Постійні HTTP-сесії по DVR та пул потоків для паралельних запитів ISAPI (створюється з першим запитом).
+# request_workers - скільки потоків пулу потрібно всім DVR (None, доки пул не створено), після створення
+# оновлюється apply_config лише на зміни; request_executor_size - скільки потоків у поточному пулі.
+sessions = {}
+sessions_lock = threading.Lock()
+request_workers = None
+request_executor_size = 0
+request_executor = None
+request_executor_lock = threading.Lock()
+
+# Обробники змін конфігурації в рушії опитування: функції (added, removed, changed) зі списками назв DVR
+reload_hooks = []
+config_watcher = None
+
+# Шляхи ISAPI та таймаут запитів
+ANALOG_CHANNELS_PATH = "/ISAPI/System/Video/inputs/channels"
+IP_CHANNELS_PATH = "/ISAPI/ContentMgmt/InputProxy/channels"
+WORKING_STATUS_PATH = "/ISAPI/System/workingstatus?format=json"
+REQUEST_TIMEOUT = 8
+
+# Режим опитування: 'threads' (ThreadPoolExecutor) або 'async' (asyncio з постійними сесіями)
+POLLING_MODE = os.getenv("POLLING_MODE", "threads")
+# Кількість процесів-обробників у шардованому режимі (0 або 1 - все в одному процесі)
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+# Режим подій: потік alertStream на кожен DVR + рідке звірне опитування (працює в asyncio-рушії)
+ALERT_STREAM = os.getenv("ALERT_STREAM", "0") not in ("0", "false", "no")
+# Перевірка знімків камер на чорне/застигле зображення (snapshot_probe.py, потрібні numpy та Pillow)
+SNAPSHOT_PROBE = os.getenv("SNAPSHOT_PROBE", "0") not in ("0", "false", "no")
+image_probe = None
+
 # Скидання глобальних змінних
 def reset_status():
-    global camera_status, connection_lost_time, dvr_status, dvr_connection_lost_time
-    camera_status = {dvr_name: {} for dvr_name in dvrs.keys()}
-    connection_lost_time = {dvr_name: None for dvr_name in dvrs.keys()}
-    dvr_status = {dvr_name: {} for dvr_name in dvrs.keys()}
-    dvr_connection_lost_time = {dvr_name: None for dvr_name in dvrs.keys()}
-    
+    state_store.reset()
+    payload_cache.clear()
+    channel_names.clear()
+    if image_probe is not None:
+        image_probe.cameras.clear()
+
     logging.info("Statuses have been reset.")
 
 # Очищення консолі
 def clear_console():
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def save_offline_info_to_file(dvr_name, camera_type, camera_identifier, start_time, end_time, duration, file_path='offline_cameras_log.txt'):
+def save_offline_info(dvr_name, camera_type, camera_identifier, start_time, end_time):
     """
-    Зберігає інформацію про відключення камери в окремий файл.
+    Зберігає інформацію про відключення камери в історію відключень (outages.db).
+
+    Запис виконується фоновим потоком пакетами і не блокує опитування.
 
     :param dvr_name: Назва DVR.
     :param camera_type: Тип камери ('Digital' або 'Analog').
-    :param camera_identifier: Ідентифікатор камери (ім'я для цифрових, номер для аналогових).
-    :param start_time: Час початку відключення.
-    :param end_time: Час відновлення роботи.
-    :param duration: Тривалість відключення.
-    :param file_path: Шлях до файлу, де буде зберігатись інформація (за замовчуванням offline_cameras_log.txt).
+    :param camera_identifier: Ідентифікатор камери (ім'я каналу).
+    :param start_time: Час початку відключення (datetime).
+    :param end_time: Час відновлення роботи (datetime).
     """
-    with open(file_path, 'a') as file:
-        file.write(f"DVR: {dvr_name}, {camera_identifier} was OFFLINE from {start_time} to {end_time} "
-                   f"(Duration: {duration})\n")
+    outage_writer.record(dvr_name, camera_type, camera_identifier, start_time.timestamp(), end_time.timestamp())
 
-def check_analog_camera_status(dvr_name, dvr_data):
-    global camera_status, connection_lost_time
+def dvr_base_url(dvr_data):
+    return f"http://{dvr_data['ip']}:{dvr_data['port']}"
 
-    ip, port = dvr_data['ip'], dvr_data['port']
-    username, password = dvr_data['username'], dvr_data['password']
-    valid_camera_ids = dvr_data['valid_camera_ids']
-    url = f"http://{ip}:{port}/ISAPI/System/Video/inputs/channels"
+def dvr_request_paths(dvr_data):
+    """Список запитів ISAPI, які потрібні DVR відповідно до його типу."""
+    paths = []
+    if dvr_data.get('type') in ('ip', 'mixed'):
+        paths += [IP_CHANNELS_PATH, WORKING_STATUS_PATH]
+    if dvr_data.get('type') in ('analog', 'mixed'):
+        paths.append(ANALOG_CHANNELS_PATH)
+    return paths
+
+class _DigestState(threading.local):
+    """
+    Стан SharedDigestAuth: challenge DVR (chal, last_nonce, nonce_count) спільний
+    для всіх потоків, поля поточного запиту (pos, num_401_calls) - свої в кожного потоку.
+    """
+
+    def __init__(self, challenge):
+        self.challenge = challenge
+
+def _challenge_field(name):
+    return property(lambda state: state.challenge[name],
+                    lambda state, value: state.challenge.__setitem__(name, value))
+
+for _name in ('chal', 'last_nonce', 'nonce_count'):
+    setattr(_DigestState, _name, _challenge_field(_name))
+
+class SharedDigestAuth(HTTPDigestAuth):
+    """
+    Digest-автентифікація, у якій nonce DVR спільний для всіх потоків.
+
+    HTTPDigestAuth зберігає nonce окремо в кожному потоці, тож запит, що потрапив
+    у інший потік пулу, спершу отримує 401 і повторюється. Тут nonce, отриманий
+    будь-яким потоком, одразу використовують усі; лічильник nc збільшується під блокуванням.
+    """
+
+    def __init__(self, username, password):
+        super().__init__(username, password)
+        self.lock = threading.Lock()
+        self._thread_local = _DigestState({'chal': {}, 'last_nonce': '', 'nonce_count': 0})
+
+    def init_per_thread_state(self):
+        if not hasattr(self._thread_local, 'init'):
+            self._thread_local.init = True
+            self._thread_local.pos = None
+            self._thread_local.num_401_calls = None
+
+    def build_digest_header(self, method, url):
+        with self.lock:
+            return super().build_digest_header(method, url)
+
+def get_session(dvr_name, dvr_data):
+    """Постійна сесія (пул keep-alive з'єднань + digest-автентифікація) для DVR."""
+    with sessions_lock:
+        session = sessions.get(dvr_name)
+        if session is None:
+            session = requests.Session()
+            session.auth = SharedDigestAuth(dvr_data['username'], dvr_data['password'])
+            sessions[dvr_name] = session
+        return session
+
+def fetch_dvr(dvr_name, dvr_data):
+    """
+    Паралельно виконує всі запити ISAPI для DVR через одну сесію.
+
+    Перший запит виконується в потоці, що викликав, решта - в request_executor.
 
+    :return: Словник {шлях: відповідь або виняток}.
+    """
+    session = get_session(dvr_name, dvr_data)
+    base_url = dvr_base_url(dvr_data)
+    first, *rest = dvr_request_paths(dvr_data)
+    futures = {}
+    responses = {}
+    for path in rest:
+        try:
+            futures[path] = submit_request(session.get, base_url + path, timeout=REQUEST_TIMEOUT,
+                                           headers=payload_cache.conditional_headers(dvr_name, path))
+        except Exception as e:
+            responses[path] = e
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), timeout=8)
-        if response.status_code == 200:
-            print(f"Successfully retrieved data from analog DVR: {dvr_name}, status code: {response.status_code}")
-            current_time = datetime.now()
-            formatted_current_time = current_time.strftime("%Y-%m-%d %H:%M")
-            if connection_lost_time[dvr_name]:
-                formatted_connection_lost_time = connection_lost_time[dvr_name].strftime("%Y-%m-%d %H:%M")
-                duration_lost_analog_cam = current_time - connection_lost_time[dvr_name]
-                formatted_duration_lost_time = f"{duration_lost_analog_cam}".split('.')[0]
-                logging.warning(f"Connection {dvr_name} restored") 
-                logging.warning(f"Downtime: {formatted_duration_lost_time}. From {formatted_connection_lost_time} to {formatted_current_time}")
-                send_to_telegram(f"Connection {dvr_name} restored. Downtime: {formatted_duration_lost_time}. From {formatted_connection_lost_time} to {formatted_current_time}")
-                connection_lost_time[dvr_name] = None
-
-            root = ET.fromstring(response.text)
-
-            for channel in root.findall('.//{http://www.hikvision.com/ver20/XMLSchema}VideoInputChannel'):
-                id_elem = channel.find('{http://www.hikvision.com/ver20/XMLSchema}id')
-                camera_id = id_elem.text if id_elem is not None else 'N/A'
-
-                if int(camera_id) in valid_camera_ids:
-                    name_elem = channel.find('{http://www.hikvision.com/ver20/XMLSchema}name')
-                    enabled_elem = channel.find('{http://www.hikvision.com/ver20/XMLSchema}videoInputEnabled')
-                    resolution_elem = channel.find('{http://www.hikvision.com/ver20/XMLSchema}resDesc')
-
-                    name_cam = name_elem.text if name_elem is not None else 'N/A'
-                    enabled = enabled_elem.text if enabled_elem is not None else 'N/A'
-                    resolution = resolution_elem.text if resolution_elem is not None else 'N/A'
-
-                    if camera_id in camera_status[dvr_name]:
-                        prev_status = camera_status[dvr_name][camera_id]
-
-                        # Камера стала "NO VIDEO" або "offline"
-                        if (resolution == 'NO VIDEO' or enabled == 'false') and not prev_status['reason']:
-                            prev_status['reason'] = True
-                            prev_status['start_time'] = current_time
-                            
-                            logging.warning(
-                                f"DVR: {dvr_name}, {name_cam} - {resolution if resolution == 'NO VIDEO' else 'offline'}, reason: {enabled if enabled == 'false' else 'NO VIDEO'} since {prev_status['start_time']}"
-                            )
-                            send_to_telegram(
-                                f"DVR: {dvr_name}, {name_cam} - {resolution if resolution == 'NO VIDEO' else 'offline'}, reason: {enabled if enabled == 'false' else 'NO VIDEO'} since {prev_status['start_time']}"
-                            )
-                        # Камера досі "NO VIDEO" або "offline"
-                        elif (resolution == 'NO VIDEO' or enabled == 'false') and prev_status['reason']:
-                            formated_prev_status = prev_status['start_time'].strftime("%Y-%m-%d %H:%M")
-                            duration = current_time - prev_status['start_time']
-                            formate_duration = f"{duration}".split('.')[0]
-                            logging.warning(
-                                f"DVR: {dvr_name}, Analog {name_cam} - STILL {resolution if resolution == 'NO VIDEO' else 'offline'} (Duration: {formate_duration} from {formated_prev_status})"
-                            )
-                        # Камера відновила роботу
-                        elif (resolution != 'NO VIDEO' and enabled != 'false') and prev_status['reason']:
-                            prev_status['reason'] = False
-                            formated_prev_status = prev_status['start_time'].strftime("%Y-%m-%d %H:%M")
-                            end_time = current_time
-                            formated_end_time = end_time.strftime("%Y-%m-%d %H:%M")
-                            duration = end_time - prev_status['start_time']
-                            formate_duration = f"{duration}".split('.')[0]
-                            logging.info(
-                                f"DVR: {dvr_name}, Analog {name_cam} was {resolution if resolution == 'NO VIDEO' else 'offline'} from {formated_prev_status} to {formated_end_time} (Duration: {formate_duration})"
-                            )
-                            send_to_telegram(
-                                f"DVR: {dvr_name}, Analog {name_cam} was {resolution if resolution == 'NO VIDEO' else 'offline'} from {formated_prev_status} to {formated_end_time} (Duration: {formate_duration})"
-                            )
-                            save_offline_info_to_file(dvr_name, 'Analog', name_cam, prev_status['start_time'], formated_end_time, duration)
-                    else:
-                        # Додавання нової камери до статусів
-                        camera_status[dvr_name][camera_id] = {
-                            'reason': resolution == 'NO VIDEO' or enabled == 'false',
-                            'start_time': current_time if resolution == 'NO VIDEO' or enabled == 'false' else None
-                        }
-                        if resolution == 'NO VIDEO' or enabled == 'false':
-                            send_to_telegram(
-                                f"DVR: {dvr_name}, Analog {name_cam}, reason: {resolution if resolution == 'NO VIDEO' else 'offline'} since {formatted_current_time}"
-                            )
-                            logging.warning(
-                                f"DVR: {dvr_name}, Analog {name_cam}, reason: {resolution if resolution == 'NO VIDEO' else 'offline'} since {formatted_current_time}"
-                            )
-
-        elif response.status_code in {401, 403}:
-            logging.error(f"Authentication {dvr_name} failed. Check your username and password.")
-        else:
-            logging.error(f"Failed to get {dvr_name} camera list. Status code: {response.status_code}")
-            if connection_lost_time[dvr_name] is None:
-                connection_lost_time[dvr_name] = datetime.now()
+        responses[first] = session.get(base_url + first, timeout=REQUEST_TIMEOUT,
+                                       headers=payload_cache.conditional_headers(dvr_name, first))
     except Exception as e:
-        if connection_lost_time[dvr_name]:
-            formated_connection_dvr_lost_time = connection_lost_time[dvr_name].strftime("%Y-%m-%d %H:%M")
-            duration_lost_digital_dvr = current_time - connection_lost_time[dvr_name]  
-            formatted_duration_lost_time = f"{duration_lost_digital_dvr}".split('.')[0]
-            print(f"{dvr_name} still OFFLINE duration {formatted_duration_lost_time} from {formated_connection_dvr_lost_time}")
-            logging.warning(f"{dvr_name} still OFFLINE duration {formatted_duration_lost_time} from {formated_connection_dvr_lost_time}")
-        if connection_lost_time[dvr_name] is None:
-            connection_lost_time[dvr_name] = datetime.now()
-            formatted_lost_time_dvr = datetime.now().strftime("%Y-%m-%d %H:%M")
-            print(f"Connection DVR {dvr_name} lost at: {formatted_lost_time_dvr}")
-            logging.error(f"Connection DVR {dvr_name} lost at: {formatted_lost_time_dvr}. Error: {e}")
-            send_to_telegram(f"Connection DVR {dvr_name} lost at: {formatted_lost_time_dvr}")
+        responses[first] = e
+    for path, future in futures.items():
+        try:
+            responses[path] = future.result()
+        except Exception as e:
+            responses[path] = e
+    return responses
+
+def get_response(responses, path):
+    response = responses[path]
+    if isinstance(response, Exception):
+        raise response
+    return response
+
+def check_dvr(dvr_name, dvr_data):
+    """Отримує дані DVR одним етапом і передає їх обом обробникам стану."""
+    started = time.perf_counter()
+    responses = fetch_dvr(dvr_name, dvr_data)
+    fetched = time.perf_counter()
+    if not is_current(dvr_name, dvr_data):
+        return
+    evaluate_dvr(dvr_name, dvr_data, responses)
+    record_check(dvr_name, responses, fetched - started, time.perf_counter() - fetched)
+
+def is_current(dvr_name, dvr_data):
+    """Чи dvr_data досі є робочою конфігурацією DVR (DVR не видалено і не змінено, поки йшли запити)."""
+    return dvrs.get(dvr_name) is dvr_data
+
+def record_check(dvr_name, responses, fetch_time, evaluate_time):
+    """Метрики однієї перевірки DVR (кілька мікросекунд на перевірку)."""
+    check_duration.observe(fetch_time, 'fetch')
+    check_duration.observe(evaluate_time, 'evaluate')
+    check_duration.observe(fetch_time + evaluate_time, 'total')
+    for response in responses.values():
+        if isinstance(response, Exception):
+            request_errors.inc(dvr_name, 'timeout' if 'Timeout' in type(response).__name__ else 'connection')
+            continue
+        request_latency.observe(response.elapsed.total_seconds(), dvr_name)
+        if response.status_code in (401, 403):
+            request_errors.inc(dvr_name, 'auth')
+        elif response.status_code not in (200, 304):
+            request_errors.inc(dvr_name, 'status')
+
+def evaluate_dvr(dvr_name, dvr_data, responses):
+    """
+    Оцінює відповіді однієї перевірки DVR.
 
-# Адаптація для IP камер
-def check_ip_camera_status(dvr_name, dvr_data):
-    global camera_status
+    Досяжність DVR визначається один раз за всіма відповідями разом: DVR втрачено,
+    лише якщо не відповів жоден запит (помилка з'єднання, таймаут), і досяжний, якщо
+    успішна хоча б одна відповідь. Відповіді з іншими статусами лише журналюються.
+    Далі обробники розбирають канали кожен зі своїх відповідей.
+    """
+    source = ANALOG if dvr_data.get('type') == 'analog' else DIGITAL
+    results = list(responses.values())
+    if results and all(isinstance(response, Exception) for response in results):
+        mark_dvr_lost(dvr_name, source, results[0])
+        return
+    if any(not isinstance(response, Exception) and response.status_code in (200, 304) for response in results):
+        mark_dvr_reachable(dvr_name, source)
+    if dvr_data.get('type') in ('ip', 'mixed'):
+        check_ip_camera_status(dvr_name, dvr_data, responses)
+    if dvr_data.get('type') in ('analog', 'mixed'):
+        check_analog_camera_status(dvr_name, dvr_data, responses)
+
+def check_analog_camera_status(dvr_name, dvr_data, responses):
+    try:
+        response = get_response(responses, ANALOG_CHANNELS_PATH)
+        process_analog_response(dvr_name, dvr_data, response)
+    except Exception as e:
+        handle_analog_connection_error(dvr_name, e)
 
-    current_time = datetime.now()
-    formatted_current_time = current_time.strftime("%Y-%m-%d %H:%M")
-    
-    
-    ip, port = dvr_data['ip'], dvr_data['port']
-    username, password = dvr_data['username'], dvr_data['password']
-    url_channels = f"http://{ip}:{port}/ISAPI/ContentMgmt/InputProxy/channels"
-    url_status = f"http://{ip}:{port}/ISAPI/System/workingstatus?format=json"
+def process_analog_response(dvr_name, dvr_data, response):
+    """
+    Обробляє відповідь /ISAPI/System/Video/inputs/channels аналогового DVR.
+
+    Відповідь може бути як requests.Response, так і httpx.Response (асинхронний режим).
+    """
+    valid_camera_ids = dvr_data['valid_camera_ids']
 
+    if response.status_code in (200, 304):
+        print(f"Successfully retrieved data from analog DVR: {dvr_name}, status code: {response.status_code}")
+        now = time.time()
+        events = []
+
+        # Відповідь не змінилась - стан каналів теж, розбір пропускаємо
+        fingerprints = payload_cache.compare(dvr_name, {ANALOG_CHANNELS_PATH: response})
+        if fingerprints is not None:
+            channels = parse_video_inputs(response.content, valid_camera_ids)
+            updates = [(channel_key(ANALOG, int(channel.id)), channel.res_desc == 'NO VIDEO' or channel.enabled == 'false')
+                       for channel in channels]
+            channel_names.setdefault(dvr_name, {}).update((key, channel.name) for channel, (key, _) in zip(channels, updates))
+            for channel, (key, _), (event, since) in zip(channels, updates, state_store.transition_many(dvr_name, updates, now)):
+                if event is not None and event != STILL_OFFLINE:
+                    events.append(Transition(event, dvr_name, key, channel.name, since, now, (channel.res_desc, channel.enabled)))
+            payload_cache.store(dvr_name, fingerprints)
+        dispatch_events(events)
+
+    elif response.status_code in {401, 403}:
+        logging.error("Authentication %s failed. Check your username and password.", dvr_name, extra={'dvr': dvr_name})
+    else:
+        logging.error("Failed to get %s camera list. Status code: %s", dvr_name, response.status_code,
+                      extra={'dvr': dvr_name})
+
+def handle_analog_connection_error(dvr_name, e):
+    # Досяжність DVR визначає evaluate_dvr за всіма відповідями; тут - лише запит аналогових каналів
+    logging.error("Failed to get %s camera list: %s", dvr_name, e, extra={'dvr': dvr_name})
+
+def mark_dvr_lost(dvr_name, source, error):
+    now = time.time()
+    event, lost_since = state_store.mark_dvr_lost(dvr_name, now)
+    dispatch_events([Transition(event, dvr_name, None, source, lost_since, now, str(error))])
+
+def mark_dvr_reachable(dvr_name, source):
+    now = time.time()
+    # DVR відповідає, обнуляємо статус втрати зв'язку
+    event, lost_since = state_store.mark_dvr_reachable(dvr_name)
+    if event == DVR_RESTORED:
+        dispatch_events([Transition(event, dvr_name, None, source, lost_since, now, None)])
+
+# Адаптація для IP камер
+def check_ip_camera_status(dvr_name, dvr_data, responses):
     try:
-        
-        response_channels = requests.get(url_channels, auth=HTTPDigestAuth(username, password), timeout=8)
-        response_status = requests.get(url_status, auth=HTTPDigestAuth(username, password),timeout=8)
-
-        if response_channels.status_code == 200 and response_status.status_code == 200:
-            print(f"Successfully retrieved data from digital DVR: {dvr_name}, status code: {response_channels.status_code}")
-            # DVR відповідає, обнуляємо статус втрати зв'язку
-            if connection_lost_time.get(dvr_name):
-                downtime = current_time - connection_lost_time[dvr_name]
-                formatted_downtime = str(downtime).split('.')[0]
-                logging.info(f"Connection restored for DVR: {dvr_name} at {formatted_current_time}. "
-                             f"Downtime: {formatted_downtime}")
-                send_to_telegram(f"Connection restored for DVR: {dvr_name} at {formatted_current_time}. "
-                                 f"Downtime: {formatted_downtime}")
-                connection_lost_time[dvr_name] = None
-         
-
-
-            # Парсинг XML-даних про камери
-            namespace = {'ns': 'http://www.hikvision.com/ver20/XMLSchema'}
-            root = ET.fromstring(response_channels.text)
-            # Перевірка, який формат JSON ви отримали
-            if 'WorkingStatus' in response_status.json():
-                working_status = response_status.json()['WorkingStatus']
-                chan_status = working_status['ChanStatus']
-            else:
-                chan_status = response_status.json()['ChanStatus']
+        response_channels = get_response(responses, IP_CHANNELS_PATH)
+        response_status = get_response(responses, WORKING_STATUS_PATH)
+        process_ip_response(dvr_name, dvr_data, response_channels, response_status)
+    except Exception as e:
+        handle_ip_connection_error(dvr_name, e)
+
+def channel_states(chan_status):
+    """Стан каналів з workingstatus, який використовує process_ip_response: байти пар (chanNo, online)."""
+    return repr([(chan['chanNo'], chan['online']) for chan in chan_status]).encode()
+
+def process_ip_response(dvr_name, dvr_data, response_channels, response_status):
+    """
+    Обробляє відповіді /ISAPI/ContentMgmt/InputProxy/channels та /ISAPI/System/workingstatus.
+
+    Відповіді можуть бути як requests.Response, так і httpx.Response (асинхронний режим).
+    """
+    if response_channels.status_code in (200, 304) and response_status.status_code in (200, 304):
+        print(f"Successfully retrieved data from digital DVR: {dvr_name}, status code: {response_channels.status_code}")
+        now = time.time()
+        events = []
+
+        # Список каналів і стан каналів (chanNo, online) не змінились - розбір XML і переходи стану пропускаємо.
+        # Решта workingstatus (bitRate, linkNum, CPU, Memory, вільне місце на диску) змінюється з кожним опитуванням.
+        chan_status = parse_working_status(response_status.content) if response_status.status_code == 200 else None
+        contents = None if chan_status is None else {WORKING_STATUS_PATH: channel_states(chan_status)}
+        fingerprints = payload_cache.compare(dvr_name, {IP_CHANNELS_PATH: response_channels,
+                                                        WORKING_STATUS_PATH: response_status}, contents)
+        if fingerprints is not None:
+            # Парсинг XML-даних про камери (JSON зі станом каналів уже розібрано)
+            channels = parse_input_proxy_channels(response_channels.content)
 
             # Перевірка кожної камери
-            for channel, chan in zip(root.findall('ns:InputProxyChannel', namespace), chan_status):
-                camera_info = {
-                    'id': channel.find('ns:id', namespace).text,
-                    'name': channel.find('ns:name', namespace).text,
-                    'ipAddress': channel.find('ns:sourceInputPortDescriptor/ns:ipAddress', namespace).text,
-                    'port': channel.find('ns:sourceInputPortDescriptor/ns:managePortNo', namespace).text,
-                    'user': channel.find('ns:sourceInputPortDescriptor/ns:userName', namespace).text,
-                    #'enableTiming': channel.find('ns:enableTiming', namespace).text if channel.find('ns:enableTiming', namespace) is not None else 'false',
-                }
-
-                chanNo = chan['chanNo']
-                online = chan['online']
-                record = chan['record']
-    
+            channels = list(zip(channels, chan_status))
+            updates = [(channel_key(DIGITAL, chan['chanNo']), chan['online'] == 0) for _, chan in channels]
+            channel_names.setdefault(dvr_name, {}).update((key, channel.name) for (channel, _), (key, _) in zip(channels, updates))
+            for (channel, _), (key, _), (event, since) in zip(channels, updates, state_store.transition_many(dvr_name, updates, now)):
+                if event is not None and event != STILL_OFFLINE:
+                    events.append(Transition(event, dvr_name, key, channel.name, since, now, None))
+            payload_cache.store(dvr_name, fingerprints)
+        dispatch_events(events)
+
+    elif response_channels.status_code in {401, 403} or response_status.status_code in {401, 403}:
+        logging.error("Authentication %s failed. Check your username and password.", dvr_name, extra={'dvr': dvr_name})
+    else:
+        logging.error("Failed to get %s camera status. Status codes: Channels - %s, Status - %s",
+                      dvr_name, response_channels.status_code, response_status.status_code, extra={'dvr': dvr_name})
+
+def handle_ip_connection_error(dvr_name, e):
+    logging.error("Failed to get %s camera status: %s", dvr_name, e, extra={'dvr': dvr_name})
+
+def process_alerts(dvr_name, dvr_data, alerts):
+    """
+    Переходи стану камер за подіями alertStream (alert_stream.Alert).
 
-                # Виведення стану
-                #print(f"DVR: {dvr_name}, ID: {camera_info['id']}, Name: {camera_info['name']}, IP: {camera_info['ipAddress']}, "
-                #      f"Status: {'Online' if online else 'Offline'}, Recording: {'Yes' if record else 'No'}")
-
-                # Логіка зміни статусу
-                if chanNo in camera_status.get(dvr_name, {}):
-                    prev_status = camera_status[dvr_name][chanNo]
-                    if online == 0 and not prev_status['issue']:
-                        # Камера перейшла в статус "не працює"
-                        prev_status['issue'] = True
-                        prev_status['start_time'] = current_time
-                        formatted_prev_status = prev_status['start_time'].strftime("%Y-%m-%d %H:%M")
-                        send_to_telegram(f"DVR: {dvr_name}, Digital {camera_info['name']} - OFFLINE since {formatted_prev_status}")
-                        logging.warning(f"DVR: {dvr_name}, Digital {camera_info['name']} - OFFLINE since {formatted_prev_status}")
-                    elif online == 0 and prev_status['issue']:
-                        # Камера досі не працює - показати тривалість
-                        duration = current_time - prev_status['start_time']
-                        formatted_duration = str(duration).split('.')[0]
-                        start_time = prev_status['start_time'].strftime("%Y-%m-%d %H:%M")
-                        logging.warning(
-                            f"DVR: {dvr_name}, Digital {camera_info['name']} - STILL OFFLINE (Duration: {formatted_duration} from {start_time})"
-                        )
-                    elif online == 1 and prev_status['issue']:
-                        # Камера відновила роботу
-                        prev_status['issue'] = False
-                        end_time = current_time
-                        formatted_end_time = end_time.strftime("%Y-%m-%d %H:%M")
-                        duration = end_time - prev_status['start_time']
-                        formatted_duration = str(duration).split('.')[0]
-                        logging.info(
-                            f"DVR: {dvr_name}, Digital {camera_info['name']} now ONLINE. Was OFFLINE from {prev_status['start_time']} to {formatted_end_time} (Duration: {formatted_duration})"
-                        )
-                        send_to_telegram(
-                            f"DVR: {dvr_name}, Digital {camera_info['name']} now ONLINE. Was OFFLINE from {prev_status['start_time']} to {formatted_end_time} (Duration: {formatted_duration})"
-                        )
-                        save_offline_info_to_file(dvr_name, 'Digital', camera_info['name'], prev_status['start_time'], end_time, duration)
-
-                else:
-                    # Додавання нової камери до статусів
-                    if dvr_name not in camera_status:
-                        camera_status[dvr_name] = {}
-                    camera_status[dvr_name][chanNo] = {
-                        'issue': online == 0,
-                        'start_time': current_time if online == 0 else None
-                    }
-                    if online == 0:
-                        print(
-                            f"DVR: {dvr_name}, Digital {camera_info['name']} - OFFLINE at {formatted_current_time}"
-                        )
-                        send_to_telegram(
-                            f"DVR: {dvr_name}, Digital {camera_info['name']} - OFFLINE at {formatted_current_time}"
-                        )
-                        logging.warning(
-                            f"DVR: {dvr_name}, Digital {camera_info['name']} - OFFLINE at {formatted_current_time}"
-                        )
-                    
-        elif response_channels.status_code in {401, 403} or response_status.status_code in {401, 403}:
-            logging.error(f"Authentication {dvr_name} failed. Check your username and password.")
+    Подія active означає, що камера не працює, inactive - що відновилась.
+    Назви камер беруться з останнього опитування DVR.
+    """
+    updates = []
+    for alert in alerts:
+        key = alert_channel_key(alert, dvr_data)
+        if key is not None:
+            updates.append((key, alert.active))
+    if not updates:
+        return
+    now = time.time()
+    names = channel_names.get(dvr_name, {})
+    events = []
+    for (key, _), (event, since) in zip(updates, state_store.transition_many(dvr_name, updates, now)):
+        if event is not None and event != STILL_OFFLINE:
+            camera_type, channel_no = split_channel_key(key)
+            detail = ('NO VIDEO', 'true') if camera_type == ANALOG else None
+            events.append(Transition(event, dvr_name, key, names.get(key, f"channel {channel_no}"), since, now, detail))
+    if events:
+        # Стан змінився без опитування: наступна відповідь DVR має бути розібрана, навіть якщо вона не змінилась
+        payload_cache.forget(dvr_name)
+        dispatch_events(events)
+
+def dispatch_events(events):
+    """Передає події переходів у event_sink (процес-координатор) або обробляє їх на місці."""
+    if not events:
+        return
+    if event_sink is not None:
+        event_sink(events)
+    else:
+        report_events(events)
+
+def report_events(events):
+    """Журналювання, сповіщення в Telegram та запис історії відключень для подій переходів."""
+    for event, dvr_name, key, name, since, now, detail in events:
+        current_time = datetime.fromtimestamp(now)
+        formatted_current_time = current_time.strftime("%Y-%m-%d %H:%M")
+        start_time = datetime.fromtimestamp(since) if since is not None else None
+
+        if key is None:
+            report_dvr_event(event, dvr_name, name, start_time, current_time, detail)
+            continue
+
+        duration = current_time - start_time if start_time is not None else None
+        formatted_duration = str(duration).split('.')[0]
+        camera_type = split_channel_key(key)[0]
+        if event in (NEW_OFFLINE, OFFLINE):
+            # Назва для зведень камер offline (зберігається разом зі станом і переживає перезапуск)
+            state_store.set_name(dvr_name, key, name)
+        # Поля для структурованого журналу (LOG_FORMAT=json)
+        fields = {'dvr': dvr_name, 'camera': name, 'event': event}
+
+        if event == IMAGE_FAULT:
+            # Камера online, але знімок чорний, однорідний або не змінюється
+            message = f"DVR: {dvr_name}, {camera_type} {name} - image {detail.upper()} since {start_time:%Y-%m-%d %H:%M}"
+            logging.warning(message, extra=fields)
+            send_to_telegram(message, dvr_name)
+        elif event == IMAGE_OK:
+            message = f"DVR: {dvr_name}, {camera_type} {name} image OK. Was {detail.upper()} from {start_time:%Y-%m-%d %H:%M} to {formatted_current_time} (Duration: {formatted_duration})"
+            logging.info(message, extra=fields)
+            send_to_telegram(message, dvr_name)
+        elif camera_type == ANALOG:
+            resolution, enabled = detail
+            state = resolution if resolution == 'NO VIDEO' else 'offline'
+            # Камера стала "NO VIDEO" або "offline"
+            if event == OFFLINE:
+                message = f"DVR: {dvr_name}, {name} - {state}, reason: {enabled if enabled == 'false' else 'NO VIDEO'} since {start_time}"
+                logging.warning(message, extra=fields)
+                send_to_telegram(message, dvr_name)
+            # Камера відновила роботу
+            elif event == ONLINE:
+                message = f"DVR: {dvr_name}, Analog {name} was {state} from {start_time:%Y-%m-%d %H:%M} to {formatted_current_time} (Duration: {formatted_duration})"
+                logging.info(message, extra=fields)
+                send_to_telegram(message, dvr_name)
+                save_offline_info(dvr_name, ANALOG, name, start_time, current_time)
+            # Нова камера, яка вже не працює
+            elif event == NEW_OFFLINE:
+                message = f"DVR: {dvr_name}, Analog {name}, reason: {state} since {formatted_current_time}"
+                send_to_telegram(message, dvr_name)
+                logging.warning(message, extra=fields)
         else:
-            logging.error(f"Failed to get {dvr_name} camera status. "
-                  f"Status codes: Channels - {response_channels.status_code}, Status - {response_status.status_code}")
-            if connection_lost_time[dvr_name] is None:
-                connection_lost_time[dvr_name] = datetime.now()
-    except Exception as e:
-        # Обробка помилок
-        if connection_lost_time.get(dvr_name) is None:
-            connection_lost_time[dvr_name] = current_time
-            logging.error(f"Connection lost for DVR: {dvr_name} at {formatted_current_time}. Error: {e}")
-            send_to_telegram(f"Connection lost for DVR: {dvr_name} at {formatted_current_time}")
+            if event == OFFLINE:
+                # Камера перейшла в статус "не працює"
+                message = f"DVR: {dvr_name}, Digital {name} - OFFLINE since {formatted_current_time}"
+                send_to_telegram(message, dvr_name)
+                logging.warning(message, extra=fields)
+            elif event == ONLINE:
+                # Камера відновила роботу
+                message = f"DVR: {dvr_name}, Digital {name} now ONLINE. Was OFFLINE from {start_time} to {formatted_current_time} (Duration: {formatted_duration})"
+                logging.info(message, extra=fields)
+                send_to_telegram(message, dvr_name)
+                save_offline_info(dvr_name, DIGITAL, name, start_time, current_time)
+            elif event == NEW_OFFLINE:
+                # Нова камера, яка вже не працює
+                message = f"DVR: {dvr_name}, Digital {name} - OFFLINE at {formatted_current_time}"
+                print(message)
+                send_to_telegram(message, dvr_name)
+                logging.warning(message, extra=fields)
+
+def report_dvr_event(event, dvr_name, source, lost_time, current_time, error):
+    formatted_current_time = current_time.strftime("%Y-%m-%d %H:%M")
+    formatted_lost_time = lost_time.strftime("%Y-%m-%d %H:%M")
+    formatted_duration = str(current_time - lost_time).split('.')[0]
+    fields = {'dvr': dvr_name, 'event': event}
+
+    if event == DVR_RESTORED:
+        if source == ANALOG:
+            logging.warning("Connection %s restored", dvr_name, extra=fields)
+            logging.warning("Downtime: %s. From %s to %s", formatted_duration, formatted_lost_time, formatted_current_time,
+                            extra=fields)
+            send_to_telegram(f"Connection {dvr_name} restored. Downtime: {formatted_duration}. From {formatted_lost_time} to {formatted_current_time}", dvr_name)
+        else:
+            message = f"Connection restored for DVR: {dvr_name} at {formatted_current_time}. Downtime: {formatted_duration}"
+            logging.info(message, extra=fields)
+            send_to_telegram(message, dvr_name)
+    elif event == DVR_LOST:
+        if source == ANALOG:
+            print(f"Connection DVR {dvr_name} lost at: {formatted_lost_time}")
+            logging.error("Connection DVR %s lost at: %s. Error: %s", dvr_name, formatted_lost_time, error, extra=fields)
+            send_to_telegram(f"Connection DVR {dvr_name} lost at: {formatted_lost_time}", dvr_name)
+        else:
+            logging.error("Connection lost for DVR: %s at %s. Error: %s", dvr_name, formatted_lost_time, error, extra=fields)
+            send_to_telegram(f"Connection lost for DVR: {dvr_name} at {formatted_lost_time}", dvr_name)
+    elif event == DVR_STILL_LOST:
+        if source == ANALOG:
+            message = f"{dvr_name} still OFFLINE duration {formatted_duration} from {formatted_lost_time}"
         else:
-            lost_time = connection_lost_time[dvr_name]
-            duration = current_time - lost_time
-            formatted_duration = str(duration).split('.')[0]
-            print((f"DVR: {dvr_name} is still offline. Duration: {formatted_duration} (since {lost_time.strftime('%Y-%m-%d %H:%M')})"))
-            logging.warning(f"DVR: {dvr_name} is still offline. Duration: {formatted_duration} (since {lost_time.strftime('%Y-%m-%d %H:%M')})")
-        
+            message = f"DVR: {dvr_name} is still offline. Duration: {formatted_duration} (since {formatted_lost_time})"
+        print(message)
+        logging.warning(message, extra=fields)
+    
+def report_offline_summary(now=None):
+    """
+    Зведення камер, що досі не працюють, та недоступних DVR (раз на OFFLINE_SUMMARY_INTERVAL).
+
+    Тривалість рахується від часу початку відключення в сховищі стану, тож між
+    зведеннями нічого оновлювати не потрібно.
+    """
+    now = time.time() if now is None else now
+    snapshot = state_store.snapshot()
+    offline = []
+    lost = 0
+    for dvr_name, (lost_since, channels) in sorted(snapshot.items()):
+        lost += lost_since is not None
+        for key, since in sorted(channels.items()):
+            if since is not None:
+                offline.append((dvr_name, key, since))
+    print(f"Offline summary: {len(offline)} cameras offline, {lost} DVRs unreachable")
+    logging.info("Offline summary: %d cameras offline, %d DVRs unreachable", len(offline), lost)
+    if not logging.getLogger().isEnabledFor(logging.WARNING):
+        return
+    current_time = datetime.fromtimestamp(now)
+    for dvr_name, key, since in offline:
+        camera_type, channel_no = split_channel_key(key)
+        name = state_store.channel_name(dvr_name, key) or f"channel {channel_no}"
+        start_time = datetime.fromtimestamp(since)
+        logging.warning("DVR: %s, %s %s - STILL OFFLINE (Duration: %s from %s)", dvr_name, camera_type, name,
+                        str(current_time - start_time).split('.')[0], f"{start_time:%Y-%m-%d %H:%M}",
+                        extra={'dvr': dvr_name, 'camera': name, 'event': STILL_OFFLINE})
+
+def start_offline_summary():
+    """Запускає (один раз) фоновий потік зведення у процесі, що веде звітування."""
+    global summary_thread
+    if summary_thread is not None:
+        return
+
+    def run():
+        while True:
+            time.sleep(OFFLINE_SUMMARY_INTERVAL)
+            report_offline_summary()
+
+    summary_thread = threading.Thread(target=run, name='offline-summary', daemon=True)
+    summary_thread.start()
+
+def start_snapshot_probe():
+    """Запускає (один раз) перевірку знімків камер у процесі, що опитує DVR (SNAPSHOT_PROBE=1)."""
+    global image_probe
+    if not SNAPSHOT_PROBE or image_probe is not None:
+        return
+    if not snapshot_probe.available():
+        logging.warning("SNAPSHOT_PROBE is set, but numpy and Pillow are not installed: snapshot probe disabled")
+        return
+    image_probe = snapshot_probe.SnapshotProbe(sys.modules[__name__])
+    image_probe.start()
+
 def auto_start():
     """Функція для автоматичного запуску моніторингу через 30 секунд бездіяльності."""
     global timer
@@ -305,25 +582,227 @@ def auto_start():
     logging.info("Auto-starting monitoring with default timer: 180 seconds.")
     main()
 
-# Основний цикл з мультипоточністю
-def main():
+def create_scheduler():
+    """Планувальник з усіма DVR з dvr_config.json (ключ 'interval' задає власний інтервал DVR)."""
+    scheduler = DvrScheduler(timer)
+    for dvr_name, dvr_data in dvrs.items():
+        scheduler.add(dvr_name, dvr_data.get('interval'))
+    return scheduler
+
+def update_scheduler(scheduler, added, removed, changed):
+    """Обробник reload_hooks: додає/прибирає DVR у розкладі; змінені DVR опитуються найближчим часом."""
+    for dvr_name in removed:
+        scheduler.remove(dvr_name)
+    for dvr_name in added + changed:
+        scheduler.add(dvr_name, dvrs[dvr_name].get('interval'))
+
+def forget_dvr(dvr_name, keep_state=False):
+    """
+    Прибирає кешовані дані DVR: сесію, відбитки відповідей, назви каналів.
+
+    :param keep_state: Зберегти стан камер і DVR (поточні відключення тривають без нових сповіщень).
+    """
+    with sessions_lock:
+        session = sessions.pop(dvr_name, None)
+    if session is not None:
+        session.close()
+    payload_cache.forget(dvr_name)
+    channel_names.pop(dvr_name, None)
+    if not keep_state:
+        state_store.remove_dvr(dvr_name)
+
+def pooled_requests(dvr_data):
+    """
+    Скільки запитів ISAPI DVR одночасно чекають у request_executor.
+
+    Кожен DVR опитує власний потік, який сам виконує перший запит, тож у пулі
+    бувають лише решта запитів.
+    """
+    return len(dvr_request_paths(dvr_data)) - 1
+
+def grow_request_executor(delta=0):
+    """
+    Створює пул потоків запитів ISAPI або збільшує його, якщо після додавання DVR
+    його замало (запущені запити завершуються в старому).
+
+    Повний перелік DVR проглядається лише при створенні пулу; далі потрібна кількість
+    потоків змінюється на delta, тож вартість залежить від розміру зміни.
+
+    :param delta: Зміна суми pooled_requests після apply_config.
+    :return: Поточний пул (None, якщо пул ще не створено і delta задано).
+    """
+    global request_executor, request_executor_size, request_workers
+    with request_executor_lock:
+        if request_workers is None:
+            if delta:
+                # Пул створить перший запит, порахувавши вже оновлений dvrs
+                return None
+            request_workers = sum(pooled_requests(dvr_data) for dvr_data in list(dvrs.values()))
+        else:
+            request_workers += delta
+        needed = max(1, request_workers)
+        if request_executor is not None and needed <= request_executor_size:
+            return request_executor
+        previous = request_executor
+        request_executor_size = needed
+        request_executor = ThreadPoolExecutor(max_workers=needed, thread_name_prefix='isapi')
+        if previous is not None:
+            previous.shutdown(wait=False)
+        return request_executor
+
+def submit_request(function, *args, **kwargs):
+    """
+    Ставить запит у request_executor.
+
+    Якщо інший потік саме замінив пул (grow_request_executor), старий уже зупинено
+    і submit кидає RuntimeError - тоді запит іде в новий пул.
+
+    :return: Future запиту.
+    """
     while True:
-        clear_console()
-        print('---------------------------------------------')
-        logging.info("-" * 24 + 'Start checking' + "-" * 24)
-        with ThreadPoolExecutor(max_workers=len(dvrs)) as executor:
-            for dvr_name, dvr_data in dvrs.items():
-                if dvr_data.get('type') == 'mixed':
-                    executor.submit(check_ip_camera_status, dvr_name, dvr_data)
-                    executor.submit(check_analog_camera_status, dvr_name, dvr_data)
-                if dvr_data.get('type') == 'analog':
-                    executor.submit(check_analog_camera_status, dvr_name, dvr_data)
-                elif dvr_data.get('type') == 'ip':
-                    executor.submit(check_ip_camera_status, dvr_name, dvr_data)
-        print('---------------------------------------------')
-        print("Press Ctrl+C to exit the program.")
-        logging.info("-" * 25 + 'End checking' + "-" * 25)
-        time.sleep(timer)
+        executor = request_executor if request_executor is not None else grow_request_executor()
+        try:
+            return executor.submit(function, *args, **kwargs)
+        except RuntimeError:
+            if executor is request_executor:
+                raise
+
+def apply_config(updates):
+    """
+    Застосовує зміни конфігурації до працюючого моніторингу.
+
+    Обробляються лише DVR з updates, тож вартість залежить від розміру зміни, а не від
+    кількості DVR. Стан змінених DVR зберігається, якщо не змінились тип і список
+    каналів; адреса чи облікові дані - лише нова сесія.
+
+    :param updates: {dvr_name: нові дані DVR або None - видалити} (config_watcher.diff_config).
+    :return: Списки назв DVR (added, removed, changed).
+    """
+    added, removed, changed = [], [], []
+    pooled = 0
+    for dvr_name, dvr_data in updates.items():
+        previous = dvrs.get(dvr_name)
+        if dvr_data is None:
+            if previous is None:
+                continue
+            del dvrs[dvr_name]
+            forget_dvr(dvr_name)
+            removed.append(dvr_name)
+            pooled -= pooled_requests(previous)
+        elif previous is None:
+            dvrs[dvr_name] = dvr_data
+            added.append(dvr_name)
+            pooled += pooled_requests(dvr_data)
+        elif previous != dvr_data:
+            dvrs[dvr_name] = dvr_data
+            forget_dvr(dvr_name, keep_state=previous.get('type') == dvr_data.get('type') and
+                       previous.get('valid_camera_ids') == dvr_data.get('valid_camera_ids'))
+            changed.append(dvr_name)
+            pooled += pooled_requests(dvr_data) - pooled_requests(previous)
+    if pooled:
+        grow_request_executor(pooled)
+    for hook in list(reload_hooks):
+        hook(added, removed, changed)
+    if added or removed or changed:
+        logging.info("Configuration reloaded: added %s, removed %s, changed %s", added, removed, changed)
+    return added, removed, changed
+
+def start_metrics_server():
+    """Запускає (один раз) HTTP-сервер метрик, якщо задано METRICS_PORT."""
+    global metrics_server
+    if metrics_server is None:
+        metrics_server = metrics.start_server()
+
+def load_dvrs():
+    """Читає dvr_config.json у dvrs (один раз; ConfigError з переліком помилок, якщо конфігурація некоректна)."""
+    if not dvrs:
+        dvrs.update(load_config(CONFIG_FILE))
+
+def start_config_watcher():
+    """Запускає (один раз) стеження за dvr_config.json у процесі, що керує опитуванням."""
+    global config_watcher
+    if config_watcher is not None:
+        return
+    config_watcher = ConfigWatcher(CONFIG_FILE, lambda: dvrs, apply_config)
+    config_watcher.start()
+
+def reschedule_dvr(scheduler, dvr_name):
+    scheduler.reschedule(dvr_name, unreachable=state_store.is_unreachable(dvr_name),
+                         degraded=state_store.has_offline(dvr_name))
+
+def poll_and_reschedule(scheduler, dvr_name):
+    dvr_data = dvrs.get(dvr_name)
+    if dvr_data is None:
+        return
+    try:
+        check_dvr(dvr_name, dvr_data)
+    finally:
+        reschedule_dvr(scheduler, dvr_name)
+
+def restore_state():
+    """Відновлює збережений стан (один раз) і запускає запис журналу."""
+    if state_journal.thread is not None:
+        return
+    started = time.monotonic()
+    replayed = state_journal.load()
+    # DVR, прибрані з dvr_config.json, поки моніторинг не працював (видалення записується в журнал)
+    removed = [dvr_name for dvr_name in list(state_store.dvrs) if dvr_name not in dvrs]
+    for dvr_name in removed:
+        state_store.remove_dvr(dvr_name)
+    logging.info("State restored: %d DVRs, %d journal records in %.1f ms",
+                 len(state_store.dvrs), replayed, (time.monotonic() - started) * 1000)
+    if removed:
+        logging.info("State of DVRs no longer in the configuration dropped: %s", removed)
+    state_journal.start(STATE_FLUSH_INTERVAL)
+
+# Основний цикл
+def main():
+    # Журналювання налаштовує точка входу, а не імпорт модуля: процеси-обробники
+    # шардованого режиму імпортують його і журналюють через чергу координатора
+    setup_logging()
+    load_dvrs()
+    restore_state()
+    start_offline_summary()
+    start_config_watcher()
+    start_metrics_server()
+    if SHARD_WORKERS > 1:
+        # Передаємо поточний модуль явно: скрипт може бути запущений як __main__
+        from sharded_monitor import run_sharded
+        run_sharded(sys.modules[__name__], SHARD_WORKERS)
+        return
+    run_polling()
+
+def run_polling():
+    """Опитування DVR з dvrs за розкладом у цьому процесі (потоки або asyncio)."""
+    start_snapshot_probe()
+    if POLLING_MODE == 'async' or ALERT_STREAM:
+        from async_monitor import run_async
+        run_async(sys.modules[__name__])
+        return
+
+    scheduler = create_scheduler()
+    hook = lambda added, removed, changed: update_scheduler(scheduler, added, removed, changed)
+    reload_hooks.append(hook)
+    clear_console()
+    print('---------------------------------------------')
+    print("Press Ctrl+C to exit the program.")
+    logging.info("-" * 24 + 'Start checking' + "-" * 24)
+    workers = max(1, len(dvrs))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            if len(dvrs) > workers:
+                # Після додавання DVR у конфігурацію: по потоку на DVR, як і на старті
+                executor.shutdown(wait=False)
+                workers = len(dvrs)
+                executor = ThreadPoolExecutor(max_workers=workers)
+            for dvr_name in scheduler.pop_due():
+                executor.submit(poll_and_reschedule, scheduler, dvr_name)
+            wait = scheduler.time_until_next()
+            time.sleep(min(wait, 1.0) if wait is not None else 1.0)
+    finally:
+        reload_hooks.remove(hook)
+        executor.shutdown()
 
 def menu():
     global timer
@@ -378,6 +857,7 @@ def menu():
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Черга + фоновий запис з ротацією, див. logging_setup.py
+    setup_logging()
     menu()
     #main()
@@ -0,0 +1,244 @@
+"""
+Історія відключень камер у SQLite (WAL) із запитами та імпортом старого журналу.
+
+Приклади:
+    python outage_store.py downtime --dvr "DVR 1" --since 2026-09-01 --until 2026-10-01
+    python outage_store.py flappers -n 10 --since 2026-09-01
+    python outage_store.py scan --since "2026-10-01 08:00" --until "2026-10-01 20:00"
+    python outage_store.py import offline_cameras_log.txt
+"""
+import argparse
+import atexit
+import os
+import queue
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+OUTAGE_DB = os.getenv("OUTAGE_DB", "outages.db")
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outages (
+    id INTEGER PRIMARY KEY,
+    dvr TEXT NOT NULL,
+    camera_type TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outages_dvr_start ON outages (dvr, start_ts);
+CREATE INDEX IF NOT EXISTS idx_outages_camera_start ON outages (dvr, camera, start_ts);
+CREATE INDEX IF NOT EXISTS idx_outages_start ON outages (start_ts);
+CREATE INDEX IF NOT EXISTS idx_outages_end ON outages (end_ts);
+"""
+
+INSERT = "INSERT INTO outages (dvr, camera_type, camera, start_ts, end_ts) VALUES (?, ?, ?, ?, ?)"
+
+
+def connect(path=OUTAGE_DB):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class OutageWriter:
+    """
+    Буферизований запис відключень у фоновому потоці.
+
+    record() лише ставить запис у чергу; потік записує їх пакетами
+    (до BATCH_SIZE записів або раз на FLUSH_INTERVAL секунд) однією транзакцією.
+
+    :param path: Шлях до файлу бази.
+    """
+
+    def __init__(self, path=OUTAGE_DB):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='outage-writer', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush, 10)
+
+    def record(self, dvr_name, camera_type, camera, start_ts, end_ts):
+        """Додає відключення камери (час - epoch)."""
+        self.start()
+        self.queue.put((dvr_name, camera_type, camera, start_ts, end_ts))
+
+    def flush(self, timeout=None):
+        """Чекає, поки всі поставлені в чергу записи будуть збережені."""
+        if self.thread is None:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            item = self.queue.get()
+            batch, waiters = [], []
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get(timeout=FLUSH_INTERVAL if not waiters else 0)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(INSERT, batch)
+                except sqlite3.Error as e:
+                    print(f"Failed to write outages: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+
+def _range_filter(dvr=None, since=None, until=None):
+    # Відключення, що перетинаються з інтервалом [since, until). Якщо задано since,
+    # умова по start_ts позначається '+', щоб SQLite шукав по індексу end_ts:
+    # відключення короткі, тож end_ts > since відбирає лише потрібний відрізок історії.
+    clauses, params = [], []
+    if dvr is not None:
+        clauses.append("dvr = ?")
+        params.append(dvr)
+    if since is not None:
+        clauses.append("end_ts > ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("+start_ts < ?" if since is not None else "start_ts < ?")
+        params.append(until)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def downtime_by_camera(conn, dvr=None, since=None, until=None):
+    """
+    Сумарний час відключень кожної камери, обрізаний межами інтервалу.
+
+    :return: Список (dvr, camera_type, camera, кількість відключень, секунд простою), за спаданням простою.
+    """
+    where, params = _range_filter(dvr, since, until)
+    lower = "MAX(start_ts, ?)" if since is not None else "start_ts"
+    upper = "MIN(end_ts, ?)" if until is not None else "end_ts"
+    bounds = [value for value in (until, since) if value is not None]
+    return conn.execute(
+        f"SELECT dvr, camera_type, camera, COUNT(*), SUM({upper} - {lower}) AS downtime FROM outages{where} "
+        f"GROUP BY dvr, camera_type, camera ORDER BY downtime DESC", bounds + params).fetchall()
+
+
+def top_flappers(conn, limit=10, dvr=None, since=None, until=None):
+    """:return: Список (dvr, camera_type, camera, кількість відключень) - камери, що найчастіше відключались."""
+    where, params = _range_filter(dvr, since, until)
+    return conn.execute(
+        f"SELECT dvr, camera_type, camera, COUNT(*) AS outages FROM outages{where} "
+        f"GROUP BY dvr, camera_type, camera ORDER BY outages DESC LIMIT ?", params + [limit]).fetchall()
+
+
+def outages_between(conn, since=None, until=None, dvr=None):
+    """:return: Список (dvr, camera_type, camera, start_ts, end_ts) за часом початку."""
+    where, params = _range_filter(dvr, since, until)
+    return conn.execute(
+        f"SELECT dvr, camera_type, camera, start_ts, end_ts FROM outages{where} ORDER BY +start_ts", params).fetchall()
+
+
+LOG_LINE = re.compile(r"^DVR: (?P<dvr>.*?), (?P<camera>.*) was OFFLINE from (?P<start>.+?) to (?P<end>.+?) \(Duration: .*\)$")
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+
+def parse_time(value):
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), time_format)
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown time format: {value}")
+
+
+def import_text_log(conn, file_path='offline_cameras_log.txt'):
+    """
+    Імпортує старий текстовий журнал offline_cameras_log.txt.
+
+    Аналогові камери записувались із часом відновлення без секунд, цифрові - з повним часом;
+    за цим визначається тип камери.
+
+    :return: (кількість імпортованих рядків, кількість пропущених рядків).
+    """
+    rows, skipped = [], 0
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        for line in file:
+            match = LOG_LINE.match(line.strip())
+            if match is None:
+                skipped += bool(line.strip())
+                continue
+            try:
+                start, end = parse_time(match['start']), parse_time(match['end'])
+            except ValueError:
+                skipped += 1
+                continue
+            camera_type = 'Analog' if len(match['end'].strip()) == 16 else 'Digital'
+            rows.append((match['dvr'], camera_type, match['camera'], start.timestamp(), end.timestamp()))
+    with conn:
+        conn.executemany(INSERT, rows)
+    return len(rows), skipped
+
+
+def format_duration(seconds):
+    return str(timedelta(seconds=int(seconds)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Camera outage history")
+    parser.add_argument('--db', default=OUTAGE_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_range(command):
+        command.add_argument('--dvr')
+        command.add_argument('--since', type=parse_time)
+        command.add_argument('--until', type=parse_time)
+
+    add_range(commands.add_parser('downtime', help="total downtime per camera"))
+    flappers = commands.add_parser('flappers', help="cameras with the most outages")
+    add_range(flappers)
+    flappers.add_argument('-n', type=int, default=10)
+    add_range(commands.add_parser('scan', help="outages in a time range"))
+    import_command = commands.add_parser('import', help="import offline_cameras_log.txt")
+    import_command.add_argument('file', nargs='?', default='offline_cameras_log.txt')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == 'import':
+        imported, skipped = import_text_log(conn, args.file)
+        print(f"Imported {imported} outages, skipped {skipped} lines.")
+        return
+
+    since = args.since.timestamp() if args.since else None
+    until = args.until.timestamp() if args.until else None
+    if args.command == 'downtime':
+        for dvr, camera_type, camera, count, downtime in downtime_by_camera(conn, args.dvr, since, until):
+            print(f"DVR: {dvr}, {camera_type} {camera} - {count} outages, total downtime {format_duration(downtime)}")
+    elif args.command == 'flappers':
+        for dvr, camera_type, camera, count in top_flappers(conn, args.n, args.dvr, since, until):
+            print(f"DVR: {dvr}, {camera_type} {camera} - {count} outages")
+    elif args.command == 'scan':
+        for dvr, camera_type, camera, start_ts, end_ts in outages_between(conn, since, until, args.dvr):
+            print(f"DVR: {dvr}, {camera_type} {camera} was OFFLINE from "
+                  f"{datetime.fromtimestamp(start_ts):%Y-%m-%d %H:%M} to {datetime.fromtimestamp(end_ts):%Y-%m-%d %H:%M} "
+                  f"(Duration: {format_duration(end_ts - start_ts)})")
+
+
+if __name__ == "__main__":
+    main()
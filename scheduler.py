@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+# Розкид часу опитування (частка від інтервалу), щоб запити не йшли пачками
+JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+# Верхня межа інтервалу під час експоненційної затримки для недоступного DVR
+MAX_INTERVAL = float(os.getenv("SCHEDULER_MAX_INTERVAL", "1800"))
+# Прискорення опитування, поки на DVR є камери в стані offline
+DEGRADED_FACTOR = float(os.getenv("SCHEDULER_DEGRADED_FACTOR", "0.5"))
+MIN_INTERVAL = float(os.getenv("SCHEDULER_MIN_INTERVAL", "15"))
+
+
+class DvrScheduler:
+    """
+    Планувальник опитування DVR на основі черги з пріоритетом (час наступного опитування).
+
+    Кожен DVR має власний інтервал. Поки DVR недоступний, інтервал зростає
+    експоненційно (до MAX_INTERVAL); поки на ньому є камери offline - скорочується
+    (але не нижче MIN_INTERVAL). Всі методи потокобезпечні.
+
+    :param base_interval: Базовий інтервал опитування в секундах.
+    """
+
+    def __init__(self, base_interval, jitter=JITTER, max_interval=MAX_INTERVAL,
+                 degraded_factor=DEGRADED_FACTOR, min_interval=MIN_INTERVAL):
+        self.base_interval = base_interval
+        self.jitter = jitter
+        self.max_interval = max(max_interval, base_interval)
+        self.degraded_factor = degraded_factor
+        self.min_interval = min(min_interval, base_interval)
+        self.queue = []
+        self.entries = {}
+        self.intervals = {}
+        self.failures = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def _push(self, dvr_name, due):
+        previous = self.entries.get(dvr_name)
+        if previous is not None:
+            # Ледаче видалення: запис у купі позначається як порожній
+            previous[2] = None
+        entry = [due, next(self.counter), dvr_name]
+        self.entries[dvr_name] = entry
+        heapq.heappush(self.queue, entry)
+
+    def add(self, dvr_name, interval=None):
+        """Додає DVR; перше опитування розкидається в межах частки jitter від інтервалу."""
+        with self.lock:
+            interval = interval or self.base_interval
+            self.intervals[dvr_name] = interval
+            self.failures[dvr_name] = 0
+            self._push(dvr_name, time.monotonic() + random.uniform(0, self.jitter * interval))
+
+    def remove(self, dvr_name):
+        with self.lock:
+            entry = self.entries.pop(dvr_name, None)
+            if entry is not None:
+                entry[2] = None
+            self.intervals.pop(dvr_name, None)
+            self.failures.pop(dvr_name, None)
+
+    def set_interval(self, dvr_name, interval=None):
+        """Змінює інтервал DVR (None - базовий); діє з наступного reschedule()."""
+        with self.lock:
+            if dvr_name in self.intervals:
+                self.intervals[dvr_name] = interval or self.base_interval
+
+    def poll_now(self, dvr_name):
+        """Переносить заплановане опитування DVR на зараз (якщо DVR не опитується в цю мить)."""
+        with self.lock:
+            if dvr_name in self.entries:
+                self._push(dvr_name, time.monotonic())
+
+    def next_interval(self, dvr_name, unreachable, degraded):
+        interval = self.intervals[dvr_name]
+        if unreachable:
+            self.failures[dvr_name] += 1
+            interval = min(interval * 2 ** min(self.failures[dvr_name], 16), self.max_interval)
+        else:
+            self.failures[dvr_name] = 0
+            if degraded:
+                interval = max(interval * self.degraded_factor, self.min_interval)
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def reschedule(self, dvr_name, unreachable=False, degraded=False):
+        """Планує наступне опитування DVR після завершення поточного."""
+        with self.lock:
+            if dvr_name not in self.intervals:
+                return
+            self._push(dvr_name, time.monotonic() + self.next_interval(dvr_name, unreachable, degraded))
+
+    def pop_due(self):
+        """Повертає DVR, час опитування яких настав, і вилучає їх із черги до reschedule()."""
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            while self.queue and self.queue[0][0] <= now:
+                _, _, dvr_name = heapq.heappop(self.queue)
+                if dvr_name is not None:
+                    del self.entries[dvr_name]
+                    due.append(dvr_name)
+        return due
+
+    def time_until_next(self):
+        with self.lock:
+            while self.queue and self.queue[0][2] is None:
+                heapq.heappop(self.queue)
+            if not self.queue:
+                return None
+            return max(0.0, self.queue[0][0] - time.monotonic())
@@ -0,0 +1,175 @@
+import bisect
+import hashlib
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+
+# Кількість віртуальних вузлів на кожен процес у кільці хешування
+VIRTUAL_NODES = 100
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Консистентне хешування назв DVR на процеси-обробники.
+
+    Належність DVR залежить лише від його назви та набору обробників, тож
+    додавання нових DVR у dvr_config.json не переносить наявні між процесами.
+    """
+
+    def __init__(self, nodes, virtual_nodes=VIRTUAL_NODES):
+        self.ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(virtual_nodes))
+        self.keys = [key for key, _ in self.ring]
+
+    def node_for(self, key):
+        index = bisect.bisect(self.keys, _hash(key)) % len(self.keys)
+        return self.ring[index][1]
+
+
+def assign_shards(dvr_names, workers, ring=None):
+    """:return: {номер обробника: [назви DVR]}."""
+    ring = ring or HashRing(range(workers))
+    shards = {worker_id: [] for worker_id in range(workers)}
+    for dvr_name in dvr_names:
+        shards[ring.node_for(dvr_name)].append(dvr_name)
+    return shards
+
+
+def apply_config_updates(monitor, control_queue):
+    """Потік обробника: застосовує зміни конфігурації, які координатор надсилає в control_queue."""
+    while True:
+        updates = control_queue.get()
+        try:
+            monitor.apply_config(updates)
+        except Exception:
+            logging.exception("Failed to apply configuration update")
+
+
+def worker_main(worker_id, shard_dvrs, shard_state, timer, event_queue, log_queue, control_queue):
+    """
+    Процес-обробник: опитує свою частину DVR і надсилає події переходів координатору.
+
+    Конфігурацію DVR (shard_dvrs - {назва DVR: дані}) передає координатор: файл
+    dvr_config.json може бути вже зміненим або некоректним.
+
+    Журналювання йде через log_queue до координатора, який єдиний пише camera_log.txt.
+    Зміни конфігурації DVR цього обробника надходять через control_queue.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+    import monitor_cameras as monitor
+    # Обробник черги вже встановлено: лише рівні журналювання бібліотек (файл журналу не відкривається)
+    monitor.setup_logging()
+    monitor.dvrs.update(shard_dvrs)
+    monitor.timer = timer
+    monitor.state_store.restore(shard_state)
+    monitor.event_sink = lambda events: event_queue.put((worker_id, events))
+    threading.Thread(target=apply_config_updates, args=(monitor, control_queue), name='config-updates',
+                     daemon=True).start()
+    # Кожен обробник віддає власні метрики перевірок на наступних портах після координатора
+    if monitor.metrics.METRICS_PORT:
+        monitor.metrics.start_server(monitor.metrics.METRICS_PORT + worker_id + 1)
+    try:
+        monitor.run_polling()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_sharded(monitor, workers):
+    """
+    Координатор: розподіляє DVR між процесами, приймає від них події переходів,
+    веде дзеркало стану (з журналом), сповіщення та історію відключень.
+    Зміни dvr_config.json надсилаються лише обробникам, яким належать змінені DVR.
+
+    :param monitor: Модуль monitor_cameras.
+    :param workers: Кількість процесів-обробників.
+    """
+    context = multiprocessing.get_context('spawn')
+    event_queue = context.Queue()
+    log_queue = context.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+
+    ring = HashRing(range(workers))
+    # {номер обробника: {назва DVR: None}} - упорядкована множина, зміни за O(1)
+    shards = {worker_id: dict.fromkeys(dvr_names)
+              for worker_id, dvr_names in assign_shards(monitor.dvrs, workers, ring).items()}
+    processes = {}
+    control_queues = {}
+    # Зміни конфігурації від ConfigWatcher (інший потік) обробляє основний цикл координатора
+    pending_updates = queue.Queue()
+
+    def start_worker(worker_id):
+        snapshot = monitor.state_store.snapshot()
+        shard_state = {dvr_name: snapshot[dvr_name] for dvr_name in shards[worker_id] if dvr_name in snapshot}
+        # Робоча конфігурація координатора, а не файл (DVR, вже видалені наступним оновленням, пропускаються)
+        shard_config = {dvr_name: monitor.dvrs[dvr_name] for dvr_name in shards[worker_id] if dvr_name in monitor.dvrs}
+        control_queues[worker_id] = context.Queue()
+        process = context.Process(target=worker_main, name=f"dvr-shard-{worker_id}", daemon=True,
+                                  args=(worker_id, shard_config, shard_state, monitor.timer, event_queue,
+                                        log_queue, control_queues[worker_id]))
+        process.start()
+        processes[worker_id] = process
+
+    def route_updates(updates):
+        """Надсилає зміни обробникам, яким належать DVR (обробник без DVR запускається)."""
+        by_worker = {}
+        for dvr_name, dvr_data in updates.items():
+            worker_id = ring.node_for(dvr_name)
+            by_worker.setdefault(worker_id, {})[dvr_name] = dvr_data
+            if dvr_data is None:
+                shards[worker_id].pop(dvr_name, None)
+            else:
+                shards[worker_id][dvr_name] = None
+        for worker_id, worker_updates in by_worker.items():
+            if worker_id in processes:
+                control_queues[worker_id].put(worker_updates)
+            elif shards[worker_id]:
+                start_worker(worker_id)
+
+    def on_reload(added, removed, changed):
+        pending_updates.put({dvr_name: monitor.dvrs.get(dvr_name) for dvr_name in added + removed + changed})
+
+    monitor.reload_hooks.append(on_reload)
+
+    for worker_id, dvr_names in shards.items():
+        if dvr_names:
+            start_worker(worker_id)
+    monitor.clear_console()
+    print(f"Started {len(processes)} worker processes for {len(monitor.dvrs)} DVRs.")
+    print("Press Ctrl+C to exit the program.")
+    logging.info("Sharded monitoring: %d workers, shard sizes %s",
+                 len(processes), [len(dvr_names) for dvr_names in shards.values()])
+
+    try:
+        while True:
+            while not pending_updates.empty():
+                route_updates(pending_updates.get())
+            try:
+                _, events = event_queue.get(timeout=1.0)
+            except queue.Empty:
+                for worker_id, process in list(processes.items()):
+                    if not process.is_alive():
+                        logging.error("Worker %d exited with code %s, restarting", worker_id, process.exitcode)
+                        start_worker(worker_id)
+                continue
+            # Події, що надійшли від обробника до того, як він отримав видалення DVR
+            events = [event for event in events if event.dvr_name in monitor.dvrs]
+            monitor.state_store.apply_transitions(events)
+            monitor.report_events(events)
+    finally:
+        monitor.reload_hooks.remove(on_reload)
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(5)
+        listener.stop()
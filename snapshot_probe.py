@@ -0,0 +1,282 @@
+"""
+Глибока перевірка зображення камер за знімками ISAPI.
+
+Камера може бути online за даними DVR і при цьому віддавати чорний кадр або
+застиглу картинку (завислий енкодер, закритий об'єктив, несправна матриця).
+SnapshotProbe раз на SNAPSHOT_INTERVAL секунд бере знімки робочих камер DVR
+(GET /ISAPI/Streaming/channels/<канал><потік>/picture) і рахує з них дешеві
+відбитки numpy: середню яскравість, розкид яскравості та різницевий хеш (dHash)
+з мініатюрою для порівняння з попереднім кадром. Однорідний темний кадр - 'black',
+однорідний світлий (заставка "No video" тощо) - 'blank', знімок, що байт у байт
+не змінюється SNAPSHOT_FROZEN_PROBES перевірок поспіль, - 'frozen'. Нерухома сцена
+без OSD-годинника дає майже однакові мініатюри, але інші байти (шум матриці), тож
+порівняння мініатюр (SNAPSHOT_FROZEN_MAX_DIFF) вмикається лише за бажанням.
+
+Щоб не перевантажувати реєстратори, знімки одного DVR беруться по одному,
+одночасно перевіряється не більше SNAPSHOT_WORKERS DVR, а недоступні DVR та камери
+offline пропускаються. JPEG декодується одразу зменшеним (масштабування DCT під час
+декодування, Image.draft), а знімок, що байт у байт збігається з попереднім,
+не декодується зовсім.
+
+Потрібні numpy та Pillow (pip install numpy pillow); без них перевірка вимикається.
+Цифрові канали гібридного DVR перевіряються, лише якщо в його записі dvr_config.json
+задано 'ip_channel_offset' - зсув номерів IP-каналів у /ISAPI/Streaming.
+
+Налаштування (.env):
+    SNAPSHOT_PROBE          - 1 вмикає перевірку знімків
+    SNAPSHOT_INTERVAL       - період перевірки камер одного DVR, с (600)
+    SNAPSHOT_WORKERS        - скільки DVR перевіряється одночасно (4)
+    SNAPSHOT_STREAM         - потік знімка: 1 - основний, 2 - додатковий (менший знімок) (1)
+    SNAPSHOT_FROZEN_PROBES  - скільки перевірок поспіль кадр не змінюється, щоб камера вважалась застиглою (3)
+    SNAPSHOT_FROZEN_MAX_DIFF - незмінним вважається й інший JPEG з тим самим dHash, мініатюра якого
+                               відрізняється не більше ніж на стільки (0-255) (-1 - лише байт у байт)
+    SNAPSHOT_BLACK_LUMA     - середня яскравість (0-255), нижче якої однорідний кадр вважається чорним (24)
+    SNAPSHOT_MIN_STDDEV     - розкид яскравості, нижче якого кадр вважається однорідним (4)
+"""
+import io
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = Image = None
+
+import metrics
+from fingerprint_cache import fingerprint
+from scheduler import DvrScheduler
+from state_store import Transition, split_channel_key, DIGITAL, IMAGE_FAULT, IMAGE_OK
+
+SNAPSHOT_PATH = "/ISAPI/Streaming/channels/{stream_id}/picture"
+
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "600"))
+SNAPSHOT_WORKERS = int(os.getenv("SNAPSHOT_WORKERS", "4"))
+SNAPSHOT_STREAM = int(os.getenv("SNAPSHOT_STREAM", "1"))
+FROZEN_PROBES = int(os.getenv("SNAPSHOT_FROZEN_PROBES", "3"))
+FROZEN_MAX_DIFF = int(os.getenv("SNAPSHOT_FROZEN_MAX_DIFF", "-1"))
+BLACK_LUMA = float(os.getenv("SNAPSHOT_BLACK_LUMA", "24"))
+MIN_STDDEV = float(os.getenv("SNAPSHOT_MIN_STDDEV", "4"))
+
+# Найменший розмір, до якого JPEG зменшується під час декодування (draft обирає масштаб 1/2..1/8)
+DECODE_SIZE = (160, 120)
+# Мініатюра для порівняння кадрів (SNAPSHOT_FROZEN_MAX_DIFF)
+THUMBNAIL_SIZE = (32, 32)
+
+# digest - хеш байтів JPEG; thumbnail - мініатюра uint8 THUMBNAIL_SIZE
+ImageFingerprint = namedtuple('ImageFingerprint', 'digest mean stddev dhash thumbnail')
+
+probes_total = metrics.counter('snapshot_probes_total',
+                               "Camera snapshots checked by the deep-health probe: decoded, unchanged (same bytes), error",
+                               ('result',))
+
+
+class CameraProbe:
+    """Стан перевірки однієї камери: останній відбиток, кількість однакових кадрів поспіль, поточна проблема."""
+
+    __slots__ = ('fingerprint', 'same', 'problem', 'since')
+
+    def __init__(self):
+        self.fingerprint = None
+        self.same = 0
+        self.problem = None
+        self.since = None
+
+
+def available():
+    """Чи встановлені numpy та Pillow."""
+    return np is not None
+
+
+def image_fingerprint(content, digest=None):
+    """
+    Відбиток JPEG-знімка.
+
+    Кадр декодується в градаціях сірого зі зменшенням (не менше DECODE_SIZE),
+    тож вартість майже не залежить від роздільної здатності камери.
+
+    :param digest: Хеш байтів знімка, якщо вже пораховано.
+    """
+    image = Image.open(io.BytesIO(content))
+    image.draft('L', DECODE_SIZE)
+    image = image.convert('L')
+    pixels = np.asarray(image, dtype=np.float32)
+    # dHash: 64 біти "сусідній піксель праворуч яскравіший" на мініатюрі 9x8
+    small = np.asarray(image.resize((9, 8), Image.BOX), dtype=np.int16)
+    dhash = int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), 'big')
+    thumbnail = np.asarray(image.resize(THUMBNAIL_SIZE, Image.BOX), dtype=np.uint8)
+    return ImageFingerprint(digest or fingerprint(content), float(pixels.mean()), float(pixels.std()),
+                            dhash, thumbnail)
+
+
+def image_problem(current):
+    """:return: 'black' або 'blank' для однорідного кадру, інакше None."""
+    if current.stddev >= MIN_STDDEV:
+        return None
+    return 'black' if current.mean < BLACK_LUMA else 'blank'
+
+
+def same_frame(previous, current, max_diff=FROZEN_MAX_DIFF):
+    """
+    Чи кадр не змінився: ті самі байти JPEG.
+
+    :param max_diff: Якщо не менше 0, незмінним вважається й інший JPEG з тим самим dHash
+        і мініатюрою, що відрізняється не більше ніж на max_diff (застиглий кадр, який DVR
+        кодує заново); так само може виглядати й нерухома сцена.
+    """
+    if previous.digest == current.digest:
+        return True
+    if max_diff < 0 or previous.dhash != current.dhash:
+        return False
+    difference = np.abs(previous.thumbnail.astype(np.int16) - current.thumbnail.astype(np.int16))
+    return int(difference.max()) <= max_diff
+
+
+def snapshot_path(key, dvr_data, stream=SNAPSHOT_STREAM):
+    """
+    Шлях знімка камери або None, якщо номер каналу в /ISAPI/Streaming невідомий.
+
+    Номер потоку - канал * 100 + потік (101, 102, 201...). IP-канали гібридного DVR
+    нумеруються після аналогових, тому для них потрібен 'ip_channel_offset'.
+    """
+    camera_type, channel_no = split_channel_key(key)
+    if camera_type == DIGITAL and dvr_data.get('type') == 'mixed':
+        offset = dvr_data.get('ip_channel_offset')
+        if offset is None:
+            return None
+        channel_no += offset
+    return SNAPSHOT_PATH.format(stream_id=channel_no * 100 + stream)
+
+
+class SnapshotProbe:
+    """
+    Фонова перевірка знімків камер усіх DVR з monitor.dvrs.
+
+    Власний DvrScheduler (SNAPSHOT_INTERVAL, експоненційна затримка для недоступних
+    DVR) і пул з SNAPSHOT_WORKERS потоків; HTTP-сесії ті самі, що в опитуванні
+    (monitor.get_session). Події IMAGE_FAULT/IMAGE_OK передаються в monitor.dispatch_events.
+
+    :param monitor: Модуль monitor_cameras.
+    """
+
+    def __init__(self, monitor, interval=SNAPSHOT_INTERVAL, workers=SNAPSHOT_WORKERS):
+        self.monitor = monitor
+        self.scheduler = DvrScheduler(interval)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='snapshot')
+        # {dvr_name: {ключ каналу: CameraProbe}}
+        self.cameras = {}
+        self.thread = None
+
+    def fault_counts(self):
+        counts = {('black',): 0, ('blank',): 0, ('frozen',): 0}
+        for cameras in list(self.cameras.values()):
+            for camera in list(cameras.values()):
+                if camera.problem is not None:
+                    counts[(camera.problem,)] += 1
+        return counts
+
+    def start(self):
+        metrics.gauge('camera_image_faults', "Online cameras with a black, blank or frozen image", ('reason',),
+                      collect=self.fault_counts)
+        for dvr_name in self.monitor.dvrs:
+            self.scheduler.add(dvr_name)
+        self.monitor.reload_hooks.append(self.update)
+        self.thread = threading.Thread(target=self._run, name='snapshot-probe', daemon=True)
+        self.thread.start()
+
+    def update(self, added, removed, changed):
+        """Обробник reload_hooks: розклад і стан перевірки змінених DVR."""
+        for dvr_name in removed:
+            self.scheduler.remove(dvr_name)
+        for dvr_name in removed + changed:
+            self.cameras.pop(dvr_name, None)
+        for dvr_name in added + changed:
+            self.scheduler.add(dvr_name)
+
+    def _run(self):
+        while True:
+            for dvr_name in self.scheduler.pop_due():
+                self.executor.submit(self.probe_and_reschedule, dvr_name)
+            wait = self.scheduler.time_until_next()
+            time.sleep(min(wait, 1.0) if wait is not None else 1.0)
+
+    def probe_and_reschedule(self, dvr_name):
+        try:
+            self.probe_dvr(dvr_name)
+        except Exception:
+            logging.exception("Snapshot probe of %s failed", dvr_name, extra={'dvr': dvr_name})
+        finally:
+            self.scheduler.reschedule(dvr_name, unreachable=self.monitor.state_store.is_unreachable(dvr_name))
+
+    def probe_dvr(self, dvr_name):
+        """
+        Перевіряє знімки всіх камер DVR, що зараз online (по одному запиту за раз).
+
+        :return: Список подій (вже переданих у dispatch_events).
+        """
+        monitor = self.monitor
+        dvr_data = monitor.dvrs.get(dvr_name)
+        if dvr_data is None or monitor.state_store.is_unreachable(dvr_name):
+            return []
+        session = monitor.get_session(dvr_name, dvr_data)
+        base_url = monitor.dvr_base_url(dvr_data)
+        cameras = self.cameras.setdefault(dvr_name, {})
+        results = []
+        for key, since in monitor.state_store.dvr_channels(dvr_name).items():
+            path = snapshot_path(key, dvr_data)
+            if since is not None or path is None:
+                continue
+            try:
+                response = session.get(base_url + path, timeout=monitor.REQUEST_TIMEOUT)
+            except Exception:
+                probes_total.inc('error')
+                continue
+            if response.status_code != 200 or not response.content:
+                probes_total.inc('error')
+                continue
+            results.append((key, self.check_image(cameras.setdefault(key, CameraProbe()), response.content)))
+        if not monitor.is_current(dvr_name, dvr_data):
+            return []
+        now = time.time()
+        names = monitor.channel_names.get(dvr_name, {})
+        events = []
+        for key, problem in results:
+            camera = cameras[key]
+            if problem == camera.problem:
+                continue
+            name = names.get(key, f"channel {split_channel_key(key)[1]}")
+            if problem is None:
+                events.append(Transition(IMAGE_OK, dvr_name, key, name, camera.since, now, camera.problem))
+                camera.since = None
+            else:
+                camera.since = camera.since if camera.problem is not None else now
+                events.append(Transition(IMAGE_FAULT, dvr_name, key, name, camera.since, now, problem))
+            camera.problem = problem
+        monitor.dispatch_events(events)
+        return events
+
+    def check_image(self, camera, content):
+        """Оновлює стан камери за новим знімком; :return: проблема зображення або None."""
+        digest = fingerprint(content)
+        previous = camera.fingerprint
+        if previous is not None and previous.digest == digest:
+            # Той самий JPEG - відбиток уже пораховано
+            probes_total.inc('unchanged')
+            current = previous
+        else:
+            try:
+                current = image_fingerprint(content, digest)
+            except (OSError, ValueError):
+                probes_total.inc('error')
+                return camera.problem
+            probes_total.inc('decoded')
+        camera.same = camera.same + 1 if previous is not None and same_frame(previous, current) else 0
+        camera.fingerprint = current
+        problem = image_problem(current)
+        if problem is None and camera.same >= FROZEN_PROBES:
+            problem = 'frozen'
+        return problem
@@ -0,0 +1,371 @@
+import atexit
+import json
+import os
+import threading
+from collections import namedtuple
+
+# Типи камер та єдиний ключ каналу: номер каналу, для цифрових - зі зсувом
+ANALOG = 'Analog'
+DIGITAL = 'Digital'
+DIGITAL_KEY_OFFSET = 1 << 16
+
+# Події переходів стану
+NEW_OFFLINE = 'new_offline'        # камера вперше побачена і вона offline
+OFFLINE = 'offline'                # камера перейшла в offline
+STILL_OFFLINE = 'still_offline'    # камера досі offline
+ONLINE = 'online'                  # камера відновила роботу
+DVR_LOST = 'dvr_lost'              # втрачено зв'язок з DVR
+DVR_STILL_LOST = 'dvr_still_lost'  # DVR досі недоступний
+DVR_RESTORED = 'dvr_restored'      # зв'язок з DVR відновлено
+IMAGE_FAULT = 'image_fault'        # камера online, але зображення чорне/однорідне або застигло (snapshot_probe)
+IMAGE_OK = 'image_ok'              # зображення камери знову нормальне
+
+# Подія переходу. Для подій DVR key=None, а name - тип перевірки (ANALOG/DIGITAL),
+# з якої прийшла подія; detail - причина (для аналогових камер (resDesc, videoInputEnabled),
+# для подій зображення - 'black', 'blank' або 'frozen').
+Transition = namedtuple('Transition', 'event dvr_name key name since now detail')
+
+_MISSING = object()
+_UNCHANGED = (None, None)
+
+
+def channel_key(camera_type, channel_no):
+    """Єдиний цілочисельний ключ каналу для аналогових і цифрових камер."""
+    return channel_no + DIGITAL_KEY_OFFSET if camera_type == DIGITAL else channel_no
+
+
+def split_channel_key(key):
+    """Зворотне перетворення ключа: (тип камери, номер каналу)."""
+    if key >= DIGITAL_KEY_OFFSET:
+        return DIGITAL, key - DIGITAL_KEY_OFFSET
+    return ANALOG, key
+
+
+class DvrState:
+    """
+    Стан одного DVR.
+
+    lost_since - час втрати зв'язку (epoch) або None;
+    channels - {ключ каналу: час початку відключення (epoch) або None, якщо камера online};
+    names - {ключ каналу: назва камери} лише для камер offline (для зведень після перезапуску).
+    """
+    __slots__ = ('lost_since', 'channels', 'names')
+
+    def __init__(self):
+        self.lost_since = None
+        self.channels = {}
+        self.names = {}
+
+
+class CameraStateStore:
+    """
+    Потокобезпечне сховище стану камер і DVR.
+
+    Усі методи переходу повертають пару (подія, час початку відключення);
+    подія None означає, що стан не змінився і камера/DVR працює.
+    """
+
+    def __init__(self):
+        self.dvrs = {}
+        self.lock = threading.Lock()
+        # Зміни для журналу StateJournal (None - журнал не підключено)
+        self.changes = None
+
+    def _dvr(self, dvr_name):
+        state = self.dvrs.get(dvr_name)
+        if state is None:
+            state = self.dvrs[dvr_name] = DvrState()
+        return state
+
+    def transition(self, dvr_name, key, offline, now):
+        """
+        Оновлює стан каналу за результатом перевірки.
+
+        :param key: Ключ каналу (channel_key).
+        :param offline: Чи камера зараз не працює.
+        :param now: Поточний час (epoch).
+        :return: (NEW_OFFLINE | OFFLINE | STILL_OFFLINE | ONLINE | None, час початку відключення).
+        """
+        return self.transition_many(dvr_name, ((key, offline),), now)[0]
+
+    def transition_many(self, dvr_name, updates, now):
+        """
+        Пакетний варіант transition() для всіх каналів одного DVR (одне захоплення блокування).
+
+        :param updates: Послідовність пар (ключ каналу, offline).
+        :return: Список пар (подія, час початку відключення) у тому ж порядку.
+        """
+        results = []
+        append = results.append
+        with self.lock:
+            state = self._dvr(dvr_name)
+            channels = state.channels
+            for key, offline in updates:
+                since = channels.get(key, _MISSING)
+                if since is _MISSING:
+                    channels[key] = now if offline else None
+                    append((NEW_OFFLINE, now) if offline else _UNCHANGED)
+                elif offline:
+                    if since is None:
+                        channels[key] = now
+                        append((OFFLINE, now))
+                    else:
+                        append((STILL_OFFLINE, since))
+                elif since is not None:
+                    channels[key] = None
+                    state.names.pop(key, None)
+                    append((ONLINE, since))
+                else:
+                    append(_UNCHANGED)
+            if self.changes is not None:
+                for (key, _), (event, since) in zip(updates, results):
+                    if event in (NEW_OFFLINE, OFFLINE):
+                        self.changes.append(('c', dvr_name, key, since))
+                    elif event == ONLINE:
+                        self.changes.append(('c', dvr_name, key, None))
+        return results
+
+    def mark_dvr_lost(self, dvr_name, now):
+        """:return: (DVR_LOST | DVR_STILL_LOST, час втрати зв'язку)."""
+        with self.lock:
+            state = self._dvr(dvr_name)
+            if state.lost_since is None:
+                state.lost_since = now
+                self._record(('d', dvr_name, now))
+                return DVR_LOST, now
+            return DVR_STILL_LOST, state.lost_since
+
+    def mark_dvr_reachable(self, dvr_name):
+        """:return: (DVR_RESTORED, час втрати зв'язку) або (None, None)."""
+        with self.lock:
+            state = self._dvr(dvr_name)
+            since, state.lost_since = state.lost_since, None
+            if since is None:
+                return None, None
+            self._record(('d', dvr_name, None))
+            return DVR_RESTORED, since
+
+    def is_unreachable(self, dvr_name):
+        state = self.dvrs.get(dvr_name)
+        return state is not None and state.lost_since is not None
+
+    def has_offline(self, dvr_name):
+        state = self.dvrs.get(dvr_name)
+        return state is not None and any(since is not None for since in state.channels.values())
+
+    def dvr_channels(self, dvr_name):
+        """Копія стану каналів одного DVR: {ключ каналу: since}."""
+        with self.lock:
+            state = self.dvrs.get(dvr_name)
+            return dict(state.channels) if state is not None else {}
+
+    def set_name(self, dvr_name, key, name):
+        """Запам'ятовує назву камери offline (зберігається в журналі разом зі станом)."""
+        with self.lock:
+            state = self.dvrs.get(dvr_name)
+            if state is None or state.channels.get(key) is None or state.names.get(key) == name:
+                return
+            state.names[key] = name
+            self._record(('n', dvr_name, key, name))
+
+    def channel_name(self, dvr_name, key):
+        """:return: Збережена назва камери offline або None."""
+        state = self.dvrs.get(dvr_name)
+        return state.names.get(key) if state is not None else None
+
+    def remove_dvr(self, dvr_name):
+        with self.lock:
+            if self.dvrs.pop(dvr_name, None) is not None:
+                self._record(('x', dvr_name))
+
+    def reset(self):
+        with self.lock:
+            self.dvrs = {}
+            self._record(('r',))
+
+    def snapshot(self):
+        """Копія стану: {dvr_name: (lost_since, {ключ каналу: since})}."""
+        with self.lock:
+            return {dvr_name: (state.lost_since, dict(state.channels)) for dvr_name, state in self.dvrs.items()}
+
+    def restore(self, snapshot):
+        """Замінює стан знімком snapshot() (без запису в журнал)."""
+        with self.lock:
+            self.dvrs = {}
+            for dvr_name, (lost_since, channels) in snapshot.items():
+                state = self._dvr(dvr_name)
+                state.lost_since = lost_since
+                state.channels = dict(channels)
+
+    def apply_transitions(self, transitions):
+        """
+        Застосовує події переходів, отримані від іншого процесу (дзеркало стану координатора).
+
+        Зміни записуються в журнал так само, як і локальні переходи.
+        """
+        with self.lock:
+            for event, dvr_name, key, _, since, _, _ in transitions:
+                if key is None:
+                    if event == DVR_LOST:
+                        change = ('d', dvr_name, since)
+                    elif event == DVR_RESTORED:
+                        change = ('d', dvr_name, None)
+                    else:
+                        continue
+                elif event in (NEW_OFFLINE, OFFLINE):
+                    change = ('c', dvr_name, key, since)
+                elif event == ONLINE:
+                    change = ('c', dvr_name, key, None)
+                else:
+                    continue
+                self.apply_change(change)
+                self._record(change)
+
+    def _record(self, change):
+        if self.changes is not None:
+            self.changes.append(change)
+
+    def apply_change(self, change):
+        """Відтворює один запис журналу (без повторного запису в журнал)."""
+        kind = change[0]
+        if kind == 'c':
+            state = self._dvr(change[1])
+            state.channels[change[2]] = change[3]
+            if change[3] is None:
+                state.names.pop(change[2], None)
+        elif kind == 'n':
+            self._dvr(change[1]).names[change[2]] = change[3]
+        elif kind == 'd':
+            self._dvr(change[1]).lost_since = change[2]
+        elif kind == 'x':
+            self.dvrs.pop(change[1], None)
+        elif kind == 'r':
+            self.dvrs = {}
+
+
+class StateJournal:
+    """
+    Збереження стану CameraStateStore на диск для швидкого перезапуску.
+
+    Зміни стану дописуються в журнал (JSON-рядки) періодично фоновим потоком;
+    коли журнал стає задовгим, стан записується повним знімком (через
+    тимчасовий файл і os.replace), а журнал починається заново. Номер
+    покоління в знімку і в першому рядку журналу не дає відтворити старий
+    журнал поверх новішого знімка, якщо процес впав під час ущільнення.
+    Обірваний останній рядок журналу ігнорується.
+
+    :param store: Сховище стану.
+    :param directory: Каталог для state_snapshot.json та state_journal.log.
+    :param compact_after: Кількість записів журналу, після якої виконується ущільнення.
+    """
+
+    def __init__(self, store, directory='.', compact_after=10000):
+        self.store = store
+        self.snapshot_path = os.path.join(directory, 'state_snapshot.json')
+        self.journal_path = os.path.join(directory, 'state_journal.log')
+        self.compact_after = compact_after
+        self.generation = 0
+        self.journal_records = 0
+        self.journal_file = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def load(self):
+        """Завантажує знімок і відтворює журнал; після цього зміни стану записуються в журнал."""
+        with self.lock, self.store.lock:
+            snapshot = {}
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, 'r') as file:
+                    snapshot = json.load(file)
+            self.generation = snapshot.get('generation', 0)
+            self.store.dvrs = {}
+            for dvr_name, (lost_since, channels) in snapshot.get('dvrs', {}).items():
+                self.store.apply_change(('d', dvr_name, lost_since))
+                # [ключ, since] або [ключ, since, назва камери]
+                for key, since, *name in channels:
+                    self.store.apply_change(('c', dvr_name, key, since))
+                    if name:
+                        self.store.apply_change(('n', dvr_name, key, name[0]))
+            replayed = self._replay_journal()
+            self.store.changes = []
+        # Стан відновлено - одразу ущільнюємо, щоб почати нове покоління журналу
+        self.compact()
+        return replayed
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return 0
+        replayed = 0
+        with open(self.journal_path, 'r') as file:
+            lines = iter(file)
+            header = next(lines, None)
+            try:
+                if header is None or json.loads(header).get('generation') != self.generation:
+                    return 0
+            except ValueError:
+                return 0
+            for line in lines:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break
+                self.store.apply_change(change)
+                replayed += 1
+        return replayed
+
+    def flush(self):
+        """Дописує накопичені зміни в журнал (fsync) і за потреби ущільнює його."""
+        with self.lock:
+            if self.journal_file is None:
+                return
+            with self.store.lock:
+                changes, self.store.changes = self.store.changes, []
+            if not changes:
+                return
+            self.journal_file.write(''.join(json.dumps(change, separators=(',', ':')) + '\n' for change in changes))
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+            self.journal_records += len(changes)
+            compact = self.journal_records >= self.compact_after
+        if compact:
+            self.compact()
+
+    def compact(self):
+        """Записує повний знімок стану і починає новий журнал."""
+        with self.lock:
+            with self.store.lock:
+                dvrs = {dvr_name: [state.lost_since, [[key, since, state.names[key]] if key in state.names else [key, since]
+                                                       for key, since in state.channels.items() if since is not None]]
+                        for dvr_name, state in self.store.dvrs.items()}
+                self.store.changes = []
+            self.generation += 1
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump({'generation': self.generation, 'dvrs': dvrs}, file, separators=(',', ':'))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            if self.journal_file is not None:
+                self.journal_file.close()
+            self.journal_file = open(self.journal_path, 'w')
+            self.journal_file.write(json.dumps({'generation': self.generation}) + '\n')
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+            self.journal_records = 0
+
+    def start(self, interval=5.0):
+        """Запускає фоновий потік, що записує журнал кожні interval секунд."""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, args=(interval,), name='state-journal', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def _run(self, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Failed to write state journal: {e}")
@@ -0,0 +1,89 @@
+"""
+Локальна заглушка Telegram Bot API для перевірки черги повідомлень.
+
+Приймає POST /bot<token>/sendMessage, запам'ятовує повідомлення та імітує
+обмеження швидкості: якщо запити в один чат надходять частіше ніж
+min_interval, повертає 429 з retry_after, як справжній Bot API.
+
+Запуск: python telegram_stub.py --port 8081
+Далі в .env: TELEGRAM_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TelegramStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), min_interval=1.0, retry_after=1):
+        super().__init__(address, StubHandler)
+        self.min_interval = min_interval
+        self.retry_after = retry_after
+        self.messages = []
+        self.rejected = 0
+        self.last_send = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.endswith('/sendMessage'):
+            self.reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        chat_id = payload.get('chat_id')
+        stub = self.server
+        with stub.lock:
+            now = time.monotonic()
+            if now - stub.last_send.get(chat_id, float('-inf')) < stub.min_interval:
+                stub.rejected += 1
+                self.reply(429, {"ok": False, "error_code": 429,
+                                 "description": f"Too Many Requests: retry after {stub.retry_after}",
+                                 "parameters": {"retry_after": stub.retry_after}})
+                return
+            stub.last_send[chat_id] = now
+            stub.messages.append((now, chat_id, payload.get('text', '')))
+        self.reply(200, {"ok": True, "result": {"message_id": len(stub.messages)}})
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Telegram Bot API stub")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--min-interval', type=float, default=1.0)
+    args = parser.parse_args()
+    stub = TelegramStub(('127.0.0.1', args.port), min_interval=args.min_interval).start()
+    print(f"Telegram stub listening on {stub.url}. Press Ctrl+C to exit.")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"Delivered: {len(stub.messages)}, rejected (429): {stub.rejected}")
+    except KeyboardInterrupt:
+        stub.stop()
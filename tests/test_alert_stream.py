@@ -0,0 +1,200 @@
+"""Розбір потоку alertStream: multipart/mixed, EventNotificationAlert і ключі каналів."""
+import json
+import random
+
+import pytest
+
+from alert_stream import Alert, MultipartParser, Part, alert_channel_key, multipart_boundary, parse_alert
+from state_store import ANALOG, DIGITAL, channel_key
+
+XML_VER20 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<EventNotificationAlert version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<ipAddress>192.168.1.64</ipAddress>
+<channelID>5</channelID>
+<dateTime>2024-01-01T00:00:00+02:00</dateTime>
+<activePostCount>1</activePostCount>
+<eventType>videoloss</eventType>
+<eventState>active</eventState>
+<eventDescription>videoloss alarm</eventDescription>
+</EventNotificationAlert>'''
+
+XML_VER10 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<EventNotificationAlert version="1.0" xmlns="http://www.hikvision.com/ver10/XMLSchema">
+<ipAddress>192.168.1.64</ipAddress>
+<dynChannelID>3</dynChannelID>
+<eventType>IPCDisconnect</eventType>
+<eventState>inactive</eventState>
+</EventNotificationAlert>'''
+
+HEARTBEAT = b'''<?xml version="1.0" encoding="UTF-8"?>
+<EventNotificationAlert version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<channelID>0</channelID>
+<eventType>videoloss</eventType>
+<eventState>inactive</eventState>
+</EventNotificationAlert>'''
+
+JSON_ALERT = json.dumps({"ipAddress": "192.168.1.64", "channelID": 7, "eventType": "videoloss",
+                         "eventState": "active"}).encode()
+
+IMAGE = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 4 + b'\r\n--not-a-delimiter\r\n\xff\xd9'
+
+
+def part(body, content_type='application/xml; charset="UTF-8"', length=True):
+    headers = f'Content-Type: {content_type}\r\n'
+    if length:
+        headers += f'Content-Length: {len(body)}\r\n'
+    return b'--boundary\r\n' + headers.encode() + b'\r\n' + body + b'\r\n'
+
+
+# Частина без Content-Length закінчується лише з наступним роздільником, тому вона не остання
+STREAM = (b'HTTP preamble\r\n' + part(XML_VER20) + part(XML_VER10, length=False) +
+          part(JSON_ALERT, 'application/json') + part(IMAGE, 'image/jpeg'))
+BODIES = [XML_VER20, XML_VER10, JSON_ALERT, IMAGE]
+
+
+def feed(parser, chunks):
+    return [received for chunk in chunks for received in parser.feed(chunk)]
+
+
+def test_whole_stream():
+    parts = MultipartParser('boundary').feed(STREAM)
+    assert [received.body for received in parts] == BODIES
+    assert parts[2].headers['content-type'] == 'application/json'
+    assert 'content-length' not in parts[1].headers
+
+
+def test_split_at_every_offset():
+    for offset in range(len(STREAM) + 1):
+        parts = feed(MultipartParser('boundary'), [STREAM[:offset], STREAM[offset:]])
+        assert [received.body for received in parts] == BODIES, offset
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_chunks(seed):
+    rng = random.Random(seed)
+    chunks = []
+    position = 0
+    while position < len(STREAM):
+        size = rng.randint(1, 40)
+        chunks.append(STREAM[position:position + size])
+        position += size
+    assert [received.body for received in feed(MultipartParser('boundary'), chunks)] == BODIES
+
+
+def test_byte_by_byte():
+    chunks = [STREAM[i:i + 1] for i in range(len(STREAM))]
+    assert [received.body for received in feed(MultipartParser('boundary'), chunks)] == BODIES
+
+
+def test_body_without_content_length():
+    body = b'line 1\r\nline 2'
+    stream = part(body, length=False) + part(body, length=False).replace(b'\r\n', b'\n') + b'--boundary'
+    parts = MultipartParser('boundary').feed(stream)
+    # CRLF (або LF) перед роздільником належить роздільнику, рядки всередині тіла лишаються
+    assert [received.body for received in parts] == [body, body.replace(b'\r\n', b'\n')]
+
+
+def test_body_without_content_length_waits_for_delimiter():
+    parser = MultipartParser('boundary')
+    assert parser.feed(part(XML_VER20, length=False)) == []
+    assert [received.body for received in parser.feed(b'--boundary\r\n')] == [XML_VER20]
+
+
+def test_oversize_part_with_content_length_is_skipped():
+    parser = MultipartParser('boundary', max_part_size=512)
+    stream = part(IMAGE, 'image/jpeg') + part(XML_VER20)
+    assert [received.body for received in parser.feed(stream)] == [XML_VER20]
+    assert len(parser.buffer) < 512
+
+
+def test_oversize_part_with_content_length_is_not_buffered():
+    parser = MultipartParser('boundary', max_part_size=512)
+    header = b'--boundary\r\nContent-Type: image/jpeg\r\nContent-Length: 100000\r\n\r\n'
+    assert parser.feed(header) == []
+    for _ in range(99):
+        assert parser.feed(b'\x00' * 1000) == []
+        assert len(parser.buffer) == 0
+    assert [received.body for received in parser.feed(b'\x00' * 1000 + b'\r\n' + part(XML_VER20))] == [XML_VER20]
+
+
+def test_oversize_part_without_content_length_is_dropped():
+    parser = MultipartParser('boundary', max_part_size=512)
+    assert parser.feed(b'--boundary\r\nContent-Type: image/jpeg\r\n\r\n') == []
+    for _ in range(10):
+        assert parser.feed(b'\x00' * 100) == []
+    assert len(parser.buffer) <= 512
+    assert [received.body for received in parser.feed(part(XML_VER20))] == [XML_VER20]
+
+
+def test_oversize_headers_are_dropped():
+    parser = MultipartParser('boundary', max_part_size=512)
+    assert parser.feed(b'--boundary\r\nX-Junk: ' + b'a' * 1000) == []
+    assert [received.body for received in parser.feed(b'\r\n' + part(XML_VER20))] == [XML_VER20]
+
+
+@pytest.mark.parametrize('content_type, boundary', [
+    ('multipart/mixed; boundary=boundary', 'boundary'),
+    ('multipart/mixed; boundary="MIME_boundary"; charset=UTF-8', 'MIME_boundary'),
+    ('multipart/mixed', 'boundary'),
+    (None, 'boundary'),
+])
+def test_multipart_boundary(content_type, boundary):
+    assert multipart_boundary(content_type) == boundary
+
+
+def test_parse_xml_ver20():
+    assert parse_alert(Part({'content-type': 'application/xml'}, XML_VER20)) == Alert('videoloss', True, 5)
+
+
+def test_parse_xml_ver10_dyn_channel():
+    assert parse_alert(Part({}, XML_VER10)) == Alert('ipcdisconnect', False, 3)
+
+
+def test_parse_json():
+    assert parse_alert(Part({'content-type': 'application/json'}, JSON_ALERT)) == Alert('videoloss', True, 7)
+
+
+def test_parse_json_wrapped_without_content_type():
+    body = json.dumps({"EventNotificationAlert": {"eventType": "IPCDisconnect", "eventState": "active",
+                                                  "dynChannelID": "12"}}).encode()
+    assert parse_alert(Part({}, b'\r\n' + body)) == Alert('ipcdisconnect', True, 12)
+
+
+def test_parse_heartbeat_has_no_channel():
+    assert parse_alert(Part({}, HEARTBEAT)) == Alert('videoloss', False, None)
+
+
+@pytest.mark.parametrize('received', [
+    Part({'content-type': 'image/jpeg'}, IMAGE),
+    Part({'content-type': 'application/xml'}, b'<EventNotificationAlert><eventType>videoloss'),
+    Part({'content-type': 'application/xml'}, b'<ResponseStatus><statusCode>1</statusCode></ResponseStatus>'),
+    Part({'content-type': 'application/json'}, b'{"eventState": "active"}'),
+    Part({'content-type': 'application/json'}, b'{broken'),
+    Part({'content-type': 'application/json'}, b'[1, 2]'),
+])
+def test_parse_not_an_alert(received):
+    assert parse_alert(received) is None
+
+
+ANALOG_DVR = {'type': 'analog', 'valid_camera_ids': [1, 2, 3]}
+IP_DVR = {'type': 'ip'}
+MIXED_DVR = {'type': 'mixed', 'valid_camera_ids': [1, 2]}
+
+
+@pytest.mark.parametrize('alert, dvr_data, key', [
+    # Аналоговий DVR: videoloss - аналоговий канал, лише з valid_camera_ids
+    (Alert('videoloss', True, 2), ANALOG_DVR, channel_key(ANALOG, 2)),
+    (Alert('videoloss', True, 9), ANALOG_DVR, None),
+    # NVR: videoloss і ipcDisconnect - цифровий канал
+    (Alert('videoloss', True, 9), IP_DVR, channel_key(DIGITAL, 9)),
+    (Alert('ipcdisconnect', False, 9), IP_DVR, channel_key(DIGITAL, 9)),
+    # Гібридний DVR: videoloss - аналоговий канал, ipcDisconnect - цифровий з тим самим номером
+    (Alert('videoloss', True, 2), MIXED_DVR, channel_key(ANALOG, 2)),
+    (Alert('ipcdisconnect', True, 2), MIXED_DVR, channel_key(DIGITAL, 2)),
+    (Alert('videoloss', True, 5), MIXED_DVR, None),
+    # Heartbeat та інші події не стосуються стану камер
+    (Alert('videoloss', False, None), MIXED_DVR, None),
+    (Alert('vmd', True, 2), MIXED_DVR, None),
+])
+def test_alert_channel_key(alert, dvr_data, key):
+    assert alert_channel_key(alert, dvr_data) == key
@@ -0,0 +1,66 @@
+"""Ліміти одночасних запитів AsyncPoller."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from async_monitor import AsyncPoller
+
+
+class FakeClient:
+    """Клієнт DVR, що відповідає через delay секунд."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def get(self, path, headers=None):
+        await asyncio.sleep(self.delay)
+        return path
+
+
+def make_poller(max_concurrency, per_site_concurrency):
+    monitor = SimpleNamespace(ALERT_STREAM=False,
+                              payload_cache=SimpleNamespace(conditional_headers=lambda dvr_name, path: {}))
+    return AsyncPoller(monitor, max_concurrency, per_site_concurrency)
+
+
+def test_busy_site_does_not_hold_global_permits():
+    async def scenario():
+        poller = make_poller(20, 4)
+        busy = [(f"A {i}", {'ip': '10.0.0.1', 'port': 8000 + i}) for i in range(100)]
+        idle = ('B', {'ip': '10.0.0.2', 'port': 80})
+        for dvr_name, _ in busy + [idle]:
+            poller.clients[dvr_name] = FakeClient(0.1)
+        queued = [asyncio.create_task(poller.get(dvr_name, dvr_data, '/status')) for dvr_name, dvr_data in busy]
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        await poller.get(*idle, '/status')
+        waited = time.monotonic() - started
+        for task in queued:
+            task.cancel()
+        await asyncio.gather(*queued, return_exceptions=True)
+        return waited
+
+    # Запит до вільного майданчика не чекає черги іншого майданчика
+    assert asyncio.run(scenario()) < 0.5
+
+
+def test_site_limit():
+    async def scenario():
+        poller = make_poller(20, 4)
+        active = peak = 0
+
+        class CountingClient:
+            async def get(self, path, headers=None):
+                nonlocal active, peak
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.02)
+                active -= 1
+
+        dvrs = [(f"A {i}", {'ip': '10.0.0.1', 'port': 8000 + i}) for i in range(12)]
+        for dvr_name, _ in dvrs:
+            poller.clients[dvr_name] = CountingClient()
+        await asyncio.gather(*(poller.get(dvr_name, dvr_data, '/status') for dvr_name, dvr_data in dvrs))
+        return peak
+
+    assert asyncio.run(scenario()) == 4
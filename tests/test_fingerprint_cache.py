@@ -0,0 +1,56 @@
+"""FingerprintCache: швидкий шлях для відповідей ISAPI, у яких не змінився стан каналів."""
+import random
+
+from fingerprint_cache import FingerprintCache
+from isapi_parser import parse_working_status
+from isapi_simulator import make_input_proxy_xml, make_working_status_json
+from monitor_cameras import IP_CHANNELS_PATH, WORKING_STATUS_PATH, channel_states
+
+
+class Response:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def compare(cache, status_body, channels_body=make_input_proxy_xml(16)):
+    """Порівняння як у process_ip_response: workingstatus - лише за станом каналів."""
+    responses = {IP_CHANNELS_PATH: Response(channels_body), WORKING_STATUS_PATH: Response(status_body)}
+    contents = {WORKING_STATUS_PATH: channel_states(parse_working_status(status_body))}
+    entries = cache.compare('DVR 1', responses, contents)
+    if entries is not None:
+        cache.store('DVR 1', entries)
+    return entries
+
+
+def test_live_counters_do_not_defeat_fast_path():
+    rng = random.Random(0)
+    cache = FingerprintCache()
+    assert compare(cache, make_working_status_json(16, rng=rng)) is not None
+    for _ in range(5):
+        # Інші bitRate, linkNum, CPU, Memory і вільне місце - той самий стан каналів
+        assert compare(cache, make_working_status_json(16, rng=rng)) is None
+
+
+def test_channel_state_change_detected():
+    rng = random.Random(0)
+    cache = FingerprintCache()
+    compare(cache, make_working_status_json(16, offline=[3], rng=rng))
+    assert compare(cache, make_working_status_json(16, offline=[3, 7], rng=rng)) is not None
+    assert compare(cache, make_working_status_json(16, offline=[3, 7], wrapped=False, rng=rng)) is None
+
+
+def test_channel_list_change_detected():
+    cache = FingerprintCache()
+    status = make_working_status_json(16)
+    compare(cache, status)
+    assert compare(cache, status, make_input_proxy_xml(16).replace(b'IPCamera 001', b'Gate')) is not None
+
+
+def test_whole_body_compared_without_contents():
+    cache = FingerprintCache()
+    entries = cache.compare('DVR 1', {WORKING_STATUS_PATH: Response(b'{"a": 1}')})
+    cache.store('DVR 1', entries)
+    assert cache.compare('DVR 1', {WORKING_STATUS_PATH: Response(b'{"a": 1}')}) is None
+    assert cache.compare('DVR 1', {WORKING_STATUS_PATH: Response(b'{"a": 2}')}) is not None
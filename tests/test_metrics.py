@@ -0,0 +1,66 @@
+"""HTTP-сервер метрик: /profile і одноразовий запуск з monitor_cameras."""
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def server():
+    server = metrics.ThreadingHTTPServer(('127.0.0.1', 0), metrics.MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+@pytest.mark.parametrize('seconds', ['-1', 'abc', 'nan', 'inf'])
+def test_profile_rejects_bad_seconds(server, seconds):
+    status, _ = get(f"{server}/profile?seconds={seconds}")
+    assert status == 400
+    assert not metrics.profiler.running
+
+
+def test_profile_stops_profiler(server):
+    status, _ = get(f"{server}/profile?seconds=0.05")
+    assert status == 200
+    assert not metrics.profiler.running
+
+
+def test_metrics_server_started_once(monkeypatch):
+    import monitor_cameras
+    start_server = metrics.start_server
+    port = free_port()
+    started = []
+
+    def start_on_free_port():
+        started.append(start_server(port))
+        return started[-1]
+
+    monkeypatch.setattr(monitor_cameras, 'metrics_server', None)
+    monkeypatch.setattr(metrics, 'start_server', start_on_free_port)
+    # Повторний запуск моніторингу з меню не займає порт удруге (OSError: Address already in use)
+    monitor_cameras.start_metrics_server()
+    monitor_cameras.start_metrics_server()
+    assert len(started) == 1
+    started[0].shutdown()
+    started[0].server_close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,86 @@
+"""Пул запитів ISAPI (request_executor): розмір після перезавантаження конфігурації і заміна пулу."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import monitor_cameras
+
+FLEET = {
+    'DVR 1': {'type': 'analog', 'ip': '10.0.0.1', 'port': 80},
+    'DVR 2': {'type': 'ip', 'ip': '10.0.0.2', 'port': 80},
+    'DVR 3': {'type': 'mixed', 'ip': '10.0.0.3', 'port': 80},
+}
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """monitor_cameras з парком FLEET і власним пулом запитів."""
+    monkeypatch.setattr(monitor_cameras, 'dvrs', {dvr_name: dict(dvr_data) for dvr_name, dvr_data in FLEET.items()})
+    monkeypatch.setattr(monitor_cameras, 'request_workers', None)
+    monkeypatch.setattr(monitor_cameras, 'request_executor_size', 0)
+    monkeypatch.setattr(monitor_cameras, 'request_executor', None)
+    yield monitor_cameras
+    if monitor_cameras.request_executor is not None:
+        monitor_cameras.request_executor.shutdown(wait=False)
+
+
+def full_count(monitor):
+    return sum(monitor.pooled_requests(dvr_data) for dvr_data in monitor.dvrs.values())
+
+
+def test_reload_adjusts_workers_by_change_only(monitor, monkeypatch):
+    monitor.grow_request_executor()
+    assert monitor.request_workers == 3
+    counted = []
+    request_paths = monitor.dvr_request_paths
+
+    def counting(dvr_data):
+        counted.append(dvr_data['ip'])
+        return request_paths(dvr_data)
+
+    monkeypatch.setattr(monitor, 'dvr_request_paths', counting)
+    monitor.apply_config({'DVR 1': None,
+                          'DVR 2': dict(FLEET['DVR 2'], type='mixed'),
+                          'DVR 4': {'type': 'mixed', 'ip': '10.0.0.4', 'port': 80}})
+    # Пораховано лише змінені DVR (DVR 2 - стара і нова конфігурація), а не весь парк
+    assert sorted(counted) == ['10.0.0.1', '10.0.0.2', '10.0.0.2', '10.0.0.4']
+    assert monitor.request_workers == full_count(monitor) == 6
+    assert monitor.request_executor_size == 6
+
+
+def test_reload_before_first_request_leaves_pool_to_first_request(monitor):
+    monitor.apply_config({'DVR 4': {'type': 'mixed', 'ip': '10.0.0.4', 'port': 80}})
+    assert monitor.request_executor is None
+    monitor.grow_request_executor()
+    assert monitor.request_workers == full_count(monitor) == 5
+
+
+def test_pool_does_not_shrink(monitor):
+    executor = monitor.grow_request_executor()
+    monitor.apply_config({'DVR 3': None})
+    assert monitor.request_workers == 1
+    assert monitor.request_executor is executor
+
+
+class ReplacedExecutor:
+    """Пул, який інший потік замінив і зупинив між читанням request_executor і submit."""
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    def submit(self, function, *args, **kwargs):
+        self.monitor.request_executor = ThreadPoolExecutor(max_workers=1)
+        raise RuntimeError('cannot schedule new futures after shutdown')
+
+
+def test_submit_retries_in_replacement_pool(monitor):
+    monitor.request_executor = ReplacedExecutor(monitor)
+    assert monitor.submit_request(lambda value: value * 2, 21).result() == 42
+
+
+def test_submit_to_stopped_pool_raises(monitor):
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.shutdown()
+    monitor.request_executor = executor
+    with pytest.raises(RuntimeError):
+        monitor.submit_request(print)
@@ -0,0 +1,172 @@
+"""StateJournal: відновлення стану після аварійного завершення процесу."""
+import json
+import os
+import random
+import shutil
+
+import pytest
+
+from state_store import ANALOG, DIGITAL, NEW_OFFLINE, OFFLINE, CameraStateStore, StateJournal, channel_key
+
+DVR_NAMES = ('DVR 1', 'DVR 2', 'DVR 3')
+
+
+def persisted(store):
+    """Стан, що має пережити перезапуск: недоступні DVR, камери offline з часом відключення та назвами."""
+    state = {}
+    for dvr_name, dvr in store.dvrs.items():
+        offline = {key: since for key, since in dvr.channels.items() if since is not None}
+        if dvr.lost_since is not None or offline:
+            state[dvr_name] = (dvr.lost_since, offline, dict(dvr.names))
+    return state
+
+
+def open_journal(directory, compact_after=10000):
+    """Новий процес: порожнє сховище, знімок і журнал з directory."""
+    store = CameraStateStore()
+    journal = StateJournal(store, str(directory), compact_after)
+    replayed = journal.load()
+    return store, journal, replayed
+
+
+def random_changes(store, rng, steps, now):
+    """Випадкові переходи камер і DVR (як під час опитування); :return: поточний час."""
+    for _ in range(steps):
+        now += 1.5
+        dvr_name = rng.choice(DVR_NAMES)
+        action = rng.random()
+        if action < 0.6:
+            updates = [(channel_key(rng.choice((ANALOG, DIGITAL)), rng.randint(1, 8)), rng.random() < 0.4)
+                       for _ in range(rng.randint(1, 4))]
+            for (key, _), (event, _) in zip(updates, store.transition_many(dvr_name, updates, now)):
+                if event in (NEW_OFFLINE, OFFLINE):
+                    store.set_name(dvr_name, key, f"{dvr_name} camera {key}")
+        elif action < 0.75:
+            store.mark_dvr_lost(dvr_name, now)
+        elif action < 0.9:
+            store.mark_dvr_reachable(dvr_name)
+        elif action < 0.98:
+            store.remove_dvr(dvr_name)
+        else:
+            store.reset()
+    return now
+
+
+def crash_state(tmp_path, seed=0, rounds=20, compact_after=10000):
+    """Робота з журналом до "падіння"; :return: стан на момент останнього запису журналу."""
+    rng = random.Random(seed)
+    store, journal, _ = open_journal(tmp_path, compact_after)
+    now = 1700000000.0
+    for _ in range(rounds):
+        now = random_changes(store, rng, rng.randint(1, 6), now)
+        journal.flush()
+    expected = persisted(store)
+    # Зміни після останнього запису журналу втрачаються разом з процесом
+    random_changes(store, rng, 5, now)
+    return expected
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_replay_matches_state_before_crash(tmp_path, seed):
+    expected = crash_state(tmp_path, seed)
+    store, _, replayed = open_journal(tmp_path)
+    assert replayed > 0
+    assert persisted(store) == expected
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_replay_across_compactions(tmp_path, seed):
+    expected = crash_state(tmp_path, seed, rounds=40, compact_after=7)
+    store, _, _ = open_journal(tmp_path)
+    assert persisted(store) == expected
+
+
+def test_restored_state_keeps_journaling(tmp_path):
+    crash_state(tmp_path)
+    store, journal, _ = open_journal(tmp_path)
+    now = random_changes(store, random.Random(1), 30, 1800000000.0)
+    store.transition('DVR 1', channel_key(DIGITAL, 3), True, now + 1)
+    store.set_name('DVR 1', channel_key(DIGITAL, 3), 'Gate')
+    journal.flush()
+    expected = persisted(store)
+    restored, _, _ = open_journal(tmp_path)
+    assert persisted(restored) == expected
+    assert restored.channel_name('DVR 1', channel_key(DIGITAL, 3)) == 'Gate'
+
+
+def test_torn_last_line_ignored(tmp_path):
+    expected = crash_state(tmp_path)
+    journal_path = tmp_path / 'state_journal.log'
+    records = len(journal_path.read_text().splitlines()) - 1
+    with open(journal_path, 'a') as file:
+        # Процес упав посеред запису рядка
+        file.write('["x","DVR 1"')
+    store, _, replayed = open_journal(tmp_path)
+    assert replayed == records
+    assert persisted(store) == expected
+
+
+def test_torn_line_stops_replay(tmp_path):
+    store, journal, _ = open_journal(tmp_path)
+    store.transition('DVR 1', 1, True, 100.0)
+    journal.flush()
+    expected = persisted(store)
+    with open(tmp_path / 'state_journal.log', 'a') as file:
+        file.write('["c","DVR 1",2,10\n["c","DVR 1",3,200.0]\n')
+    restored, _, replayed = open_journal(tmp_path)
+    assert replayed == 1
+    assert persisted(restored) == expected
+
+
+def test_stale_journal_not_replayed_over_newer_snapshot(tmp_path):
+    store, journal, _ = open_journal(tmp_path)
+    store.transition('DVR 1', 1, True, 100.0)
+    store.mark_dvr_lost('DVR 2', 100.0)
+    journal.flush()
+    stale = tmp_path / 'stale_journal.log'
+    shutil.copy(tmp_path / 'state_journal.log', stale)
+
+    # Камера та DVR відновились, стан ущільнено в новий знімок...
+    store.transition('DVR 1', 1, False, 200.0)
+    store.mark_dvr_reachable('DVR 2')
+    journal.compact()
+    expected = persisted(store)
+    assert expected == {}
+    # ...але процес упав до того, як почався новий журнал: на диску лишився журнал попереднього покоління
+    shutil.copy(stale, tmp_path / 'state_journal.log')
+
+    restored, _, replayed = open_journal(tmp_path)
+    assert replayed == 0
+    assert persisted(restored) == expected
+
+
+def test_corrupt_journal_header_not_replayed(tmp_path):
+    store, journal, _ = open_journal(tmp_path)
+    store.transition('DVR 1', 1, True, 100.0)
+    journal.compact()
+    snapshot_state = persisted(store)
+    store.transition('DVR 1', 2, True, 200.0)
+    journal.flush()
+    journal_path = tmp_path / 'state_journal.log'
+    lines = journal_path.read_text().splitlines(keepends=True)
+    journal_path.write_text('{"generat' + ''.join(lines[1:]))
+    restored, _, replayed = open_journal(tmp_path)
+    # Покоління журналу невідоме - відновлено лише знімок
+    assert replayed == 0
+    assert persisted(restored) == snapshot_state
+
+
+def test_unfinished_snapshot_write_ignored(tmp_path):
+    expected = crash_state(tmp_path)
+    # Процес упав посеред запису знімка: тимчасовий файл обірвано, os.replace не виконано
+    (tmp_path / 'state_snapshot.json.tmp').write_text('{"generation": 99, "dvrs": {"DVR 1": [1')
+    store, _, _ = open_journal(tmp_path)
+    assert persisted(store) == expected
+
+
+def test_empty_directory(tmp_path):
+    store, journal, replayed = open_journal(tmp_path)
+    assert replayed == 0
+    assert store.dvrs == {}
+    assert os.path.exists(tmp_path / 'state_snapshot.json')
+    assert json.loads((tmp_path / 'state_journal.log').read_text()) == {'generation': journal.generation}
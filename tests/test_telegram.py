@@ -0,0 +1,84 @@
+"""TelegramNotifier проти локальної заглушки Bot API (telegram_stub.py)."""
+import time
+
+import pytest
+
+from message import TelegramNotifier, deliveries
+from telegram_stub import TelegramStub
+
+
+@pytest.fixture
+def telegram():
+    """Запускає заглушку з потрібними обмеженнями: telegram(min_interval=..., retry_after=...)."""
+    stubs = []
+
+    def start(**kwargs):
+        stub = TelegramStub(**kwargs).start()
+        stubs.append(stub)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.stop()
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def gaps(stub):
+    times = [sent for sent, _, _ in stub.messages]
+    return [later - earlier for earlier, later in zip(times, times[1:])]
+
+
+def test_messages_coalesced_per_dvr(telegram):
+    stub = telegram(min_interval=0.05)
+    notifier = TelegramNotifier('token', 42, stub.url, coalesce_window=0.3, min_send_interval=0.05)
+    started = time.monotonic()
+    for message, key in [('DVR 1: camera 1 offline', 'DVR 1'), ('DVR 2: camera 5 offline', 'DVR 2'),
+                         ('DVR 1: camera 2 offline', 'DVR 1'), ('DVR 2: camera 6 offline', 'DVR 2'),
+                         ('DVR 1: camera 3 offline', 'DVR 1')]:
+        notifier.send(message, key)
+    wait_for(lambda: len(stub.messages) == 2)
+    # Одне повідомлення на DVR, не раніше ніж мине вікно об'єднання, події в порядку надходження
+    assert stub.messages[0][0] - started >= 0.3
+    assert sorted(text for _, _, text in stub.messages) == [
+        'DVR 1: camera 1 offline\nDVR 1: camera 2 offline\nDVR 1: camera 3 offline',
+        'DVR 2: camera 5 offline\nDVR 2: camera 6 offline']
+    assert {chat_id for _, chat_id, _ in stub.messages} == {42}
+
+    # Подія після відправки пакета - нове повідомлення
+    notifier.send('DVR 1: camera 1 online', 'DVR 1')
+    wait_for(lambda: len(stub.messages) == 3)
+    assert stub.messages[2][2] == 'DVR 1: camera 1 online'
+    assert stub.rejected == 0
+
+
+def test_send_rate_respects_min_interval(telegram):
+    stub = telegram(min_interval=0.2)
+    notifier = TelegramNotifier('token', 42, stub.url, coalesce_window=0, min_send_interval=0.2)
+    for i in range(5):
+        notifier.send(f"message {i}", f"DVR {i}")
+    assert notifier.flush(10)
+    assert [text for _, _, text in stub.messages] == [f"message {i}" for i in range(5)]
+    # Заглушка відхиляє частіші запити, тож жодного 429 - темп витримано
+    assert stub.rejected == 0
+    assert min(gaps(stub)) >= 0.2
+
+
+def test_rate_limited_waits_retry_after(telegram):
+    stub = telegram(min_interval=0.3, retry_after=0.5)
+    notifier = TelegramNotifier('token', 42, stub.url, coalesce_window=0, min_send_interval=0)
+    rate_limited = deliveries.values.get(('rate_limited',), 0)
+    for i in range(3):
+        notifier.send(f"message {i}", f"DVR {i}")
+    assert notifier.flush(10)
+    # Кожне повідомлення після першого отримує 429 один раз і доходить після retry_after
+    assert [text for _, _, text in stub.messages] == [f"message {i}" for i in range(3)]
+    assert stub.rejected == 2
+    assert deliveries.values[('rate_limited',)] - rate_limited == 2
+    assert min(gaps(stub)) >= 0.5
+    assert notifier.sent_count == 3